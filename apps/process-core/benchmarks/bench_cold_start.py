@@ -0,0 +1,100 @@
+"""
+Mide el cold start del handler de Lambda.
+
+Cada muestra corre en un proceso nuevo de Python y mide:
+- import: tiempo de `from main import handler`.
+- first_request: tiempo de la primera invocación de `GET /` a través de Mangum.
+- heavy_modules: librerías pesadas ya cargadas después del primer request.
+
+Uso:
+    python benchmarks/bench_cold_start.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("boto3", "supabase", "openai", "PyPDF2", "bs4", "numpy")
+
+# Script que corre en el proceso hijo
+_SAMPLE = """
+import json, sys, time
+
+start = time.perf_counter()
+from main import handler
+imported = time.perf_counter()
+
+event = {
+    "version": "2.0",
+    "routeKey": "$default",
+    "rawPath": "/",
+    "rawQueryString": "",
+    "headers": {"host": "localhost"},
+    "requestContext": {
+        "http": {"method": "GET", "path": "/", "sourceIp": "127.0.0.1", "protocol": "HTTP/1.1"},
+        "stage": "$default",
+    },
+    "isBase64Encoded": False,
+}
+
+
+class Context:
+    aws_request_id = "bench"
+
+
+response = handler(event, Context())
+answered = time.perf_counter()
+
+print(json.dumps({
+    "import_s": imported - start,
+    "first_request_s": answered - imported,
+    "status": response["statusCode"],
+    "heavy_modules": sorted(m for m in %r if m in sys.modules),
+}))
+"""
+
+
+def run_sample() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _SAMPLE % (HEAVY_MODULES,)],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold start del handler de Lambda")
+    parser.add_argument("--runs", type=int, default=5, help="Procesos a medir")
+    parser.add_argument("--json", dest="json_path", help="Guardar el resumen en JSON")
+    args = parser.parse_args()
+
+    samples = [run_sample() for _ in range(args.runs)]
+    imports = [sample["import_s"] for sample in samples]
+    requests = [sample["first_request_s"] for sample in samples]
+
+    summary = {
+        "runs": args.runs,
+        "import_median_ms": statistics.median(imports) * 1000,
+        "import_max_ms": max(imports) * 1000,
+        "first_request_median_ms": statistics.median(requests) * 1000,
+        "first_request_max_ms": max(requests) * 1000,
+        "heavy_modules_loaded": samples[-1]["heavy_modules"],
+    }
+
+    for key, value in summary.items():
+        print(f"{key:<28} {value:.1f}" if isinstance(value, float) else f"{key:<28} {value}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compara los modos de extracción "multi_call" y "single_pass".
+
+Para cada PDF ejecuta ambos modos contra OpenAI y reporta latencia, cantidad
+de llamadas y tokens consumidos. Requiere `OPENAI_API_KEY` (y las variables de
+Supabase, ya que `utils` crea su cliente al importarse).
+
+Uso:
+    python benchmarks/bench_extraction_modes.py estado1.pdf estado2.pdf --runs 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Cada corrida debe llegar a OpenAI para medir latencia y tokens reales
+os.environ.setdefault("PROMPT_CACHE_ENABLED", "false")
+
+from prompts.completion import track_usage  # noqa: E402
+from utils import EXTRACTION_MODES, extract_fields_async, extract_pdf_text  # noqa: E402
+
+
+async def run_mode(text: str, mode: str) -> dict:
+    with track_usage() as usage:
+        start = time.perf_counter()
+        await extract_fields_async(text, mode=mode)
+        elapsed = time.perf_counter() - start
+
+    return {"latency_s": elapsed, **usage}
+
+
+async def run_benchmark(paths: list, runs: int) -> dict:
+    samples = {mode: [] for mode in EXTRACTION_MODES}
+
+    for path in paths:
+        with open(path, "rb") as f:
+            text = extract_pdf_text(f.read())
+
+        for _ in range(runs):
+            for mode in EXTRACTION_MODES:
+                samples[mode].append(await run_mode(text, mode))
+
+    summary = {}
+    for mode, rows in samples.items():
+        latencies = [row["latency_s"] for row in rows]
+        summary[mode] = {
+            "samples": len(rows),
+            "latency_mean_s": statistics.mean(latencies),
+            "latency_max_s": max(latencies),
+            "calls_mean": statistics.mean(row["calls"] for row in rows),
+            "prompt_tokens_mean": statistics.mean(row["prompt_tokens"] for row in rows),
+            "completion_tokens_mean": statistics.mean(
+                row["completion_tokens"] for row in rows
+            ),
+            "total_tokens_mean": statistics.mean(row["total_tokens"] for row in rows),
+        }
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdfs", nargs="+", help="Estados de cuenta en PDF")
+    parser.add_argument("--runs", type=int, default=1, help="Repeticiones por PDF")
+    parser.add_argument("--json", dest="json_path", help="Guardar el resumen en JSON")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_benchmark(args.pdfs, args.runs))
+
+    print(f"{'modo':<12} {'lat. media':>11} {'lat. máx':>9} {'llamadas':>9} "
+          f"{'tok. prompt':>12} {'tok. resp.':>11} {'tok. total':>11}")
+    for mode, row in summary.items():
+        print(
+            f"{mode:<12} {row['latency_mean_s']:>10.2f}s {row['latency_max_s']:>8.2f}s "
+            f"{row['calls_mean']:>9.1f} {row['prompt_tokens_mean']:>12.0f} "
+            f"{row['completion_tokens_mean']:>11.0f} {row['total_tokens_mean']:>11.0f}"
+        )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Compara la extracción de texto de estados de cuenta en HTML.
+
+Genera estados de cuenta HTML grandes (una fila de tabla por línea de
+`synthetic_pdf.statement_lines`, con estilos y scripts como los de un correo)
+y para cada tamaño mide:
+- bs4: el archivo completo en memoria y `routers.clean_html_text`
+  (árbol de BeautifulSoup y una regex sobre todo el texto). Se omite si bs4
+  o las dependencias de `routers` no están instaladas.
+- stream: `html_text.html_text` leyendo el archivo por trozos.
+
+Reporta tiempo, MB/s, pico de memoria (tracemalloc) y si cada línea del
+estado de cuenta quedó en su propia línea de texto. No usa red.
+
+Uso:
+    python benchmarks/bench_html_text.py --pages 20 100 500 --runs 3
+"""
+import argparse
+import html
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_pdf import statement_lines  # noqa: E402
+from html_text import html_text  # noqa: E402
+
+_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Estado de cuenta</title>
+<style>td { font-family: Arial; padding: 2px 6px; } .monto { text-align: right; }</style>
+<script>window.dataLayer = window.dataLayer || []; dataLayer.push({"event": "estado"});</script>
+</head><body><table width="100%" cellpadding="0" cellspacing="0">
+"""
+_TAIL = "</table></body></html>\n"
+
+_MONEY = re.compile(r"^(.*?)\s+(-?\$ ?[\d.]+)$")
+
+
+def build_html(lines: list) -> bytes:
+    """Escribe las líneas como filas de tabla, con el monto en su propia celda."""
+    rows = []
+    for line in lines:
+        match = _MONEY.match(line)
+        if match:
+            cells = (
+                f'<td style="color:#333">{html.escape(match.group(1))}</td>'
+                f'<td class="monto">{html.escape(match.group(2))}</td>'
+            )
+        else:
+            cells = f'<td colspan="2" style="color:#333">{html.escape(line)}</td>'
+        rows.append(f"<tr>{cells}</tr>\n")
+    return (_HEAD + "".join(rows) + _TAIL).encode("utf-8")
+
+
+def bs4_text(path: str) -> str:
+    from routers import clean_html_text
+
+    with open(path, encoding="utf-8") as f:
+        return clean_html_text(f.read())
+
+
+def measure(fn, path: str, runs: int) -> dict:
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = fn(path)
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": statistics.median(seconds), "peak_mb": peak / 2**20, "text": text}
+
+
+def run_benchmark(page_counts: list, runs: int, seed: int = 1234) -> list:
+    methods = {"stream": html_text}
+    try:
+        import bs4  # noqa: F401
+        import routers  # noqa: F401
+
+        methods["bs4"] = bs4_text
+    except ImportError as e:
+        print(f"{e}: se mide solo el parser por trozos", file=sys.stderr)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for index, pages in enumerate(page_counts):
+            lines = statement_lines(pages, seed + index)
+            path = os.path.join(directory, f"estado_{pages}p.html")
+            with open(path, "wb") as f:
+                f.write(build_html(lines))
+            size_mb = os.path.getsize(path) / 2**20
+
+            expected = [" ".join(line.split()) for line in lines]
+            for method, fn in methods.items():
+                result = measure(fn, path, runs)
+                text_lines = result.pop("text").splitlines()
+                rows.append(
+                    {
+                        "pages": pages,
+                        "size_mb": size_mb,
+                        "method": method,
+                        **result,
+                        "mb_per_s": size_mb / result["seconds"],
+                        "lines_kept": text_lines == expected,
+                    }
+                )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--runs", type=int, default=3, help="Repeticiones por tamaño")
+    parser.add_argument("--json", dest="json_path", help="Guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.pages, args.runs)
+
+    print(f"{'páginas':>7} {'MB':>7} {'método':<7} {'tiempo':>9} {'MB/s':>7} "
+          f"{'pico MB':>8} {'líneas':>7}")
+    for row in rows:
+        print(
+            f"{row['pages']:>7} {row['size_mb']:>7.1f} {row['method']:<7} "
+            f"{row['seconds']:>8.3f}s {row['mb_per_s']:>7.1f} {row['peak_mb']:>8.1f} "
+            f"{'sí' if row['lines_kept'] else 'no':>7}"
+        )
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
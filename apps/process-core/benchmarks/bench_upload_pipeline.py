@@ -0,0 +1,268 @@
+"""
+Benchmark offline de `routers.upload_files`.
+
+Corre el pipeline completo (spool a disco, parseo del PDF, extractores,
+sugerencia, S3 e inserts en Supabase) contra los dobles locales de
+`benchmarks/fakes.py`, con un corpus de estados de cuenta sintéticos de
+`benchmarks/synthetic_pdf.py`. No usa red ni credenciales.
+
+Escenarios (cada uno en un proceso nuevo, para medir su pico de memoria):
+- single: requests de un archivo, uno tras otro.
+- multi: requests con todos los PDFs del corpus.
+- concurrent: `--users` usuarios enviando requests de un archivo a la vez.
+
+Reporta throughput (archivos/s), latencia p50/p95/p99 por request y pico de
+RSS. Las cachés de prompts y extracciones se desactivan para que cada
+request recorra el pipeline completo. Con `--json` se guarda el resultado
+junto al commit y la configuración, y `--compare` muestra la diferencia con
+un resultado anterior.
+
+Uso:
+    python benchmarks/bench_upload_pipeline.py --runs 5 --json actual.json
+    python benchmarks/bench_upload_pipeline.py --compare base.json --openai-error-rate 0.05
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+
+SCENARIOS = ("single", "multi", "concurrent")
+
+# Variables fijadas en el proceso de cada escenario, antes de importar el servicio
+BENCH_ENV = {
+    "PROMPT_CACHE_ENABLED": "false",
+    "EXTRACTION_CACHE_ENABLED": "false",
+    "LOG_SAMPLE_RATE": "0",
+    "LOG_LEVEL": "WARNING",
+    "MODE_UPLOAD_DEBUG": "false",
+    "AWS_S3_BUCKET_NAME": "bench-bucket",
+}
+
+
+def percentile(values: list, pct: float) -> float:
+    """Percentil con interpolación lineal (0 si no hay valores)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+async def _run_scenario(options: dict) -> dict:
+    import asyncio
+    import io
+    import resource
+    import time
+
+    from fastapi import UploadFile
+
+    from benchmarks.fakes import FakeConfig, install_fakes
+    from benchmarks.synthetic_pdf import build_corpus
+    from prompts.completion import track_usage
+    from routers import upload_files
+
+    fakes = install_fakes(FakeConfig(**options["fakes"]))
+    corpus_dir = tempfile.mkdtemp(prefix="bench-corpus-")
+    pdfs = []
+    for path in build_corpus(corpus_dir, options["pages"], options["seed"]):
+        with open(path, "rb") as f:
+            pdfs.append((os.path.basename(path), f.read()))
+
+    latencies, errors, files_done = [], 0, 0
+
+    async def request(batch: list, user: int) -> None:
+        nonlocal errors, files_done
+        files = [UploadFile(file=io.BytesIO(content), filename=name) for name, content in batch]
+        start = time.perf_counter()
+        try:
+            # Llamada directa: los parámetros con `Form`/`Header` se pasan explícitos
+            await upload_files(
+                files=files,
+                process_id="bench-process",
+                user_id=f"user-{user}",
+                async_job=False,
+                idempotency_key=None,
+            )
+        except Exception:
+            errors += 1
+        else:
+            files_done += len(batch)
+        latencies.append(time.perf_counter() - start)
+
+    scenario, runs = options["scenario"], options["runs"]
+    with track_usage() as usage:
+        start = time.perf_counter()
+        if scenario == "single":
+            for _ in range(runs):
+                for pdf in pdfs:
+                    await request([pdf], 0)
+        elif scenario == "multi":
+            for _ in range(runs):
+                await request(pdfs, 0)
+        else:
+
+            async def user_session(user: int) -> None:
+                for run in range(runs):
+                    await request([pdfs[(user + run) % len(pdfs)]], user)
+
+            await asyncio.gather(*(user_session(u) for u in range(options["users"])))
+        elapsed = time.perf_counter() - start
+
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "files": files_done,
+        "elapsed_s": elapsed,
+        "throughput_files_s": files_done / elapsed if elapsed else 0.0,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_p99_s": percentile(latencies, 99),
+        "peak_rss_mb": peak_rss_mb,
+        "llm_calls": usage["calls"],
+        "llm_tokens": usage["total_tokens"],
+        "supabase_calls": fakes["supabase"].calls,
+        "s3_uploaded_bytes": fakes["s3"].uploaded_bytes,
+    }
+
+
+def _worker(options_json: str) -> None:
+    """Punto de entrada del proceso de un escenario."""
+    import asyncio
+    import logging
+
+    sys.path.insert(0, APP_DIR)
+    logging.disable(logging.WARNING)
+    result = asyncio.run(_run_scenario(json.loads(options_json)))
+    print(json.dumps(result))
+
+
+def run_scenario(options: dict) -> dict:
+    env = {**os.environ, **BENCH_ENV, "UPLOAD_SPOOL_DIR": tempfile.gettempdir()}
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(options)],
+        cwd=APP_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"El escenario {options['scenario']} falló:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=APP_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+COLUMNS = (
+    ("throughput_files_s", "arch/s", "{:>9.2f}"),
+    ("latency_p50_s", "p50", "{:>8.3f}s"),
+    ("latency_p95_s", "p95", "{:>8.3f}s"),
+    ("latency_p99_s", "p99", "{:>8.3f}s"),
+    ("peak_rss_mb", "RSS MB", "{:>9.1f}"),
+    ("errors", "errores", "{:>8d}"),
+)
+
+
+def print_report(results: dict, baseline: dict = None) -> None:
+    header = f"{'escenario':<12}" + "".join(f"{title:>10}" for _, title, _ in COLUMNS)
+    print(header)
+    for scenario, row in results.items():
+        print(f"{scenario:<12}" + "".join(fmt.format(row[key]) + " " for key, _, fmt in COLUMNS))
+        base = (baseline or {}).get(scenario)
+        if base:
+            deltas = []
+            for key, _, _ in COLUMNS:
+                if base.get(key):
+                    deltas.append(f"{(row[key] - base[key]) / base[key] * 100:>+9.1f}%")
+                else:
+                    deltas.append(f"{'-':>10}")
+            print(f"{'  vs base':<12}" + "".join(deltas))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--runs", type=int, default=3, help="Repeticiones por escenario")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 3, 8, 20])
+    parser.add_argument("--users", type=int, default=8, help="Usuarios del escenario concurrent")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--openai-latency", type=float, default=0.6)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--supabase-latency", type=float, default=0.05)
+    parser.add_argument("--supabase-error-rate", type=float, default=0.0)
+    parser.add_argument("--s3-latency", type=float, default=0.08)
+    parser.add_argument("--s3-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", dest="json_path", help="Guardar el resultado en JSON")
+    parser.add_argument("--compare", help="Resultado JSON anterior para comparar")
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker)
+        return
+
+    fakes = {
+        "openai_latency_s": args.openai_latency,
+        "openai_error_rate": args.openai_error_rate,
+        "supabase_latency_s": args.supabase_latency,
+        "supabase_error_rate": args.supabase_error_rate,
+        "s3_latency_s": args.s3_latency,
+        "s3_error_rate": args.s3_error_rate,
+        "seed": args.seed,
+    }
+    config = {
+        "runs": args.runs,
+        "pages": args.pages,
+        "users": args.users,
+        "seed": args.seed,
+        "fakes": fakes,
+    }
+
+    results = {
+        scenario: run_scenario({**config, "scenario": scenario}) for scenario in args.scenarios
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if previous.get("config") != config:
+            print("Aviso: la configuración del resultado anterior es distinta", file=sys.stderr)
+        baseline = previous["results"]
+        print(f"base: {previous.get('commit')}  actual: {git_commit()}")
+
+    print_report(results, baseline)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(
+                {"commit": git_commit(), "python": sys.version.split()[0], "config": config,
+                 "results": results},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""
+Dobles locales de OpenAI, Supabase y S3 para los benchmarks.
+
+Imitan la interfaz que usa el servicio (`openai.ChatCompletion`, el query
+builder de supabase-py y `upload_file` de boto3) con latencia y tasa de
+errores configurables, de modo que el pipeline completo se pueda medir sin
+red. Las latencias y errores salen de un generador con semilla, por lo que
+dos corridas con la misma configuración son comparables.
+
+Uso:
+    install_fakes(FakeConfig(openai_latency_s=0.8, openai_error_rate=0.02))
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from clients import set_client
+
+
+class FakeConfig:
+    """
+    Latencias (segundos) y tasas de error de los dobles.
+
+    Args:
+        openai_latency_s (float): Latencia base de cada llamada a OpenAI.
+        openai_latency_per_1k_tokens_s (float): Latencia adicional por cada
+            1000 tokens de prompt.
+        openai_error_rate (float): Fracción de llamadas que responden 429.
+        supabase_latency_s (float): Latencia de cada `execute()`.
+        supabase_error_rate (float): Fracción de `execute()` con error.
+        s3_latency_s (float): Latencia base de cada subida.
+        s3_bandwidth_mbps (float): Ancho de banda simulado de S3 (MB/s).
+        s3_error_rate (float): Fracción de subidas que fallan.
+        jitter (float): Variación relativa de las latencias (0.2 = ±20%).
+        seed (int): Semilla del generador.
+    """
+
+    def __init__(
+        self,
+        openai_latency_s: float = 0.6,
+        openai_latency_per_1k_tokens_s: float = 0.05,
+        openai_error_rate: float = 0.0,
+        supabase_latency_s: float = 0.05,
+        supabase_error_rate: float = 0.0,
+        s3_latency_s: float = 0.08,
+        s3_bandwidth_mbps: float = 50.0,
+        s3_error_rate: float = 0.0,
+        jitter: float = 0.2,
+        seed: int = 1234,
+    ):
+        self.openai_latency_s = openai_latency_s
+        self.openai_latency_per_1k_tokens_s = openai_latency_per_1k_tokens_s
+        self.openai_error_rate = openai_error_rate
+        self.supabase_latency_s = supabase_latency_s
+        self.supabase_error_rate = supabase_error_rate
+        self.s3_latency_s = s3_latency_s
+        self.s3_bandwidth_mbps = s3_bandwidth_mbps
+        self.s3_error_rate = s3_error_rate
+        self.jitter = jitter
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class _Random:
+    """Generador con semilla compartido por threads y el event loop."""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+
+    def latency(self, base: float) -> float:
+        with self._lock:
+            factor = 1 + self._rng.uniform(-self.config.jitter, self.config.jitter)
+        return max(0.0, base * factor)
+
+    def fails(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+
+# --- OpenAI -----------------------------------------------------------------
+
+
+class OpenAIObject(dict):
+    """Dict con acceso por atributo, como `openai.openai_object.OpenAIObject`."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def convert_to_openai_object(value):
+    if isinstance(value, dict):
+        return OpenAIObject({k: convert_to_openai_object(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [convert_to_openai_object(v) for v in value]
+    return value
+
+
+class RateLimitError(Exception):
+    """Mismo nombre y módulo que el error de openai, para que se reintente."""
+
+    def __init__(self, message: str = "Rate limit reached (fake)"):
+        super().__init__(message)
+        self.headers = {}
+
+
+RateLimitError.__module__ = "openai.error"
+
+_CATEGORIES = {
+    "combustible": ("COPEC", "SHELL", "PETROBRAS", "ARAMCO"),
+    "movilidad": ("UBER", "CABIFY", "DIDI"),
+    "supermercados": ("LIDER", "JUMBO", "UNIMARC", "TOTTUS"),
+    "salud": ("FARMACIA", "CRUZ VERDE", "SALCOBRAND"),
+    "entretenimiento": ("NETFLIX", "SPOTIFY"),
+    "restaurantes": ("STARBUCKS", "MCDONALDS", "RAPPI", "PEDIDOSYA"),
+    "servicios": ("ENTEL", "MOVISTAR"),
+    "tiendas": ("FALABELLA", "PARIS", "RIPLEY"),
+}
+
+
+def _category(description: str) -> str:
+    upper = description.upper()
+    for category, keywords in _CATEGORIES.items():
+        if any(keyword in upper for keyword in keywords):
+            return category
+    return "otros"
+
+
+def _categories(text: str) -> List[dict]:
+    totals = {name: 0 for name in ("combustible", "movilidad", "supermercados", "otros")}
+    for line in text.splitlines():
+        parts = line.rsplit("$", 1)
+        if len(parts) == 2 and not parts[0].rstrip().endswith("-"):
+            digits = parts[1].replace(".", "").strip()
+            if digits.isdigit():
+                category = _category(parts[0])
+                totals[category] = totals.get(category, 0) + int(digits)
+    return [{"nombre": name, "total": total} for name, total in totals.items()]
+
+
+_CLIENT = {"rut": "12.345.678-5", "nombre": "JUAN PEREZ SOTO"}
+_PRODUCT = {
+    "nombre_titular": "JUAN PEREZ SOTO",
+    "numero_tarjeta": "XXXX XXXX XXXX 1234",
+    "fecha_estado_cuenta": "15/03/2024",
+    "cupo_total": 1500000,
+    "cupo_utilizado": 420000,
+    "cupo_disponible": 1080000,
+    "cupo_total_avance_efectivo": 750000,
+    "cupo_utilizado_avance_efectivo": 0,
+    "cupo_disponible_avance_efectivo": 750000,
+    "tasas_interes_vigente_rotativo": 2.15,
+    "tasas_interes_vigente_compra_cuotas": 2.05,
+    "tasas_interes_vigente_avance_cuotas": 2.3,
+    "cae_rotativo": 30.5,
+    "cae_compra_cuotas": 29.1,
+    "cae_avance_cuotas": 33.4,
+    "fecha_pagar_hasta": "05/04/2024",
+    "monto_total_facturado": 420000,
+    "monto_minimo_pagar": 21000,
+}
+_SUGGESTION = (
+    "Usas el 28% de tu cupo y pagas al día. Reduce gastos de movilidad y evita el pago mínimo."
+)
+
+
+def fake_completion_content(messages: List[dict]) -> str:
+    """
+    Genera una respuesta con el formato que espera cada prompt, según su
+    mensaje de sistema.
+
+    Args:
+        messages (List[dict]): Mensajes de la llamada.
+
+    Returns:
+        str: Contenido de la respuesta.
+    """
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+
+    if "1. cliente:" in system:
+        return json.dumps(
+            {
+                "cliente": _CLIENT,
+                "producto": _PRODUCT,
+                "movimientos": {"categoria": _categories(user)},
+                "intereses": {"categoria": [{"nombre": "comisiones", "total": 5990}]},
+            }
+        )
+    if '"comercios"' in system:
+        descriptions = json.loads(user)
+        return json.dumps({"comercios": {d: _category(d) for d in descriptions}})
+    if '"producto"' in system:
+        return json.dumps({"producto": _PRODUCT})
+    if '"cliente"' in system:
+        return json.dumps({"cliente": _CLIENT})
+    if "asociados a los intereses" in system:
+        return json.dumps({"categoria": [{"nombre": "comisiones", "total": 5990}]})
+    if "asociados a una transacción" in system:
+        return json.dumps({"categoria": _categories(user)})
+    return _SUGGESTION
+
+
+class _ChatCompletion:
+    def __init__(self, rng: _Random):
+        self._rng = rng
+        self.calls = 0
+
+    def _latency(self, messages: List[dict]) -> float:
+        config = self._rng.config
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        base = config.openai_latency_s + config.openai_latency_per_1k_tokens_s * (
+            prompt_chars / 4 / 1000
+        )
+        return self._rng.latency(base)
+
+    def _response(self, messages: List[dict]) -> OpenAIObject:
+        self.calls += 1
+        if self._rng.fails(self._rng.config.openai_error_rate):
+            raise RateLimitError()
+
+        content = fake_completion_content(messages)
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return convert_to_openai_object(
+            {
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+
+    def create(self, messages: List[dict], **kwargs) -> OpenAIObject:
+        time.sleep(self._latency(messages))
+        return self._response(messages)
+
+    async def acreate(self, messages: List[dict], stream: bool = False, **kwargs):
+        if not stream:
+            await asyncio.sleep(self._latency(messages))
+            return self._response(messages)
+
+        # Primer fragmento tras la latencia base, el resto espaciado
+        await asyncio.sleep(self._rng.latency(self._rng.config.openai_latency_s))
+        content = self._response(messages).choices[0].message.content
+        return self._stream(content.split(" "))
+
+    async def _stream(self, words: List[str]):
+        for index, word in enumerate(words):
+            last = index == len(words) - 1
+            yield convert_to_openai_object(
+                {
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": word if last else word + " "},
+                            "finish_reason": "stop" if last else None,
+                        }
+                    ]
+                }
+            )
+            await asyncio.sleep(0.005)
+
+
+class FakeOpenAI:
+    """Reemplazo del módulo `openai` (v0.28) con las partes que usa el servicio."""
+
+    class error:
+        RateLimitError = RateLimitError
+
+    class util:
+        convert_to_openai_object = staticmethod(convert_to_openai_object)
+
+    def __init__(self, config: FakeConfig, rng: Optional[_Random] = None):
+        self.ChatCompletion = _ChatCompletion(rng or _Random(config))
+
+
+# --- Supabase ---------------------------------------------------------------
+
+
+class _Response:
+    def __init__(self, data: list):
+        self.data = data
+        self.error = None
+        self.count = None
+
+
+class _Query:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._payload = None
+        self._filters: Dict[str, object] = {}
+        self._ranges: List[tuple] = []
+        self._order = None
+        self._limit = None
+
+    def select(self, *columns, **kwargs) -> "_Query":
+        self._op = "select"
+        return self
+
+    def insert(self, rows, **kwargs) -> "_Query":
+        self._op = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, **kwargs) -> "_Query":
+        return self.insert(rows)
+
+    def update(self, values: dict) -> "_Query":
+        self._op = "update"
+        self._payload = values
+        return self
+
+    def eq(self, column: str, value) -> "_Query":
+        self._filters[column] = value
+        return self
+
+    def gte(self, column: str, value) -> "_Query":
+        self._ranges.append((column, value))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count: int) -> "_Query":
+        self._limit = count
+        return self
+
+    def execute(self) -> _Response:
+        return self._client._execute(self)
+
+
+class FakeSupabase:
+    """Cliente de Supabase en memoria con el query builder de supabase-py."""
+
+    def __init__(self, config: FakeConfig, rng: Optional[_Random] = None):
+        self._rng = rng or _Random(config)
+        self._tables: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def _execute(self, query: _Query) -> _Response:
+        time.sleep(self._rng.latency(self._rng.config.supabase_latency_s))
+        self.calls += 1
+        if self._rng.fails(self._rng.config.supabase_error_rate):
+            raise ConnectionError("Supabase no disponible (fake)")
+
+        with self._lock:
+            rows = self._tables.setdefault(query._table, [])
+            matches = [
+                row
+                for row in rows
+                if all(row.get(key) == value for key, value in query._filters.items())
+                and all(str(row.get(key)) >= str(value) for key, value in query._ranges)
+            ]
+            if query._op == "insert":
+                rows.extend(dict(row) for row in query._payload)
+                return _Response(query._payload)
+            if query._op == "update":
+                for row in matches:
+                    row.update(query._payload)
+                return _Response(matches)
+
+        if query._order is not None:
+            column, desc = query._order
+            matches.sort(key=lambda row: str(row.get(column, "")), reverse=desc)
+        if query._limit is not None:
+            matches = matches[: query._limit]
+        return _Response(matches)
+
+
+# --- S3 ---------------------------------------------------------------------
+
+
+class FakeS3:
+    """Cliente de S3 que descarta los objetos tras simular la transferencia."""
+
+    def __init__(self, config: FakeConfig, rng: Optional[_Random] = None):
+        self._rng = rng or _Random(config)
+        self.uploaded_bytes = 0
+        self.calls = 0
+
+    def _transfer(self, size: int) -> None:
+        config = self._rng.config
+        seconds = config.s3_latency_s + size / (config.s3_bandwidth_mbps * 1024 * 1024)
+        time.sleep(self._rng.latency(seconds))
+        self.calls += 1
+        if self._rng.fails(config.s3_error_rate):
+            raise ConnectionError("S3 no disponible (fake)")
+        self.uploaded_bytes += size
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, **kwargs) -> None:
+        self._transfer(os.path.getsize(Filename))
+
+    def put_object(self, Bucket: str, Key: str, Body=b"", **kwargs) -> dict:
+        self._transfer(len(Body))
+        return {"ETag": '"fake"'}
+
+
+def install_fakes(config: FakeConfig) -> dict:
+    """
+    Reemplaza los clientes de OpenAI, Supabase y S3 por los dobles locales.
+
+    Args:
+        config (FakeConfig): Latencias y tasas de error.
+
+    Returns:
+        dict: Los dobles instalados, por nombre.
+    """
+    rng = _Random(config)
+    fakes = {
+        "openai": FakeOpenAI(config, rng),
+        "supabase": FakeSupabase(config, rng),
+        "s3": FakeS3(config, rng),
+    }
+    for name, client in fakes.items():
+        set_client(name, client)
+    return fakes
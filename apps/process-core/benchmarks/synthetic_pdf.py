@@ -0,0 +1,227 @@
+"""
+Genera estados de cuenta sintéticos de tarjetas de crédito chilenas en PDF.
+
+Los PDFs se escriben a mano (texto Helvetica, sin dependencias) con el mismo
+formato que reconocen `statement_rules`, `statement_text` y
+`merchant_categories`: encabezado del emisor, datos del titular con RUT
+válido, cupos, tasas, movimientos nacionales y páginas que se descartan
+(internacional, condiciones legales, promociones). Con la misma semilla se genera siempre el
+mismo corpus, por lo que los resultados son comparables entre commits.
+
+Uso:
+    python benchmarks/synthetic_pdf.py out/ --pages 1 3 8 20
+"""
+import argparse
+import os
+import random
+from typing import List
+
+BANKS = ["BANCO DE CHILE", "SANTANDER", "BCI", "FALABELLA CMR", "SCOTIABANK"]
+
+FIRST_NAMES = ["JUAN", "MARIA", "PEDRO", "CAMILA", "JOSE", "FRANCISCA", "DIEGO", "VALENTINA"]
+LAST_NAMES = ["GONZALEZ", "MUNOZ", "ROJAS", "DIAZ", "PEREZ", "SOTO", "CONTRERAS", "SILVA"]
+
+# Comercios conocidos por el diccionario local y algunos desconocidos
+MERCHANTS = [
+    "COPEC ESTACION", "SHELL LAS CONDES", "UBER TRIP", "CABIFY", "LIDER EXPRESS",
+    "JUMBO COSTANERA", "UNIMARC", "FARMACIAS AHUMADA", "CRUZ VERDE", "NETFLIX.COM",
+    "SPOTIFY", "STARBUCKS", "MCDONALDS", "RAPPI", "PEDIDOSYA", "ENTEL", "FALABELLA",
+    "PARIS", "COMERCIAL DON PEPE", "PANADERIA LA ESPIGA", "FERRETERIA EL CLAVO",
+]
+
+LEGAL_TEXT = [
+    "LA TASA DE INTERES SE APLICA SOBRE EL SALDO INSOLUTO SEGUN CONTRATO VIGENTE.",
+    "EL TITULAR PUEDE PRESENTAR RECLAMOS ANTE EL SERNAC CONFORME A LA LEY 19.496.",
+    "LA CARGA ANUAL EQUIVALENTE SE INFORMA SEGUN LO DISPUESTO EN EL ARTICULO 17 G.",
+    "EL EMISOR NO ASUME RESPONSABILIDAD POR CARGOS NO RECONOCIDOS FUERA DE PLAZO.",
+]
+
+PROMO_TEXT = [
+    "APROVECHA 6 CUOTAS SIN INTERES EN COMERCIOS ASOCIADOS.",
+    "BENEFICIO EXCLUSIVO: 20% DE DESCUENTO LOS MARTES EN RESTAURANTES.",
+    "REVISA EL CATALOGO DE PUNTOS Y CANJEA TU PROMOCION DEL MES.",
+]
+
+LINES_PER_PAGE = 48
+
+
+def _rut(rng: random.Random) -> str:
+    body = rng.randint(5_000_000, 25_999_999)
+    total, factor = 0, 2
+    for digit in reversed(str(body)):
+        total += int(digit) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = {10: "K", 11: "0"}.get(11 - total % 11, str(11 - total % 11))
+    return f"{body:,}".replace(",", ".") + f"-{dv}"
+
+
+def _money(amount: int) -> str:
+    return "$ " + f"{amount:,}".replace(",", ".")
+
+
+def statement_lines(pages: int, seed: int, extra_pages: int = 0) -> List[str]:
+    """
+    Genera las líneas de texto de un estado de cuenta.
+
+    Args:
+        pages (int): Páginas aproximadas de información y movimientos.
+        seed (int): Semilla del generador.
+        extra_pages (int): Páginas adicionales de condiciones y promociones.
+
+    Returns:
+        List[str]: Líneas del estado de cuenta.
+    """
+    rng = random.Random(seed)
+    bank = rng.choice(BANKS)
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+    cupo_total = rng.randrange(500_000, 5_000_000, 10_000)
+    cupo_utilizado = rng.randrange(0, cupo_total, 1_000)
+    avance_total = cupo_total // 2
+    avance_utilizado = rng.randrange(0, avance_total, 1_000)
+    day, month = rng.randint(1, 28), rng.randint(1, 12)
+
+    lines = [
+        f"{bank}",
+        "ESTADO DE CUENTA TARJETA DE CREDITO",
+        f"NOMBRE DEL TITULAR {name}",
+        f"RUT {_rut(rng)}",
+        f"NUMERO DE TARJETA XXXX XXXX XXXX {rng.randint(1000, 9999)}",
+        "INFORMACION GENERAL",
+        f"FECHA ESTADO DE CUENTA {day:02d}/{month:02d}/2024",
+        f"PAGAR HASTA {day:02d}/{month % 12 + 1:02d}/2024",
+        f"CUPO TOTAL {_money(cupo_total)}",
+        f"CUPO UTILIZADO {_money(cupo_utilizado)}",
+        f"CUPO DISPONIBLE {_money(cupo_total - cupo_utilizado)}",
+        f"CUPO TOTAL AVANCE {_money(avance_total)}",
+        f"CUPO UTILIZADO AVANCE {_money(avance_utilizado)}",
+        f"CUPO DISPONIBLE AVANCE {_money(avance_total - avance_utilizado)}",
+        f"TASA INTERES VIGENTE ROTATIVO {rng.uniform(1, 4):.2f}%".replace(".", ","),
+        f"TASA INTERES VIGENTE COMPRAS EN CUOTAS {rng.uniform(1, 4):.2f}%".replace(".", ","),
+        f"TASA INTERES VIGENTE AVANCE EN CUOTAS {rng.uniform(1, 4):.2f}%".replace(".", ","),
+        f"CAE ROTATIVO {rng.uniform(20, 50):.2f}%".replace(".", ","),
+        f"CAE COMPRAS EN CUOTAS {rng.uniform(20, 50):.2f}%".replace(".", ","),
+        f"CAE AVANCE EN CUOTAS {rng.uniform(20, 50):.2f}%".replace(".", ","),
+        f"MONTO TOTAL FACTURADO {_money(cupo_utilizado)}",
+        f"MONTO MINIMO A PAGAR {_money(cupo_utilizado // 20)}",
+        "MOVIMIENTOS NACIONALES",
+    ]
+
+    # La mayor parte del documento son movimientos
+    movement_lines = max(10, pages * LINES_PER_PAGE - len(lines) - 30)
+    lines.append(f"01/{month:02d}/2024 PAGO TARJETA -{_money(rng.randrange(50_000, 500_000, 10))}")
+    for _ in range(movement_lines):
+        merchant = rng.choice(MERCHANTS)
+        lines.append(
+            f"{rng.randint(1, 28):02d}/{month:02d}/2024 {merchant} {rng.randint(1, 999)} "
+            f"{_money(rng.randrange(1_000, 150_000, 10))}"
+        )
+
+    lines += [
+        "CARGOS, COMISIONES, IMPUESTOS Y ABONOS",
+        f"{day:02d}/{month:02d}/2024 COMISION MENSUAL {_money(rng.randrange(2_000, 9_000, 10))}",
+        f"{day:02d}/{month:02d}/2024 IMPUESTO TIMBRES {_money(rng.randrange(500, 3_000, 10))}",
+        f"{day:02d}/{month:02d}/2024 INTERESES ROTATIVO {_money(rng.randrange(0, 40_000, 10))}",
+        "MOVIMIENTOS INTERNACIONALES",
+        f"{day:02d}/{month:02d}/2024 AMAZON MKTPLACE US$ {rng.randint(10, 200)}",
+        "CONDICIONES GENERALES",
+    ]
+    # Páginas de condiciones y publicidad que ningún extractor usa
+    lines += [rng.choice(LEGAL_TEXT) for _ in range(extra_pages * LINES_PER_PAGE // 2)]
+    lines.append("PROMOCIONES")
+    lines += [rng.choice(PROMO_TEXT) for _ in range(max(1, extra_pages * LINES_PER_PAGE // 2))]
+    return lines
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(lines: List[str]) -> bytes:
+    """
+    Escribe un PDF mínimo con las líneas dadas, `LINES_PER_PAGE` por página.
+
+    Args:
+        lines (List[str]): Líneas de texto (ASCII).
+
+    Returns:
+        bytes: Contenido del PDF.
+    """
+    pages = [lines[i : i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+    font_id = 3
+    first_page_id = 4
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        font_id: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+
+    kids = []
+    for index, page_lines in enumerate(pages):
+        page_id = first_page_id + index * 2
+        content_id = page_id + 1
+        kids.append(f"{page_id} 0 R")
+        text = "\n".join(f"({_escape(line)}) Tj T*" for line in page_lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td\n{text}\nET"
+        objects[page_id] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += f"{obj_id} 0 obj\n{objects[obj_id]}\nendobj\n".encode("latin-1")
+
+    xref_at = len(out)
+    size = max(objects) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode("latin-1")
+    for obj_id in range(1, size):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode(
+        "latin-1"
+    )
+    return bytes(out)
+
+
+def build_corpus(
+    directory: str, page_counts: List[int], seed: int = 1234, extra_pages: int = 2
+) -> List[str]:
+    """
+    Genera un PDF por cantidad de páginas en `directory`.
+
+    Args:
+        directory (str): Directorio de salida.
+        page_counts (List[int]): Páginas de información y movimientos de cada PDF.
+        seed (int): Semilla base.
+        extra_pages (int): Páginas de condiciones y promociones de cada PDF.
+
+    Returns:
+        List[str]: Rutas de los PDFs, en el orden de `page_counts`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index, pages in enumerate(page_counts):
+        path = os.path.join(directory, f"estado_{pages:02d}p_{index}.pdf")
+        with open(path, "wb") as f:
+            f.write(build_pdf(statement_lines(pages, seed + index, extra_pages)))
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Genera estados de cuenta sintéticos")
+    parser.add_argument("directory", help="Directorio de salida")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 3, 8, 20])
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--extra-pages", type=int, default=2, help="Páginas de condiciones y promociones")
+    args = parser.parse_args()
+
+    for path in build_corpus(args.directory, args.pages, args.seed, args.extra_pages):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+# app/cache_store.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+logger = logging.getLogger()
+
+
+def _size_of(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+class MemoryLRUStore:
+    """
+    Caché en memoria del proceso con política LRU y expiración por TTL.
+
+    Args:
+        max_entries (int): Máximo de entradas antes de desalojar la menos usada.
+        ttl_seconds (float): Segundos de vida de cada entrada.
+        max_bytes (int): Tamaño máximo total (serializado como JSON). Sin
+            límite si es None.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._bytes = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            expires_at, size, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                self._bytes -= size
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        size = _size_of(value) if self.max_bytes is not None else 0
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._data[key] = (time.time() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes and self._data
+            ):
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskStore:
+    """
+    Caché persistente en disco: un archivo JSON por entrada.
+
+    La expiración usa la fecha de modificación del archivo. Cuando el
+    directorio supera `max_bytes` se eliminan los archivos más antiguos.
+    En Lambda el directorio debe estar bajo /tmp, que sobrevive entre
+    invocaciones de la misma instancia.
+
+    Args:
+        directory (str): Directorio donde se guardan las entradas.
+        ttl_seconds (float): Segundos de vida de cada entrada.
+        max_bytes (int): Tamaño máximo total del directorio.
+    """
+
+    name = "disk"
+
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl_seconds < time.time():
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Entrada de caché ilegible {path}: {str(e)}")
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"No se pudo escribir la caché {path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        # Eliminar primero los más antiguos
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class SQLiteStore:
+    """
+    Caché persistente en un archivo SQLite, con expiración por TTL y
+    desalojo de las entradas usadas hace más tiempo cuando el total supera
+    `max_bytes`.
+
+    Args:
+        path (str): Archivo de la base de datos.
+        ttl_seconds (float): Segundos de vida de cada entrada.
+        max_bytes (int): Tamaño máximo total de los valores.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed_at)"
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            raise OSError(f"No se pudo abrir la caché SQLite {path}: {str(e)}") from e
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] < now:
+                    self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                    self._conn.commit()
+                    return None
+                self._conn.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Entrada de caché ilegible {key}: {str(e)}")
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        try:
+            data = json.dumps(value, ensure_ascii=False)
+            size = len(data.encode("utf-8"))
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                    (key, data, size, now + self.ttl_seconds, now),
+                )
+                self._conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (now,))
+                self._evict()
+                self._conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"No se pudo escribir la caché {key}: {str(e)}")
+
+    def delete(self, key: str) -> None:
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo eliminar la entrada de caché {key}: {str(e)}")
+
+    def _evict(self) -> None:
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache_entries"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        # Eliminar primero las usadas hace más tiempo
+        rows = self._conn.execute(
+            "SELECT key, size FROM cache_entries ORDER BY accessed_at"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            evicted.append((key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._conn.executemany("DELETE FROM cache_entries WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+
+class TieredCache:
+    """
+    Caché de varios niveles consultados en orden (p. ej. memoria y disco).
+
+    Un acierto en un nivel inferior se copia a los niveles superiores.
+
+    Args:
+        stores (List): Niveles de caché, del más rápido al más lento.
+    """
+
+    def __init__(self, stores: List[Any]):
+        self.stores = stores
+        self.hits = {store.name: 0 for store in stores}
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        for index, store in enumerate(self.stores):
+            value = store.get(key)
+            if value is not None:
+                for upper in self.stores[:index]:
+                    upper.set(key, value)
+                with self._lock:
+                    self.hits[store.name] += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        for store in self.stores:
+            store.set(key, value)
+
+    def delete(self, key: str) -> None:
+        for store in self.stores:
+            store.delete(key)
+
+    def stats(self) -> dict:
+        """
+        Retorna los contadores de aciertos, fallos y desalojos por nivel.
+
+        Returns:
+            dict: Métricas de la caché.
+        """
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": {store.name: store.evictions for store in self.stores},
+        }
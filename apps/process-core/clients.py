@@ -0,0 +1,111 @@
+# app/clients.py
+"""
+Clientes externos (Supabase, S3, Lambda, OpenAI) creados de forma perezosa.
+
+Cada cliente y su librería se cargan recién en el primer uso y luego se
+reutilizan en las invocaciones siguientes de la misma instancia de Lambda,
+por lo que importar `main` no abre conexiones ni carga boto3/supabase/openai.
+"""
+import os
+import threading
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _get_or_create(name: str, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def set_client(name: str, client) -> None:
+    """
+    Reemplaza un cliente compartido ("supabase", "s3", "lambda" u "openai"),
+    p. ej. por un doble de prueba en los benchmarks. Con `None` se vuelve a
+    crear el cliente real en el próximo uso.
+
+    Args:
+        name (str): Nombre del cliente.
+        client: Cliente a usar.
+    """
+    with _lock:
+        if client is None:
+            _clients.pop(name, None)
+        else:
+            _clients[name] = client
+
+
+def get_supabase():
+    """
+    Retorna el cliente de Supabase compartido.
+
+    Returns:
+        supabase.Client: Cliente configurado con `SUPABASE_URL` y `SUPABASE_KEY`.
+    """
+
+    def create():
+        from supabase import create_client
+
+        return create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+    return _get_or_create("supabase", create)
+
+
+def get_s3():
+    """
+    Retorna el cliente de S3 compartido.
+
+    Returns:
+        botocore.client.S3: Cliente configurado con las credenciales de S3.
+    """
+
+    def create():
+        import boto3
+
+        return boto3.client(
+            "s3",
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_S3"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_KEY_S3"),
+        )
+
+    return _get_or_create("s3", create)
+
+
+def get_lambda():
+    """
+    Retorna el cliente de Lambda compartido, con las credenciales del rol de
+    la función (se usa para invocarla de forma asíncrona, ver `jobs`).
+
+    Returns:
+        botocore.client.Lambda: Cliente de Lambda.
+    """
+
+    def create():
+        import boto3
+
+        return boto3.client("lambda")
+
+    return _get_or_create("lambda", create)
+
+
+def get_openai():
+    """
+    Retorna el módulo `openai` con la API key configurada.
+
+    Returns:
+        module: Módulo `openai`.
+    """
+
+    def create():
+        import openai
+
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        return openai
+
+    return _get_or_create("openai", create)
@@ -0,0 +1,269 @@
+# app/debt_engine.py
+"""
+Proyección local del pago de la deuda de la tarjeta.
+
+A partir de los campos del producto (`extract_product`) se simulan, mes a
+mes y con NumPy, varios escenarios de pago a la vez: el pago mínimo, pagos
+fijos (el mínimo actual, múltiplos de él y el total facturado) y pagos
+personalizados. Cada mes es una sola operación vectorizada sobre todos los
+escenarios, por lo que la proyección completa toma milisegundos.
+
+La sugerencia del LLM recibe estos números ya calculados y solo los redacta.
+"""
+import os
+from typing import Dict, List, Optional, Sequence
+
+# Permite desactivar la proyección (la sugerencia vuelve a depender solo del LLM)
+DEBT_PROJECTION_ENABLED = os.getenv("DEBT_PROJECTION_ENABLED", "true") == "true"
+
+# Horizonte máximo de la simulación; si la deuda no se paga antes, el
+# escenario se marca como no liquidado
+DEBT_MAX_MONTHS = int(os.getenv("DEBT_MAX_MONTHS", "360"))
+
+# Pago mínimo absoluto (CLP) cuando el porcentaje del saldo es menor
+DEBT_MIN_PAYMENT_FLOOR = int(os.getenv("DEBT_MIN_PAYMENT_FLOOR", "10000"))
+
+# Porcentaje del saldo usado como pago mínimo si el estado no lo trae
+DEFAULT_MIN_PAYMENT_RATIO = 0.05
+
+# Múltiplos del pago mínimo actual que se evalúan como pagos fijos
+PAYMENT_MULTIPLIERS = (1.0, 1.5, 2.0, 3.0)
+
+# Saldo bajo el cual la deuda se considera pagada (redondeo a pesos)
+_PAID_EPSILON = 1.0
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        return float(value)
+    return None
+
+
+def monthly_rate(product: dict) -> Optional[float]:
+    """
+    Retorna la tasa mensual del crédito rotativo como fracción.
+
+    Usa `tasas_interes_vigente_rotativo` (tasa mensual en %) y, si no está,
+    la deriva de `cae_rotativo` (carga anual equivalente en %).
+
+    Args:
+        product (dict): Resultado de `extract_product`.
+
+    Returns:
+        Optional[float]: Tasa mensual (p. ej. 0.0215) o None si no hay datos.
+    """
+    rate = _number(product.get("tasas_interes_vigente_rotativo"))
+    if rate is not None:
+        return rate / 100
+
+    cae = _number(product.get("cae_rotativo"))
+    if cae is not None:
+        return (1 + cae / 100) ** (1 / 12) - 1
+    return None
+
+
+def simulate_payments(
+    balance: float,
+    rate: float,
+    payments: Sequence[float],
+    minimum: Sequence[bool] = None,
+    min_ratio: float = DEFAULT_MIN_PAYMENT_RATIO,
+    min_floor: float = DEBT_MIN_PAYMENT_FLOOR,
+    max_months: int = DEBT_MAX_MONTHS,
+    schedule: bool = False,
+) -> Dict[str, object]:
+    """
+    Simula el pago de una deuda en varios escenarios a la vez.
+
+    Cada mes se paga el monto del escenario sobre el saldo facturado: fijo
+    (`payments`) o, si `minimum` es verdadero, el pago mínimo (`min_ratio`
+    del saldo, al menos `min_floor`). Lo que queda impago devenga `rate` y se
+    factura el mes siguiente; pagar el total no genera intereses. Ningún pago
+    supera el saldo.
+
+    Args:
+        balance (float): Saldo inicial.
+        rate (float): Tasa mensual como fracción.
+        payments (Sequence[float]): Pago fijo de cada escenario.
+        minimum (Sequence[bool]): Escenarios que siguen la regla del mínimo.
+        min_ratio (float): Porcentaje del saldo del pago mínimo.
+        min_floor (float): Pago mínimo absoluto.
+        max_months (int): Horizonte de la simulación.
+        schedule (bool): Si se retornan las tablas de amortización.
+
+    Returns:
+        Dict[str, object]: Arreglos de NumPy por escenario: `months`,
+        `interest`, `paid`, `paid_off`, `stalled` (el pago no cubre los
+        intereses; se deja de simular) y, con `schedule`, matrices
+        (escenarios x meses) `balance`, `interest_by_month` y
+        `payment_by_month`.
+    """
+    import numpy as np
+
+    fixed = np.asarray(payments, dtype=np.float64)
+    follows_minimum = (
+        np.zeros(fixed.shape, dtype=bool) if minimum is None else np.asarray(minimum, dtype=bool)
+    )
+    remaining = np.full(fixed.shape, float(balance))
+    months = np.zeros(fixed.shape, dtype=np.int64)
+    interest_total = np.zeros(fixed.shape)
+    paid_total = np.zeros(fixed.shape)
+    # Escenarios cuyo pago no cubre los intereses: la deuda crece sin límite
+    stalled = np.zeros(fixed.shape, dtype=bool)
+
+    if schedule:
+        balances = np.zeros(fixed.shape + (max_months,))
+        interests = np.zeros_like(balances)
+        paid_by_month = np.zeros_like(balances)
+
+    last_month = 0
+    for month in range(max_months):
+        active = (remaining > _PAID_EPSILON) & ~stalled
+        if not active.any():
+            break
+        last_month = month + 1
+
+        minimum_payment = np.maximum(remaining * min_ratio, min_floor)
+        payment = np.minimum(np.where(follows_minimum, minimum_payment, fixed), remaining)
+        payment = np.where(active, payment, 0.0)
+        interest = (remaining - payment) * rate
+
+        stalled |= active & (interest >= payment)
+        remaining = remaining - payment + interest
+        months += active
+        interest_total += interest
+        paid_total += payment
+
+        if schedule:
+            balances[:, month] = remaining
+            interests[:, month] = interest
+            paid_by_month[:, month] = payment
+
+    result = {
+        "months": months,
+        "interest": interest_total,
+        "paid": paid_total,
+        "paid_off": remaining <= _PAID_EPSILON,
+        "stalled": stalled,
+        "remaining": remaining,
+    }
+    if schedule:
+        result["balance"] = balances[:, :last_month]
+        result["interest_by_month"] = interests[:, :last_month]
+        result["payment_by_month"] = paid_by_month[:, :last_month]
+    return result
+
+
+def amortization_schedule(
+    balance: float, rate: float, payment: float, max_months: int = DEBT_MAX_MONTHS
+) -> List[dict]:
+    """
+    Retorna la tabla de amortización de un pago mensual fijo.
+
+    Args:
+        balance (float): Saldo inicial.
+        rate (float): Tasa mensual como fracción.
+        payment (float): Pago mensual.
+        max_months (int): Horizonte de la simulación.
+
+    Returns:
+        List[dict]: Una fila por mes con `mes`, `pago`, `interes`, `capital`
+        y `saldo` (en pesos).
+    """
+    result = simulate_payments(balance, rate, [payment], max_months=max_months, schedule=True)
+    rows = []
+    for month in range(int(result["months"][0])):
+        paid = result["payment_by_month"][0, month]
+        interest = result["interest_by_month"][0, month]
+        rows.append(
+            {
+                "mes": month + 1,
+                "pago": int(round(paid)),
+                "interes": int(round(interest)),
+                "capital": int(round(paid - interest)),
+                "saldo": int(round(result["balance"][0, month])),
+            }
+        )
+    return rows
+
+
+def debt_projection(product: dict, custom_payments: Sequence[float] = ()) -> Optional[dict]:
+    """
+    Proyecta el pago de la deuda facturada bajo distintos escenarios.
+
+    Escenarios: pagar siempre el mínimo, pagar cada mes un múltiplo fijo del
+    mínimo actual, pagar el total facturado y los pagos de `custom_payments`.
+
+    Args:
+        product (dict): Resultado de `extract_product`.
+        custom_payments (Sequence[float]): Pagos mensuales adicionales a evaluar.
+
+    Returns:
+        Optional[dict]: Saldo, tasa mensual y, por escenario, pago mensual,
+        meses hasta liquidar, intereses, total pagado y si el pago alcanza a
+        amortizar capital; None si faltan el saldo o la tasa.
+    """
+    if not DEBT_PROJECTION_ENABLED:
+        return None
+
+    balance = _number(product.get("monto_total_facturado")) or _number(
+        product.get("cupo_utilizado")
+    )
+    rate = monthly_rate(product)
+    if balance is None or rate is None:
+        return None
+
+    minimum_now = _number(product.get("monto_minimo_pagar"))
+    min_ratio = minimum_now / balance if minimum_now else DEFAULT_MIN_PAYMENT_RATIO
+    first_minimum = minimum_now or max(balance * min_ratio, DEBT_MIN_PAYMENT_FLOOR)
+
+    names = ["pago_minimo"]
+    payments = [0.0]
+    for multiplier in PAYMENT_MULTIPLIERS:
+        names.append(f"fijo_{multiplier:g}x_minimo")
+        payments.append(first_minimum * multiplier)
+    names.append("total_facturado")
+    payments.append(balance)
+    for payment in custom_payments:
+        names.append(f"personalizado_{int(payment)}")
+        payments.append(float(payment))
+
+    result = simulate_payments(
+        balance,
+        rate,
+        payments,
+        minimum=[index == 0 for index in range(len(payments))],
+        min_ratio=min_ratio,
+    )
+
+    scenarios = []
+    for index, name in enumerate(names):
+        paid_off = bool(result["paid_off"][index])
+        amortizes = not bool(result["stalled"][index])
+        scenarios.append(
+            {
+                "nombre": name,
+                "pago_mensual": int(round(payments[index])) if index else int(round(first_minimum)),
+                "meses": int(result["months"][index]) if paid_off else None,
+                "intereses_totales": int(round(result["interest"][index])) if amortizes else None,
+                "total_pagado": int(round(result["paid"][index])) if amortizes else None,
+                "liquidado": paid_off,
+                "amortiza": amortizes,
+            }
+        )
+
+    # El ahorro solo es comparable si el pago mínimo liquida la deuda
+    minimum_interest = scenarios[0]["intereses_totales"] if scenarios[0]["liquidado"] else None
+    for scenario in scenarios[1:]:
+        if minimum_interest is not None and scenario["liquidado"]:
+            scenario["ahorro_intereses_vs_minimo"] = (
+                minimum_interest - scenario["intereses_totales"]
+            )
+
+    return {
+        "saldo": int(round(balance)),
+        "tasa_mensual": round(rate, 6),
+        "pago_minimo_porcentaje": round(min_ratio * 100, 2),
+        "horizonte_meses": DEBT_MAX_MONTHS,
+        "escenarios": scenarios,
+    }
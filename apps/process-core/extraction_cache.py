@@ -0,0 +1,125 @@
+# app/extraction_cache.py
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional
+
+from cache_store import DiskStore, MemoryLRUStore, TieredCache
+
+logger = logging.getLogger()
+
+# Versión de prompts/esquema. Cambiarla invalida todas las extracciones en caché.
+EXTRACTION_SCHEMA_VERSION = "6"
+
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true") == "true"
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "256"))
+EXTRACTION_CACHE_TTL_SECONDS = float(
+    os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600))
+)
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "kairos-extraction-cache"),
+)
+EXTRACTION_CACHE_MAX_BYTES = int(
+    os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(100 * 1024 * 1024))
+)
+
+_extraction_cache: Optional["ExtractionCache"] = None
+
+
+def document_hash(file_content: bytes) -> str:
+    """
+    Retorna el SHA-256 del contenido de un archivo.
+
+    Args:
+        file_content (bytes): Contenido del archivo en bytes.
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Retorna el SHA-256 de un archivo leyéndolo por trozos.
+
+    Args:
+        path (str): Ruta del archivo.
+        chunk_size (int): Bytes leídos por iteración.
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Caché de resultados de `extract_bank_document` direccionada por contenido.
+
+    La llave combina la versión de esquema, el modo de extracción y el
+    SHA-256 del PDF, por lo que un acierto evita el parseo y todas las
+    llamadas a OpenAI.
+
+    Args:
+        cache (TieredCache): Niveles de almacenamiento.
+    """
+
+    def __init__(self, cache: TieredCache):
+        self.cache = cache
+
+    @staticmethod
+    def key_for(file_content: bytes, mode: str, digest: str = None) -> str:
+        digest = digest or document_hash(file_content)
+        return f"v{EXTRACTION_SCHEMA_VERSION}-{mode}-{digest}"
+
+    def get(self, key: str) -> Optional[tuple]:
+        value = self.cache.get(key)
+        if value is None:
+            return None
+        logger.info(f"Extracción obtenida desde caché: {key}")
+        return tuple(value)
+
+    def set(self, key: str, fields: tuple) -> None:
+        self.cache.set(key, list(fields))
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """
+    Retorna la caché de extracciones compartida o None si está deshabilitada.
+
+    Si el directorio de disco no es utilizable se usa solo la memoria.
+
+    Returns:
+        Optional[ExtractionCache]: Caché compartida.
+    """
+    global _extraction_cache
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+
+    if _extraction_cache is None:
+        stores = [
+            MemoryLRUStore(EXTRACTION_CACHE_MAX_ENTRIES, EXTRACTION_CACHE_TTL_SECONDS)
+        ]
+        try:
+            stores.append(
+                DiskStore(
+                    EXTRACTION_CACHE_DIR,
+                    EXTRACTION_CACHE_TTL_SECONDS,
+                    EXTRACTION_CACHE_MAX_BYTES,
+                )
+            )
+        except OSError as e:
+            logger.warning(f"Caché en disco deshabilitada: {str(e)}")
+        _extraction_cache = ExtractionCache(TieredCache(stores))
+
+    return _extraction_cache
@@ -0,0 +1,439 @@
+# app/history_analytics.py
+"""
+Análisis del historial de estados de cuenta de un usuario.
+
+Cada estado de cuenta procesado se guarda, además de la fila JSON de
+`candidates`, como filas tipadas en `statement_metrics` (una por mes,
+tarjeta, tipo y nombre: total por categoría de movimientos, de intereses o
+métrica del producto). El historial de 12–24 meses se lee con una sola
+consulta por índice (`user_id`, `statement_month`) y se carga en matrices de
+NumPy (meses x categorías), sumando las tarjetas del mismo mes, sobre las que
+se calculan tendencias, variaciones mes a mes, gasto recurrente vs. puntual
+e intereses acumulados.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import warnings
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from clients import get_supabase
+from metrics import log_event, span
+
+logger = logging.getLogger()
+
+# Permite desactivar el guardado de `statement_metrics`
+HISTORY_ANALYTICS_ENABLED = os.getenv("HISTORY_ANALYTICS_ENABLED", "true") == "true"
+
+# Meses de historial que se analizan por defecto
+HISTORY_MONTHS = int(os.getenv("HISTORY_MONTHS", "24"))
+
+# Una categoría es recurrente si aparece en al menos esta fracción de los
+# meses y su monto varía poco (coeficiente de variación bajo el máximo)
+RECURRING_MIN_SHARE = float(os.getenv("RECURRING_MIN_SHARE", "0.75"))
+RECURRING_MAX_CV = float(os.getenv("RECURRING_MAX_CV", "0.5"))
+
+METRICS_TABLE = "statement_metrics"
+
+# Tipos de fila de `statement_metrics`
+KIND_MOVEMENT = "movimiento"
+KIND_INTEREST = "interes"
+KIND_PRODUCT = "producto"
+
+# Métricas numéricas del producto que se guardan por mes
+PRODUCT_METRICS = (
+    "cupo_total",
+    "cupo_utilizado",
+    "cupo_disponible",
+    "monto_total_facturado",
+    "monto_minimo_pagar",
+    "tasas_interes_vigente_rotativo",
+    "cae_rotativo",
+)
+
+# Métricas del producto que se promedian (no se suman) entre tarjetas del mismo mes
+AVERAGED_PRODUCT_METRICS = ("tasas_interes_vigente_rotativo", "cae_rotativo")
+
+# Llave de conflicto del upsert (primary key de `statement_metrics`)
+METRICS_CONFLICT_KEY = ("user_id", "statement_month", "product_key", "kind", "name")
+
+_DATE = re.compile(r"(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})")
+_CARD_DIGITS = re.compile(r"(\d{4})\D*$")
+
+
+def statement_month(product: dict, default: date = None) -> date:
+    """
+    Retorna el primer día del mes del estado de cuenta.
+
+    Args:
+        product (dict): Resultado de `extract_product`.
+        default (date): Fecha si `fecha_estado_cuenta` no viene o no se
+            entiende. Por defecto, hoy.
+
+    Returns:
+        date: Mes del estado de cuenta.
+    """
+    match = _DATE.search(str(product.get("fecha_estado_cuenta") or ""))
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+        if year < 100:
+            year += 2000
+        try:
+            return date(year, month, 1)
+        except ValueError:
+            pass
+    default = default or date.today()
+    return default.replace(day=1)
+
+
+def product_key(candidate: dict) -> str:
+    """
+    Identifica la tarjeta de un estado de cuenta para separar sus métricas
+    de las de otras tarjetas del mismo usuario y mes.
+
+    Args:
+        candidate (dict): Fila creada con `utils.build_candidate_row`.
+
+    Returns:
+        str: Últimos 4 dígitos de la tarjeta o, si no se extrajeron, el
+        SHA-256 del archivo o un hash de los datos del producto.
+    """
+    product = candidate.get("product") or {}
+    match = _CARD_DIGITS.search(str(product.get("numero_tarjeta") or ""))
+    if match:
+        return f"tarjeta:{match.group(1)}"
+    if candidate.get("document_hash"):
+        return f"documento:{candidate['document_hash']}"
+    payload = json.dumps(product, sort_keys=True, ensure_ascii=False, default=str)
+    return "producto:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _month(value) -> date:
+    return date.fromisoformat(str(value)[:10])
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _category_rows(data: dict) -> Iterable[tuple]:
+    for item in (data or {}).get("categoria", []):
+        amount = _number(item.get("total"))
+        if amount is not None:
+            yield str(item.get("nombre") or "otros").lower(), amount
+
+
+def metric_rows(candidate: dict) -> List[dict]:
+    """
+    Convierte una fila de `candidates` en filas de `statement_metrics`.
+
+    Args:
+        candidate (dict): Fila creada con `utils.build_candidate_row`.
+
+    Returns:
+        List[dict]: Filas con `user_id`, `process_id`, `statement_month`,
+        `product_key`, `kind`, `name` y `amount`.
+    """
+    product = candidate.get("product") or {}
+    base = {
+        "user_id": candidate["user_id"],
+        "process_id": candidate["process_id"],
+        "statement_month": statement_month(product).isoformat(),
+        "product_key": product_key(candidate),
+    }
+
+    totals: Dict[tuple, float] = {}
+    for kind, data in (
+        (KIND_MOVEMENT, candidate.get("movements")),
+        (KIND_INTEREST, candidate.get("interests")),
+    ):
+        for name, amount in _category_rows(data):
+            totals[(kind, name)] = totals.get((kind, name), 0.0) + amount
+    for name in PRODUCT_METRICS:
+        amount = _number(product.get(name))
+        if amount is not None:
+            totals[(KIND_PRODUCT, name)] = amount
+
+    return [
+        {**base, "kind": kind, "name": name, "amount": amount}
+        for (kind, name), amount in totals.items()
+    ]
+
+
+def insert_statement_metrics(candidates: list) -> None:
+    """
+    Guarda las métricas de varios estados de cuenta con un solo upsert.
+
+    Un estado de cuenta de la misma tarjeta y mes subido de nuevo reemplaza
+    sus valores; el de otra tarjeta del mismo mes se guarda aparte. Si el
+    lote repite una llave (el mismo estado dos veces) queda la última fila,
+    ya que Postgres rechaza un upsert que toca dos veces la misma fila. Las
+    métricas son derivadas: si el guardado falla se registra el error sin
+    interrumpir la carga.
+
+    Args:
+        candidates (list): Filas creadas con `utils.build_candidate_row`.
+    """
+    if not HISTORY_ANALYTICS_ENABLED or not candidates:
+        return
+
+    rows = {}
+    for candidate in candidates:
+        for row in metric_rows(candidate):
+            rows[tuple(row[column] for column in METRICS_CONFLICT_KEY)] = row
+    rows = list(rows.values())
+    if not rows:
+        return
+
+    try:
+        with span("supabase.upsert_statement_metrics"):
+            response = (
+                get_supabase()
+                .table(METRICS_TABLE)
+                .upsert(rows, on_conflict=",".join(METRICS_CONFLICT_KEY))
+                .execute()
+            )
+        if getattr(response, "error", None) is not None:
+            raise RuntimeError(response.error)
+        log_event("supabase_upsert_statement_metrics", rows=len(rows))
+    except Exception as e:
+        logger.error(f"Error al guardar métricas de estados de cuenta: {str(e)}")
+
+
+class StatementHistory:
+    """
+    Historial de estados de cuenta de un usuario en formato columnar.
+
+    Args:
+        rows (Iterable[dict]): Filas de `statement_metrics`.
+
+    Attributes:
+        months (list): Meses del historial (date), en orden.
+        spend (np.ndarray): Gasto por mes y categoría (meses x categorías).
+        spend_categories (list): Categorías de las columnas de `spend`.
+        interests (np.ndarray): Intereses y cargos por mes y categoría.
+        interest_categories (list): Categorías de las columnas de `interests`.
+        product (Dict[str, np.ndarray]): Serie mensual de cada métrica del
+            producto (NaN si el mes no la trae).
+    """
+
+    def __init__(self, rows: Iterable[dict]):
+        import numpy as np
+
+        rows = list(rows)
+        self.months = sorted({_month(r["statement_month"]) for r in rows})
+        month_index = {month: i for i, month in enumerate(self.months)}
+
+        def matrix(kind: str):
+            selected = [r for r in rows if r["kind"] == kind]
+            names = sorted({r["name"] for r in selected})
+            name_index = {name: i for i, name in enumerate(names)}
+            at = (
+                np.fromiter(
+                    (month_index[_month(r["statement_month"])] for r in selected), dtype=np.int64
+                ),
+                np.fromiter((name_index[r["name"]] for r in selected), dtype=np.int64),
+            )
+            values = np.zeros((len(self.months), len(names)))
+            counts = np.zeros_like(values)
+            np.add.at(values, at, np.fromiter((float(r["amount"]) for r in selected), np.float64))
+            np.add.at(counts, at, 1)
+            return names, values, counts
+
+        self.spend_categories, self.spend, _ = matrix(KIND_MOVEMENT)
+        self.interest_categories, self.interests, _ = matrix(KIND_INTEREST)
+
+        # Con varias tarjetas en un mes los cupos y montos se suman y las tasas se promedian
+        names, values, counts = matrix(KIND_PRODUCT)
+        for i, name in enumerate(names):
+            if name in AVERAGED_PRODUCT_METRICS:
+                values[:, i] /= np.maximum(counts[:, i], 1)
+        values[counts == 0] = np.nan
+        self.product = {name: values[:, i] for i, name in enumerate(names)}
+
+    def __len__(self) -> int:
+        return len(self.months)
+
+    def trends(self) -> Dict[str, dict]:
+        """
+        Tendencia lineal del gasto de cada categoría (mínimos cuadrados sobre
+        todas las categorías a la vez).
+
+        Returns:
+            Dict[str, dict]: Por categoría, `pendiente_mensual` (CLP por mes)
+            y `variacion_mensual_pct` (pendiente sobre el promedio).
+        """
+        import numpy as np
+
+        if len(self) < 2:
+            return {}
+        x = np.arange(len(self), dtype=np.float64)
+        x -= x.mean()
+        slopes = x @ (self.spend - self.spend.mean(axis=0)) / (x @ x)
+        means = self.spend.mean(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(means > 0, slopes / means * 100, np.nan)
+        return {
+            name: {"pendiente_mensual": _round(slopes[i]), "variacion_mensual_pct": _round(pct[i], 2)}
+            for i, name in enumerate(self.spend_categories)
+        }
+
+    def month_over_month(self) -> List[dict]:
+        """
+        Variación del gasto de cada categoría respecto del mes anterior.
+
+        Returns:
+            List[dict]: Por mes (desde el segundo), `mes`, `total`,
+            `variacion_total` y `categorias` con la diferencia y el
+            porcentaje de cada una.
+        """
+        import numpy as np
+
+        if len(self) < 2:
+            return []
+        delta = np.diff(self.spend, axis=0)
+        previous = self.spend[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(previous > 0, delta / previous * 100, np.nan)
+        totals = self.spend.sum(axis=1)
+
+        return [
+            {
+                "mes": self.months[m + 1].isoformat(),
+                "total": _round(totals[m + 1]),
+                "variacion_total": _round(totals[m + 1] - totals[m]),
+                "categorias": {
+                    name: {"diferencia": _round(delta[m, i]), "pct": _round(pct[m, i], 2)}
+                    for i, name in enumerate(self.spend_categories)
+                },
+            }
+            for m in range(len(self) - 1)
+        ]
+
+    def recurring_spend(self) -> Dict[str, dict]:
+        """
+        Clasifica el gasto de cada categoría en recurrente o puntual.
+
+        Es recurrente si aparece en al menos `RECURRING_MIN_SHARE` de los
+        meses y su coeficiente de variación (en los meses en que aparece) no
+        supera `RECURRING_MAX_CV`.
+
+        Returns:
+            Dict[str, dict]: Por categoría, `tipo` ("recurrente" o
+            "puntual"), `meses_presente` y `promedio_mensual`.
+        """
+        import numpy as np
+
+        if not len(self):
+            return {}
+        present = self.spend > 0
+        count = present.sum(axis=0)
+        share = count / len(self)
+        masked = np.where(present, self.spend, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+            # Categorías sin meses con gasto (nanmean de una columna vacía)
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mean = np.nanmean(masked, axis=0)
+            cv = np.nanstd(masked, axis=0) / mean
+        recurring = (len(self) >= 3) & (share >= RECURRING_MIN_SHARE) & (cv <= RECURRING_MAX_CV)
+
+        return {
+            name: {
+                "tipo": "recurrente" if recurring[i] else "puntual",
+                "meses_presente": int(count[i]),
+                "promedio_mensual": _round(mean[i]),
+            }
+            for i, name in enumerate(self.spend_categories)
+        }
+
+    def interest_accumulation(self) -> dict:
+        """
+        Intereses, cargos y comisiones por mes y su acumulado.
+
+        Returns:
+            dict: `mensual` y `acumulado` (listas alineadas con `meses`),
+            `total` y el total por categoría.
+        """
+        monthly = self.interests.sum(axis=1)
+        return {
+            "meses": [month.isoformat() for month in self.months],
+            "mensual": [_round(value) for value in monthly],
+            "acumulado": [_round(value) for value in monthly.cumsum()],
+            "total": _round(monthly.sum()),
+            "por_categoria": {
+                name: _round(self.interests[:, i].sum())
+                for i, name in enumerate(self.interest_categories)
+            },
+        }
+
+    def utilization(self) -> List[Optional[float]]:
+        """Porcentaje del cupo utilizado cada mes (None si falta el dato)."""
+        import numpy as np
+
+        used = self.product.get("cupo_utilizado")
+        total = self.product.get("cupo_total")
+        if used is None or total is None:
+            return [None] * len(self)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(total > 0, used / total * 100, np.nan)
+        return [_round(value, 2) for value in ratio]
+
+    def summary(self) -> dict:
+        """
+        Resumen completo del historial para la API y los dashboards.
+
+        Returns:
+            dict: Meses, gasto por categoría, tendencias, variación mes a mes,
+            gasto recurrente vs. puntual, intereses y uso del cupo.
+        """
+        return {
+            "meses": [month.isoformat() for month in self.months],
+            "gasto_por_categoria": {
+                name: [_round(value) for value in self.spend[:, i]]
+                for i, name in enumerate(self.spend_categories)
+            },
+            "tendencias": self.trends(),
+            "variacion_mensual": self.month_over_month(),
+            "recurrencia": self.recurring_spend(),
+            "intereses": self.interest_accumulation(),
+            "uso_cupo_pct": self.utilization(),
+        }
+
+
+def _round(value, digits: int = 0):
+    value = float(value)
+    if value != value:  # NaN
+        return None
+    return round(value, digits) if digits else int(round(value))
+
+
+async def load_history(user_id: str, months: int = HISTORY_MONTHS) -> StatementHistory:
+    """
+    Lee los últimos `months` meses de métricas de un usuario en una sola
+    consulta por índice.
+
+    Args:
+        user_id (str): UUID del usuario.
+        months (int): Meses de historial.
+
+    Returns:
+        StatementHistory: Historial del usuario (vacío si no tiene estados).
+    """
+    since = (date.today().replace(day=1) - timedelta(days=31 * (months - 1))).replace(day=1)
+    query = (
+        get_supabase()
+        .table(METRICS_TABLE)
+        .select("statement_month, kind, name, amount")
+        .eq("user_id", user_id)
+        .gte("statement_month", since.isoformat())
+        .order("statement_month")
+    )
+    with span("supabase.select_statement_metrics"):
+        response = await asyncio.to_thread(query.execute)
+    return StatementHistory(response.data or [])
@@ -0,0 +1,255 @@
+# app/html_text.py
+"""
+Texto de estados de cuenta recibidos como HTML o correo (.eml).
+
+El HTML se lee por trozos y se convierte con expresiones regulares, sin
+construir el árbol del documento: cada bloque (párrafo, fila de tabla,
+título, `<br>`) queda en su propia línea y las celdas de una fila se separan
+con espacios, por lo que `statement_text` puede segmentar el texto igual que
+el de un PDF. Se omiten
+`<script>`, `<style>` y similares. La memoria usada depende del texto
+extraído, no del tamaño del HTML.
+
+Los correos se leen con `email.parser.BytesFeedParser`. Si el correo trae el
+estado de cuenta como PDF adjunto se usa el PDF; si no, su parte HTML y, a
+falta de ella, la de texto plano.
+"""
+import codecs
+import email.parser
+import email.policy
+import html
+import logging
+import os
+import re
+from typing import Callable, Iterable, List, Optional, Union
+
+logger = logging.getLogger()
+
+# Tamaño de los trozos al leer HTML y correos
+HTML_CHUNK_BYTES = int(os.getenv("HTML_CHUNK_BYTES", str(256 * 1024)))
+
+# Tipos de documento aceptados, por extensión
+DOCUMENT_EXTENSIONS = {
+    ".pdf": "pdf",
+    ".html": "html",
+    ".htm": "html",
+    ".eml": "eml",
+}
+
+# Etiquetas que terminan una línea
+BLOCK_TAGS = set(
+    "address article aside blockquote br caption dd div dl dt footer form h1 h2 h3 h4 h5 h6 "
+    "header hr li main nav ol p pre section table tbody tfoot thead tr ul".split()
+)
+
+# Celdas: se separan con un espacio dentro de la línea de su fila
+CELL_TAGS = {"td", "th"}
+
+# Etiquetas cuyo contenido no es texto del documento
+SKIP_TAGS = {"script", "style", "noscript", "template", "title", "svg"}
+
+# Comentarios y bloques cuyo contenido no es texto del documento
+_SKIPPED = re.compile(
+    r"<!--.*?-->|<(%s)\b[^>]*>.*?</\1\s*>" % "|".join(SKIP_TAGS), re.S | re.I
+)
+_SKIP_OPEN = re.compile(r"<!--|<(?:%s)\b" % "|".join(SKIP_TAGS), re.I)
+
+_BLOCK_TAG = re.compile(r"</?(?:%s)\b[^>]*>" % "|".join(BLOCK_TAGS), re.I)
+_CELL_TAG = re.compile(r"</?(?:%s)\b[^>]*>" % "|".join(CELL_TAGS), re.I)
+_ANY_TAG = re.compile(r"<[!?/]?[A-Za-z][^>]*>|<![^>]*>")
+
+_CHARSET_SNIFF_BYTES = 4096
+_CHARSET = re.compile(rb"""charset\s*=\s*["']?([A-Za-z0-9_.:-]+)""", re.I)
+
+
+def document_kind(filename: str) -> Optional[str]:
+    """
+    Retorna el tipo de documento según la extensión del archivo.
+
+    Args:
+        filename (str): Nombre del archivo.
+
+    Returns:
+        Optional[str]: "pdf", "html", "eml" o None si no se acepta.
+    """
+    return DOCUMENT_EXTENSIONS.get(os.path.splitext(filename or "")[1].lower())
+
+
+class HtmlTextExtractor:
+    """
+    Convierte HTML en texto por líneas a medida que se le entregan trozos
+    (`feed`). `close()` retorna el texto completo.
+
+    Cada trozo se procesa hasta su última etiqueta completa con sustituciones
+    de expresiones regulares (etiquetas de bloque a saltos de línea, celdas a
+    espacios, el resto se elimina), sin validar el documento: del HTML solo
+    interesa dónde termina cada línea y qué texto contiene. Lo que sigue a la
+    última etiqueta, o un `<script>` o comentario sin cerrar, espera al
+    siguiente trozo.
+    """
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self._line = ""
+        self._buffer = ""
+
+    def _text(self, text: str, final: bool = False) -> None:
+        text = _CELL_TAG.sub(" ", _BLOCK_TAG.sub("\n", text))
+        text = _ANY_TAG.sub("", text)
+        if "&" in text:
+            text = html.unescape(text)
+
+        lines = (self._line + text).split("\n")
+        self._line = "" if final else lines.pop()
+        for line in lines:
+            line = " ".join(line.split())
+            if line:
+                self.lines.append(line)
+
+    def feed(self, chunk: str) -> None:
+        buffer = self._buffer + chunk
+        cut = buffer.rfind(">") + 1
+
+        pieces, pos = [], 0
+        for match in _SKIPPED.finditer(buffer, 0, cut):
+            opener = _SKIP_OPEN.search(buffer, pos, match.start())
+            if opener is not None:
+                break
+            pieces.append(buffer[pos : match.start()])
+            pos = match.end()
+        else:
+            opener = _SKIP_OPEN.search(buffer, pos, cut)
+
+        # Comentario o bloque omitido sin cerrar: se conserva desde su apertura
+        if opener is not None:
+            cut = opener.start()
+        pieces.append(buffer[pos:cut])
+
+        self._text("".join(pieces))
+        self._buffer = buffer[cut:]
+
+    def close(self) -> str:
+        buffer, self._buffer = self._buffer, ""
+        self._text(_SKIP_OPEN.split(buffer, maxsplit=1)[0], final=True)
+        return "\n".join(self.lines)
+
+
+def html_chunks_text(chunks: Iterable[str]) -> str:
+    """
+    Convierte a texto un HTML entregado por trozos.
+
+    Args:
+        chunks (Iterable[str]): Trozos del HTML ya decodificados.
+
+    Returns:
+        str: Texto, una línea por bloque o fila.
+    """
+    parser = HtmlTextExtractor()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+def _decoder(head: bytes):
+    """Decodificador incremental según el charset declarado (UTF-8 por defecto)."""
+    match = _CHARSET.search(head[:_CHARSET_SNIFF_BYTES])
+    encoding = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return codecs.getincrementaldecoder(encoding)(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+def _byte_chunks(source: Union[bytes, str]) -> Iterable[bytes]:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(HTML_CHUNK_BYTES), b""):
+                yield chunk
+    else:
+        for start in range(0, len(source), HTML_CHUNK_BYTES):
+            yield source[start : start + HTML_CHUNK_BYTES]
+
+
+def html_text(source: Union[bytes, str]) -> str:
+    """
+    Extrae el texto de un archivo HTML leyéndolo por trozos.
+
+    Args:
+        source (Union[bytes, str]): Contenido del HTML o ruta al archivo.
+
+    Returns:
+        str: Texto, una línea por bloque o fila.
+    """
+    def decoded() -> Iterable[str]:
+        # El charset se busca en los primeros bytes, aunque lleguen en varios trozos
+        head, decoder = b"", None
+        for chunk in _byte_chunks(source):
+            if decoder is None:
+                head += chunk
+                if len(head) < _CHARSET_SNIFF_BYTES:
+                    continue
+                decoder, chunk = _decoder(head), head
+            yield decoder.decode(chunk)
+        if decoder is None:
+            decoder = _decoder(head)
+            yield decoder.decode(head)
+        yield decoder.decode(b"", final=True)
+
+    return html_chunks_text(decoded())
+
+
+def _is_pdf(part) -> bool:
+    filename = (part.get_filename() or "").lower()
+    return part.get_content_type() == "application/pdf" or filename.endswith(".pdf")
+
+
+def eml_text(source: Union[bytes, str], pdf_text: Callable[[bytes], str] = None) -> str:
+    """
+    Extrae el texto del estado de cuenta de un correo.
+
+    Args:
+        source (Union[bytes, str]): Contenido del correo o ruta al archivo.
+        pdf_text (Callable): Función que extrae el texto de un PDF adjunto.
+            Sin ella los adjuntos PDF se ignoran.
+
+    Returns:
+        str: Texto del PDF adjunto, de la parte HTML o de la de texto plano.
+
+    Raises:
+        ValueError: Si el correo no tiene ninguna parte utilizable.
+    """
+    parser = email.parser.BytesFeedParser(policy=email.policy.default)
+    for chunk in _byte_chunks(source):
+        parser.feed(chunk)
+    message = parser.close()
+
+    html_parts, plain_parts, pdfs = [], [], []
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        if _is_pdf(part):
+            pdfs.append(part)
+        elif part.get_content_disposition() == "attachment":
+            continue
+        elif part.get_content_type() == "text/html":
+            html_parts.append(part)
+        elif part.get_content_type() == "text/plain":
+            plain_parts.append(part)
+
+    if pdfs and pdf_text is not None:
+        logger.info(f"Correo con {len(pdfs)} PDF adjunto(s), se usa el PDF")
+        return "".join(pdf_text(part.get_payload(decode=True)) for part in pdfs)
+
+    if html_parts:
+        return "\n".join(
+            html_chunks_text(_string_chunks(part.get_content())) for part in html_parts
+        )
+    if plain_parts:
+        return "\n".join(part.get_content() for part in plain_parts)
+
+    raise ValueError("El correo no tiene un estado de cuenta en PDF, HTML o texto")
+
+
+def _string_chunks(text: str) -> Iterable[str]:
+    for start in range(0, len(text), HTML_CHUNK_BYTES):
+        yield text[start : start + HTML_CHUNK_BYTES]
@@ -0,0 +1,358 @@
+# app/ingest_cli.py
+"""
+Carga masiva de estados de cuenta desde la línea de comandos.
+
+Pensado para backfills (p. ej. al incorporar un banco nuevo): recorre un
+directorio o un manifiesto JSONL, parsea los PDFs (o HTML y .eml) en el pool
+de procesos de `pipeline`, extrae los datos con concurrencia acotada
+(prioridad batch en el gateway de OpenAI) y escribe en Supabase por lotes.
+
+El avance se registra en un checkpoint JSONL después de cada escritura, por
+lo que una corrida interrumpida se retoma desde donde quedó: los archivos
+con estado `ok` se saltan y los fallidos se reintentan (salvo
+`--skip-failed`). Un corte entre la escritura y el checkpoint puede repetir
+como máximo un lote.
+
+Uso:
+    python ingest_cli.py estados/ --process-id <uuid> --user-id <uuid>
+    python ingest_cli.py manifiesto.jsonl --concurrency 8 --batch-size 100
+
+Cada línea del manifiesto es {"path": ..., "process_id": ..., "user_id": ...};
+`process_id` y `user_id` pueden omitirse si se pasan por argumento.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from extraction_cache import file_hash
+from history_analytics import insert_statement_metrics
+from html_text import document_kind
+from metrics import span
+from pipeline import UPLOAD_MAX_CONCURRENCY, parse_document
+from prompts.llm_gateway import PRIORITY_BATCH, llm_priority
+from uploads import SpooledUpload, upload_spooled_to_s3
+from utils import build_candidate_row, extract_bank_document_async, insert_candidates_to_supabase
+
+logger = logging.getLogger()
+
+# Filas que se acumulan antes de escribirlas en Supabase
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50"))
+
+
+def load_items(source: str, process_id: str = None, user_id: str = None) -> List[dict]:
+    """
+    Lista los archivos a cargar desde un directorio o un manifiesto JSONL.
+
+    Args:
+        source (str): Directorio (se buscan PDFs, HTML y .eml recursivamente)
+            o manifiesto.
+        process_id (str): Proceso por defecto.
+        user_id (str): Usuario por defecto.
+
+    Returns:
+        List[dict]: Archivos con `path`, `process_id` y `user_id`.
+
+    Raises:
+        ValueError: Si a un archivo le falta el proceso o el usuario.
+    """
+    items = []
+    if os.path.isdir(source):
+        for root, _, names in os.walk(source):
+            for name in sorted(names):
+                if document_kind(name) is not None:
+                    items.append({"path": os.path.join(root, name)})
+        items.sort(key=lambda item: item["path"])
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    item["path"] = os.path.join(base, item["path"])
+                    items.append(item)
+
+    for item in items:
+        item["path"] = os.path.abspath(item["path"])
+        item.setdefault("process_id", process_id)
+        item.setdefault("user_id", user_id)
+        if not item["process_id"] or not item["user_id"]:
+            raise ValueError(f"Falta process_id o user_id para {item['path']}")
+    return items
+
+
+class Checkpoint:
+    """
+    Registro JSONL del resultado de cada archivo (una línea por intento).
+
+    Args:
+        path (str): Ruta del checkpoint.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.status: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Última línea a medio escribir por un corte
+                        continue
+                    self.status[entry["path"]] = entry["status"]
+        self._file = open(path, "a", encoding="utf-8")
+
+    def pending(self, items: List[dict], skip_failed: bool = False) -> List[dict]:
+        done = {"ok", "error"} if skip_failed else {"ok"}
+        return [item for item in items if self.status.get(item["path"]) not in done]
+
+    def record(self, entries: List[dict]) -> None:
+        for entry in entries:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.status[entry["path"]] = entry["status"]
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Ingester:
+    """
+    Procesa archivos con concurrencia acotada y escribe los resultados por
+    lotes, registrando cada lote en el checkpoint.
+
+    Args:
+        checkpoint (Checkpoint): Checkpoint de la corrida.
+        concurrency (int): Archivos procesándose a la vez.
+        batch_size (int): Filas por escritura en Supabase.
+        upload_s3 (bool): Subir también cada PDF a S3.
+    """
+
+    def __init__(self, checkpoint: Checkpoint, concurrency: int, batch_size: int, upload_s3: bool):
+        self.checkpoint = checkpoint
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.upload_s3 = upload_s3
+        self.results: List[dict] = []
+        self._pending: List[tuple] = []
+        self._flush_lock = asyncio.Lock()
+
+    def _finish(self, entries: List[dict]) -> None:
+        self.checkpoint.record(entries)
+        self.results.extend(entries)
+        for entry in entries:
+            _print_entry(entry)
+
+    async def _process(self, item: dict) -> None:
+        path = item["path"]
+        start = time.perf_counter()
+        try:
+            digest = await asyncio.to_thread(file_hash, path)
+            kind = document_kind(path) or "pdf"
+            extraction = extract_bank_document_async(
+                path,
+                pdf_parser=functools.partial(parse_document, kind=kind),
+                digest=digest,
+                kind=kind,
+            )
+            if self.upload_s3:
+                # El archivo es del usuario: no se cierra (cerrar lo borraría)
+                upload = SpooledUpload(
+                    os.path.basename(path), path, os.path.getsize(path), digest
+                )
+                (client, product, movements, interests), _ = await asyncio.gather(
+                    extraction,
+                    upload_spooled_to_s3(upload, f"{item['process_id']}/{digest}{os.path.splitext(path)[1].lower()}"),
+                )
+            else:
+                client, product, movements, interests = await extraction
+        except Exception as e:
+            entry = {"path": path, "status": "error", "error": f"{type(e).__name__}: {e}"}
+            entry["seconds"] = round(time.perf_counter() - start, 3)
+            self._finish([entry])
+            return
+
+        candidate = build_candidate_row(
+            item["process_id"],
+            user_id=item["user_id"],
+            client=client,
+            product=product,
+            movements=movements,
+            interests=interests,
+            document_hash=digest,
+        )
+        entry = {"path": path, "status": "ok", "seconds": round(time.perf_counter() - start, 3)}
+        self._pending.append((entry, candidate))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Escribe las filas pendientes y luego las registra en el checkpoint."""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            candidates = [candidate for _, candidate in batch]
+            try:
+                with span("ingest.bulk_write", rows=len(candidates)):
+                    await asyncio.to_thread(insert_candidates_to_supabase, candidates)
+                    await asyncio.to_thread(insert_statement_metrics, candidates)
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                entries = [
+                    {**entry, "status": "error", "error": f"Escritura en lote: {detail}"}
+                    for entry, _ in batch
+                ]
+            else:
+                entries = [entry for entry, _ in batch]
+            self._finish(entries)
+
+    async def run(self, items: List[dict]) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._process(item)
+
+        # El backfill cede el paso a las cargas interactivas en el gateway
+        with llm_priority(PRIORITY_BATCH):
+            try:
+                await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            finally:
+                await self.flush()
+
+
+def _print_entry(entry: dict) -> None:
+    line = f"[{entry['status']}] {entry['path']} {entry['seconds']:.2f}s"
+    if entry.get("error"):
+        line += f" {entry['error']}"
+    print(line, flush=True)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * pct / 100)))]
+
+
+def build_report(results: List[dict], skipped: int, elapsed: float) -> dict:
+    """
+    Resume una corrida: archivos ok/fallidos/saltados, throughput, latencia
+    por archivo y el detalle de las fallas.
+
+    Args:
+        results (List[dict]): Entradas del checkpoint de esta corrida.
+        skipped (int): Archivos ya cargados en corridas anteriores.
+        elapsed (float): Duración de la corrida en segundos.
+
+    Returns:
+        dict: Reporte de la corrida.
+    """
+    ok = [entry for entry in results if entry["status"] == "ok"]
+    seconds = [entry["seconds"] for entry in results]
+    return {
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "skipped": skipped,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_files_s": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_p50_s": _percentile(seconds, 50),
+        "latency_p95_s": _percentile(seconds, 95),
+        "failures": [
+            {"path": entry["path"], "error": entry.get("error")}
+            for entry in results
+            if entry["status"] != "ok"
+        ],
+    }
+
+
+async def ingest(
+    items: List[dict],
+    checkpoint_path: str,
+    concurrency: int = UPLOAD_MAX_CONCURRENCY,
+    batch_size: int = INGEST_BATCH_SIZE,
+    upload_s3: bool = False,
+    skip_failed: bool = False,
+) -> dict:
+    """
+    Carga los archivos que el checkpoint no marca como cargados.
+
+    Args:
+        items (List[dict]): Archivos de `load_items`.
+        checkpoint_path (str): Ruta del checkpoint JSONL.
+        concurrency (int): Archivos procesándose a la vez.
+        batch_size (int): Filas por escritura en Supabase.
+        upload_s3 (bool): Subir también cada PDF a S3.
+        skip_failed (bool): No reintentar los archivos que ya fallaron.
+
+    Returns:
+        dict: Reporte de `build_report`.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    try:
+        pending = checkpoint.pending(items, skip_failed=skip_failed)
+        ingester = Ingester(checkpoint, concurrency, batch_size, upload_s3)
+        start = time.perf_counter()
+        await ingester.run(pending)
+        return build_report(
+            ingester.results, len(items) - len(pending), time.perf_counter() - start
+        )
+    finally:
+        checkpoint.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Carga masiva de estados de cuenta")
+    parser.add_argument("source", help="Directorio con PDFs o manifiesto JSONL")
+    parser.add_argument("--process-id", help="Proceso de los archivos sin uno propio")
+    parser.add_argument("--user-id", help="Usuario de los archivos sin uno propio")
+    parser.add_argument("--checkpoint", help="Checkpoint JSONL (por defecto <source>.checkpoint.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=UPLOAD_MAX_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--upload-s3", action="store_true", help="Subir también los PDFs a S3")
+    parser.add_argument("--skip-failed", action="store_true", help="No reintentar archivos fallidos")
+    parser.add_argument("--report", help="Guardar el reporte en JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    items = load_items(args.source, args.process_id, args.user_id)
+    checkpoint = args.checkpoint or f"{args.source.rstrip(os.sep)}.checkpoint.jsonl"
+
+    report = asyncio.run(
+        ingest(
+            items,
+            checkpoint,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            upload_s3=args.upload_s3,
+            skip_failed=args.skip_failed,
+        )
+    )
+
+    print(
+        f"ok: {report['ok']}  fallidos: {report['failed']}  saltados: {report['skipped']}  "
+        f"{report['throughput_files_s']} archivos/s  p50: {report['latency_p50_s']:.2f}s  "
+        f"p95: {report['latency_p95_s']:.2f}s  ({report['elapsed_s']}s)"
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
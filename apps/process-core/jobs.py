@@ -0,0 +1,757 @@
+# app/jobs.py
+"""
+Cola de trabajos para procesar cargas de forma asíncrona.
+
+`POST /upload` en modo asíncrono guarda los archivos como un trabajo y
+responde de inmediato con su id. Un pool de workers toma los trabajos de la
+cola, los procesa y va registrando eventos de progreso por archivo, que se
+consultan en `/jobs/{id}` o se reciben por SSE en `/jobs/{id}/events`.
+
+El backend es intercambiable (`JOB_BACKEND`): "memory" guarda todo en el
+proceso, "sqlite" en un archivo local, lo que permite que los trabajos
+sobrevivan a un reinicio del servidor, y "supabase" en tablas de Supabase
+con los archivos en S3, compartido por todas las instancias.
+
+Los trabajos se despachan según `JOB_DISPATCH`: "local" los procesa un pool
+de workers dentro del servidor (uvicorn, contenedores) y "lambda" invoca la
+misma función de forma asíncrona (`InvocationType=Event`) con el id del
+trabajo, ya que en Lambda la instancia se congela apenas se envía el 202.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from clients import get_lambda, get_s3, get_supabase
+
+logger = logging.getLogger()
+
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")
+JOB_SQLITE_PATH = os.getenv(
+    "JOB_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "kairos-jobs.sqlite3")
+)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "0.5"))
+
+# Duración máxima de un stream SSE de eventos de un trabajo
+JOB_STREAM_TIMEOUT_SECONDS = float(os.getenv("JOB_STREAM_TIMEOUT_SECONDS", "900"))
+
+# Tiempo desde su creación tras el cual un trabajo terminado se elimina
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+
+JOB_DISPATCH = os.getenv("JOB_DISPATCH", "local")
+
+# Función que procesa los trabajos con `JOB_DISPATCH=lambda` (por defecto, la
+# misma función que recibió la carga)
+JOB_LAMBDA_FUNCTION = os.getenv("JOB_LAMBDA_FUNCTION") or os.getenv("AWS_LAMBDA_FUNCTION_NAME")
+
+# Prefijo en S3 de los archivos de los trabajos del backend "supabase"
+JOB_S3_PREFIX = os.getenv("JOB_S3_PREFIX", "jobs/")
+
+# Llave del evento con que la función se invoca a sí misma
+JOB_EVENT_KEY = "kairos_job_id"
+
+# Estados de un trabajo
+JOB_QUEUED = "en_cola"
+JOB_RUNNING = "procesando"
+JOB_DONE = "listo"
+JOB_ERROR = "error"
+JOB_FINAL_STATES = (JOB_DONE, JOB_ERROR)
+
+
+def _new_job(process_id: str, user_id: str, files: List[Tuple[str, bytes]]) -> dict:
+    now = time.time()
+    return {
+        "id": str(uuid.uuid4()),
+        "status": JOB_QUEUED,
+        "process_id": process_id,
+        "user_id": user_id,
+        "files": [
+            {"filename": filename, "size": len(content), "stage": JOB_QUEUED}
+            for filename, content in files
+        ],
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class JobBackend:
+    """
+    Interfaz de almacenamiento y cola de trabajos.
+
+    Las implementaciones deben ser seguras para usarse desde varios workers.
+    """
+
+    async def create_job(
+        self, process_id: str, user_id: str, files: List[Tuple[str, bytes]]
+    ) -> dict:
+        """Guarda un trabajo nuevo con sus archivos y lo deja en cola."""
+        raise NotImplementedError
+
+    async def claim_next(self) -> Optional[str]:
+        """Toma el siguiente trabajo en cola y lo marca en proceso."""
+        raise NotImplementedError
+
+    async def claim(self, job_id: str) -> bool:
+        """
+        Marca en proceso un trabajo en cola. Retorna False si no existe o ya
+        lo tomó otro worker (p. ej. un reintento de la invocación asíncrona).
+        """
+        raise NotImplementedError
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def get_files(self, job_id: str) -> List[Tuple[str, bytes]]:
+        raise NotImplementedError
+
+    async def update_file_stage(self, job_id: str, index: int, stage: str) -> None:
+        raise NotImplementedError
+
+    async def finish_job(self, job_id: str, result: dict = None, error: str = None) -> None:
+        """Marca el trabajo como terminado y libera el contenido de sus archivos."""
+        raise NotImplementedError
+
+    async def events_since(self, job_id: str, seq: int) -> List[dict]:
+        """Retorna los eventos del trabajo con número de secuencia mayor a `seq`."""
+        raise NotImplementedError
+
+
+class InMemoryJobBackend(JobBackend):
+    """
+    Backend en memoria del proceso. Los trabajos se pierden al reiniciar y
+    los terminados se eliminan `JOB_TTL_SECONDS` después de creados.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._files: Dict[str, List[Tuple[str, bytes]]] = {}
+        self._events: Dict[str, List[dict]] = {}
+        self._queue: "asyncio.Queue[str]" = None
+
+    def _get_queue(self) -> "asyncio.Queue[str]":
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def _add_event(self, job_id: str, event: dict) -> None:
+        events = self._events.setdefault(job_id, [])
+        events.append({"seq": len(events) + 1, **event})
+
+    def _evict_expired(self) -> None:
+        # Los trabajos están en orden de creación: basta recorrer los vencidos
+        cutoff = time.time() - JOB_TTL_SECONDS
+        expired = list(
+            itertools.takewhile(lambda item: item[1]["created_at"] < cutoff, self._jobs.items())
+        )
+        for job_id, job in expired:
+            if job["status"] in JOB_FINAL_STATES:
+                del self._jobs[job_id]
+                self._events.pop(job_id, None)
+
+    async def create_job(self, process_id, user_id, files):
+        self._evict_expired()
+        job = _new_job(process_id, user_id, files)
+        self._jobs[job["id"]] = job
+        self._files[job["id"]] = list(files)
+        self._add_event(job["id"], {"type": "job", "status": JOB_QUEUED})
+        await self._get_queue().put(job["id"])
+        return dict(job)
+
+    async def claim_next(self):
+        while True:
+            try:
+                job_id = self._get_queue().get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+            if await self.claim(job_id):
+                return job_id
+
+    async def claim(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] != JOB_QUEUED:
+            return False
+        job["status"], job["updated_at"] = JOB_RUNNING, time.time()
+        self._add_event(job_id, {"type": "job", "status": JOB_RUNNING})
+        return True
+
+    async def get_job(self, job_id):
+        job = self._jobs.get(job_id)
+        return json.loads(json.dumps(job)) if job else None
+
+    async def get_files(self, job_id):
+        return self._files.get(job_id, [])
+
+    async def update_file_stage(self, job_id, index, stage):
+        job = self._jobs[job_id]
+        job["files"][index]["stage"] = stage
+        job["updated_at"] = time.time()
+        self._add_event(
+            job_id,
+            {
+                "type": "file",
+                "index": index,
+                "filename": job["files"][index]["filename"],
+                "stage": stage,
+            },
+        )
+
+    async def finish_job(self, job_id, result=None, error=None):
+        job = self._jobs[job_id]
+        job["status"] = JOB_ERROR if error else JOB_DONE
+        job["result"], job["error"], job["updated_at"] = result, error, time.time()
+        self._files.pop(job_id, None)
+        self._add_event(job_id, {"type": "job", "status": job["status"], "error": error})
+
+    async def events_since(self, job_id, seq):
+        return [event for event in self._events.get(job_id, []) if event["seq"] > seq]
+
+
+class SQLiteJobBackend(JobBackend):
+    """
+    Backend en un archivo SQLite local. Las consultas corren en threads para
+    no bloquear el event loop. Los trabajos terminados se eliminan
+    `JOB_TTL_SECONDS` después de creados.
+
+    Args:
+        path (str): Ruta del archivo SQLite.
+    """
+
+    def __init__(self, path: str = JOB_SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                content BLOB NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );
+            """
+        )
+
+    def _run(self, fn: Callable, *args):
+        def locked():
+            with self._lock:
+                return fn(*args)
+
+        return asyncio.to_thread(locked)
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, job: dict) -> None:
+        job["updated_at"] = time.time()
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, data = ? WHERE id = ?",
+            (job["status"], json.dumps(job), job["id"]),
+        )
+
+    def _add_event(self, job_id: str, event: dict) -> None:
+        (seq,) = self._conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        self._conn.execute(
+            "INSERT INTO job_events (job_id, seq, data) VALUES (?, ?, ?)",
+            (job_id, seq, json.dumps({"seq": seq, **event})),
+        )
+
+    def _purge(self) -> None:
+        expired = "SELECT id FROM jobs WHERE status IN (?, ?) AND created_at < ?"
+        params = (*JOB_FINAL_STATES, time.time() - JOB_TTL_SECONDS)
+        for table in ("job_events", "job_files"):
+            self._conn.execute(f"DELETE FROM {table} WHERE job_id IN ({expired})", params)
+        self._conn.execute(f"DELETE FROM jobs WHERE id IN ({expired})", params)
+
+    async def create_job(self, process_id, user_id, files):
+        job = _new_job(process_id, user_id, files)
+
+        def insert():
+            self._conn.execute("BEGIN")
+            self._purge()
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, data, created_at) VALUES (?, ?, ?, ?)",
+                (job["id"], job["status"], json.dumps(job), job["created_at"]),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_files (job_id, idx, filename, content) VALUES (?, ?, ?, ?)",
+                [(job["id"], i, name, content) for i, (name, content) in enumerate(files)],
+            )
+            self._add_event(job["id"], {"type": "job", "status": JOB_QUEUED})
+            self._conn.execute("COMMIT")
+
+        await self._run(insert)
+        return job
+
+    async def claim_next(self):
+        def claim():
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED,),
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            job = self._load(row[0])
+            job["status"] = JOB_RUNNING
+            self._save(job)
+            self._add_event(job["id"], {"type": "job", "status": JOB_RUNNING})
+            self._conn.execute("COMMIT")
+            return job["id"]
+
+        return await self._run(claim)
+
+    async def claim(self, job_id):
+        def claim():
+            self._conn.execute("BEGIN IMMEDIATE")
+            job = self._load(job_id)
+            if job is None or job["status"] != JOB_QUEUED:
+                self._conn.execute("COMMIT")
+                return False
+            job["status"] = JOB_RUNNING
+            self._save(job)
+            self._add_event(job_id, {"type": "job", "status": JOB_RUNNING})
+            self._conn.execute("COMMIT")
+            return True
+
+        return await self._run(claim)
+
+    async def get_job(self, job_id):
+        return await self._run(self._load, job_id)
+
+    async def get_files(self, job_id):
+        def select():
+            rows = self._conn.execute(
+                "SELECT filename, content FROM job_files WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+            return [(filename, bytes(content)) for filename, content in rows]
+
+        return await self._run(select)
+
+    async def update_file_stage(self, job_id, index, stage):
+        def update():
+            job = self._load(job_id)
+            job["files"][index]["stage"] = stage
+            self._save(job)
+            self._add_event(
+                job_id,
+                {
+                    "type": "file",
+                    "index": index,
+                    "filename": job["files"][index]["filename"],
+                    "stage": stage,
+                },
+            )
+
+        await self._run(update)
+
+    async def finish_job(self, job_id, result=None, error=None):
+        def update():
+            job = self._load(job_id)
+            job["status"] = JOB_ERROR if error else JOB_DONE
+            job["result"], job["error"] = result, error
+            self._save(job)
+            self._conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+            self._add_event(job_id, {"type": "job", "status": job["status"], "error": error})
+
+        await self._run(update)
+
+    async def events_since(self, job_id, seq):
+        def select():
+            rows = self._conn.execute(
+                "SELECT data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, seq),
+            ).fetchall()
+            return [json.loads(data) for (data,) in rows]
+
+        return await self._run(select)
+
+
+class SupabaseJobBackend(JobBackend):
+    """
+    Backend compartido por todas las instancias: trabajos y eventos en las
+    tablas `upload_jobs` y `upload_job_events` de Supabase (ver README) y los
+    archivos en S3 bajo `JOB_S3_PREFIX`. Las llamadas corren en threads.
+
+    Cada trabajo tiene un solo escritor a la vez (la instancia que lo crea y
+    luego el worker que lo tomó con `claim`), por lo que el número de
+    secuencia de los eventos se lleva en el mismo trabajo.
+
+    Args:
+        bucket_name (str): Bucket de los archivos. Por defecto `AWS_S3_BUCKET_NAME`.
+    """
+
+    def __init__(self, bucket_name: Optional[str] = None):
+        self.bucket_name = bucket_name or os.getenv("AWS_S3_BUCKET_NAME")
+
+    @staticmethod
+    def _file_key(job_id: str, index: int) -> str:
+        return f"{JOB_S3_PREFIX}{job_id}/{index}"
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        response = (
+            get_supabase().table("upload_jobs").select("data").eq("id", job_id).execute()
+        )
+        return response.data[0]["data"] if response.data else None
+
+    def _save(self, job: dict, expected_status: Optional[str] = None) -> bool:
+        job["updated_at"] = time.time()
+        query = (
+            get_supabase()
+            .table("upload_jobs")
+            .update({"status": job["status"], "data": job})
+            .eq("id", job["id"])
+        )
+        if expected_status is not None:
+            query = query.eq("status", expected_status)
+        return bool(query.execute().data)
+
+    def _add_event(self, job: dict, event: dict) -> None:
+        job["last_seq"] = job.get("last_seq", 0) + 1
+        get_supabase().table("upload_job_events").insert(
+            {"job_id": job["id"], "seq": job["last_seq"], "data": {"seq": job["last_seq"], **event}}
+        ).execute()
+
+    def _purge(self) -> None:
+        # Los eventos se eliminan en cascada (ver la tabla en el README)
+        get_supabase().table("upload_jobs").delete().in_(
+            "status", list(JOB_FINAL_STATES)
+        ).lt("created_at", time.time() - JOB_TTL_SECONDS).execute()
+
+    async def create_job(self, process_id, user_id, files):
+        job = _new_job(process_id, user_id, files)
+
+        def insert():
+            s3 = get_s3()
+            for index, (_, content) in enumerate(files):
+                s3.put_object(
+                    Bucket=self.bucket_name, Key=self._file_key(job["id"], index), Body=content
+                )
+            get_supabase().table("upload_jobs").insert(
+                {
+                    "id": job["id"],
+                    "status": job["status"],
+                    "data": job,
+                    "created_at": job["created_at"],
+                }
+            ).execute()
+            self._add_event(job, {"type": "job", "status": JOB_QUEUED})
+            self._save(job)
+            try:
+                self._purge()
+            except Exception as e:
+                logger.warning(f"No se pudieron eliminar trabajos antiguos: {str(e)}")
+
+        await asyncio.to_thread(insert)
+        return job
+
+    async def claim_next(self):
+        # Los trabajos de este backend se despachan por id (ver `LambdaJobDispatcher`)
+        return None
+
+    async def claim(self, job_id):
+        def claim():
+            job = self._load(job_id)
+            if job is None or job["status"] != JOB_QUEUED:
+                return False
+            job["status"] = JOB_RUNNING
+            # Solo gana quien cambia el estado desde "en_cola"
+            if not self._save(job, expected_status=JOB_QUEUED):
+                return False
+            self._add_event(job, {"type": "job", "status": JOB_RUNNING})
+            self._save(job)
+            return True
+
+        return await asyncio.to_thread(claim)
+
+    async def get_job(self, job_id):
+        return await asyncio.to_thread(self._load, job_id)
+
+    async def get_files(self, job_id):
+        def download():
+            job = self._load(job_id)
+            s3 = get_s3()
+            return [
+                (
+                    file["filename"],
+                    s3.get_object(Bucket=self.bucket_name, Key=self._file_key(job_id, index))[
+                        "Body"
+                    ].read(),
+                )
+                for index, file in enumerate(job["files"] if job else [])
+            ]
+
+        return await asyncio.to_thread(download)
+
+    async def update_file_stage(self, job_id, index, stage):
+        def update():
+            job = self._load(job_id)
+            job["files"][index]["stage"] = stage
+            self._add_event(
+                job,
+                {
+                    "type": "file",
+                    "index": index,
+                    "filename": job["files"][index]["filename"],
+                    "stage": stage,
+                },
+            )
+            self._save(job)
+
+        await asyncio.to_thread(update)
+
+    async def finish_job(self, job_id, result=None, error=None):
+        def update():
+            job = self._load(job_id)
+            job["status"] = JOB_ERROR if error else JOB_DONE
+            job["result"], job["error"] = result, error
+            self._add_event(job, {"type": "job", "status": job["status"], "error": error})
+            self._save(job)
+            keys = [{"Key": self._file_key(job_id, index)} for index in range(len(job["files"]))]
+            if keys:
+                get_s3().delete_objects(Bucket=self.bucket_name, Delete={"Objects": keys})
+
+        await asyncio.to_thread(update)
+
+    async def events_since(self, job_id, seq):
+        def select():
+            response = (
+                get_supabase()
+                .table("upload_job_events")
+                .select("data")
+                .eq("job_id", job_id)
+                .gt("seq", seq)
+                .order("seq")
+                .execute()
+            )
+            return [row["data"] for row in response.data]
+
+        return await asyncio.to_thread(select)
+
+
+# Handler que procesa un trabajo: recibe (trabajo, archivos, progreso)
+JobHandler = Callable[[dict, List[Tuple[str, bytes]], Callable[[int, str], Awaitable[None]]], Awaitable[dict]]
+
+
+async def run_job(backend: JobBackend, handler: JobHandler, job_id: str) -> None:
+    """
+    Procesa un trabajo ya tomado (`claim`) y registra su resultado o error.
+
+    Args:
+        backend (JobBackend): Almacenamiento de trabajos.
+        handler (JobHandler): Corrutina que procesa el trabajo.
+        job_id (str): Id del trabajo.
+    """
+    job = await backend.get_job(job_id)
+    files = await backend.get_files(job_id)
+
+    async def progress(index: int, stage: str) -> None:
+        await backend.update_file_stage(job_id, index, stage)
+
+    try:
+        result = await handler(job, files, progress)
+        await backend.finish_job(job_id, result=result)
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        logger.error(f"Error en trabajo {job_id}: {detail}", exc_info=True)
+        await backend.finish_job(job_id, error=detail)
+
+
+class JobWorkerPool:
+    """
+    Pool de workers asíncronos que consumen la cola de trabajos
+    (`JOB_DISPATCH=local`).
+
+    Los workers se inician con el primer trabajo encolado, dentro del event
+    loop del servidor.
+
+    Args:
+        backend (JobBackend): Almacenamiento y cola de trabajos.
+        handler (JobHandler): Corrutina que procesa un trabajo.
+        workers (int): Cantidad de workers.
+    """
+
+    def __init__(self, backend: JobBackend, handler: JobHandler, workers: int = JOB_WORKERS):
+        self.backend = backend
+        self.handler = handler
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+
+    def ensure_started(self) -> None:
+        self._tasks = [task for task in self._tasks if not task.done()]
+        for _ in range(self.workers - len(self._tasks)):
+            self._tasks.append(asyncio.ensure_future(self._work()))
+
+    async def dispatch(self, job_id: str) -> None:
+        """El trabajo ya está en la cola: basta con que haya workers."""
+        self.ensure_started()
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self.backend.claim_next()
+            if job_id is None:
+                await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+                continue
+            await run_job(self.backend, self.handler, job_id)
+
+
+class LambdaJobDispatcher:
+    """
+    Despacha cada trabajo invocando la función Lambda de forma asíncrona
+    (`JOB_DISPATCH=lambda`), con el evento `{JOB_EVENT_KEY: job_id}`.
+
+    La invocación corre en una instancia propia hasta terminar el trabajo,
+    por lo que el backend debe ser compartido ("supabase"). Lambda reintenta
+    las invocaciones asíncronas que fallan: `claim` evita procesar dos veces
+    el mismo trabajo.
+
+    Args:
+        backend (JobBackend): Almacenamiento compartido de trabajos.
+        handler (JobHandler): Corrutina que procesa un trabajo.
+        function_name (str): Función a invocar.
+    """
+
+    def __init__(
+        self,
+        backend: JobBackend,
+        handler: JobHandler,
+        function_name: Optional[str] = JOB_LAMBDA_FUNCTION,
+    ):
+        if not function_name:
+            raise ValueError("JOB_DISPATCH=lambda requiere JOB_LAMBDA_FUNCTION")
+        self.backend = backend
+        self.handler = handler
+        self.function_name = function_name
+
+    async def dispatch(self, job_id: str) -> None:
+        """
+        Invoca la función con el id del trabajo. Si la invocación falla el
+        trabajo se marca con error y se propaga la excepción.
+        """
+        try:
+            await asyncio.to_thread(
+                get_lambda().invoke,
+                FunctionName=self.function_name,
+                InvocationType="Event",
+                Payload=json.dumps({JOB_EVENT_KEY: job_id}).encode("utf-8"),
+            )
+        except Exception as e:
+            await self.backend.finish_job(job_id, error=f"No se pudo despachar: {str(e)}")
+            raise
+
+    async def run(self, job_id: str) -> None:
+        """Procesa el trabajo recibido en el evento, si nadie lo tomó antes."""
+        if not await self.backend.claim(job_id):
+            logger.info(f"Trabajo {job_id} ya tomado o inexistente")
+            return
+        await run_job(self.backend, self.handler, job_id)
+
+
+def create_job_backend(name: str = JOB_BACKEND) -> JobBackend:
+    """
+    Crea el backend de trabajos configurado.
+
+    Args:
+        name (str): "memory", "sqlite" o "supabase".
+
+    Returns:
+        JobBackend: Backend de trabajos.
+    """
+    if name == "memory":
+        return InMemoryJobBackend()
+    if name == "sqlite":
+        return SQLiteJobBackend()
+    if name == "supabase":
+        return SupabaseJobBackend()
+    raise ValueError(f"Backend de trabajos no soportado: {name}")
+
+
+def create_job_dispatcher(backend: JobBackend, handler: JobHandler, name: str = JOB_DISPATCH):
+    """
+    Crea el despachador de trabajos configurado.
+
+    Args:
+        backend (JobBackend): Backend de trabajos.
+        handler (JobHandler): Corrutina que procesa un trabajo.
+        name (str): "local" o "lambda".
+
+    Returns:
+        Union[JobWorkerPool, LambdaJobDispatcher]: Objeto con `dispatch(job_id)`.
+    """
+    if name == "local":
+        return JobWorkerPool(backend, handler)
+    if name == "lambda":
+        if not isinstance(backend, SupabaseJobBackend):
+            raise ValueError("JOB_DISPATCH=lambda requiere JOB_BACKEND=supabase")
+        return LambdaJobDispatcher(backend, handler)
+    raise ValueError(f"Despacho de trabajos no soportado: {name}")
+
+
+async def stream_job_events(
+    backend: JobBackend, job_id: str, last_seq: int = 0, timeout: float = None
+):
+    """
+    Genera los eventos de un trabajo en formato SSE hasta que termine.
+
+    Si el trabajo no existe (o se eliminó) o no termina dentro de `timeout`
+    segundos, el stream cierra con un evento `error` cuyo `status` es
+    "not_found" o "timeout"; el cliente puede reanudarlo con el último id.
+
+    Args:
+        backend (JobBackend): Backend de trabajos.
+        job_id (str): Id del trabajo.
+        last_seq (int): Último evento ya recibido por el cliente.
+        timeout (float): Segundos máximos del stream. Por defecto
+            `JOB_STREAM_TIMEOUT_SECONDS`.
+
+    Yields:
+        str: Eventos SSE.
+    """
+    deadline = time.monotonic() + (timeout or JOB_STREAM_TIMEOUT_SECONDS)
+    while True:
+        events = await backend.events_since(job_id, last_seq)
+        for event in events:
+            last_seq = event["seq"]
+            yield f"id: {last_seq}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            if event["type"] == "job" and event["status"] in JOB_FINAL_STATES:
+                return
+
+        status = None
+        if not events and await backend.get_job(job_id) is None:
+            status = "not_found"
+        elif time.monotonic() >= deadline:
+            status = "timeout"
+        if status:
+            error = {"type": "error", "status": status, "job_id": job_id}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
@@ -0,0 +1,657 @@
+# app/layout_templates.py
+"""
+Plantillas de diseño por emisor, aprendidas de extracciones validadas.
+
+Los estados de cuenta de un mismo emisor comparten diseño: cada etiqueta está
+siempre en la misma posición de la primera página y el valor del campo a una
+distancia fija de ella. Con eso:
+
+1. `page_runs` lee los textos de la primera página desde su content stream,
+   con su posición y fuente, sin pasar por `extract_text`.
+2. `fingerprint` calcula la huella del diseño: emisor, tamaño de página y
+   posición y fuente de las etiquetas conocidas (`statement_rules`,
+   `statement_text`). Si el emisor cambia el diseño cambia la huella, y la
+   plantilla nueva queda como otra versión del emisor.
+3. Si hay plantilla para la huella, `template_fields` lee los campos de
+   cliente y producto desde sus posiciones y los valida. Los extractores no
+   piden al LLM los campos resueltos.
+4. Después de una extracción completa, `learn_layout` registra dónde estaba
+   cada valor que obtuvo el LLM y pasó las validaciones. Una posición se usa recién cuando se repitió en
+   `LAYOUT_TEMPLATE_MIN_SAMPLES` documentos con la misma huella.
+
+Si un campo de la plantilla no aparece donde se esperaba (diseño modificado)
+se olvida su posición, se pide al LLM y se vuelve a aprender.
+"""
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from cache_store import DiskStore, MemoryLRUStore, TieredCache
+from metrics import log_event
+from page_classifier import decode_literal
+from statement_rules import (
+    BANK_LABELS,
+    CLIENT_FIELD_TYPES,
+    CLIENT_NAME_LABELS,
+    CLIENT_RUT_LABELS,
+    DEFAULT_LABELS,
+    PRODUCT_FIELD_TYPES,
+    detect_bank,
+    normalize_text,
+    rut_is_valid,
+    validate_product_fields,
+)
+from statement_text import DROPPED_SECTIONS, SECTION_MARKERS
+
+logger = logging.getLogger()
+
+# Permite desactivar las plantillas (todos los campos vuelven a reglas y LLM)
+LAYOUT_TEMPLATES_ENABLED = os.getenv("LAYOUT_TEMPLATES_ENABLED", "true") == "true"
+
+# Documentos con la misma posición de un campo antes de usarla
+LAYOUT_TEMPLATE_MIN_SAMPLES = int(os.getenv("LAYOUT_TEMPLATE_MIN_SAMPLES", "2"))
+
+# Tolerancia (puntos PDF) al comparar posiciones
+LAYOUT_POSITION_TOLERANCE = float(os.getenv("LAYOUT_POSITION_TOLERANCE", "2"))
+
+# Etiquetas conocidas mínimas en la primera página para calcular la huella
+LAYOUT_MIN_ANCHORS = int(os.getenv("LAYOUT_MIN_ANCHORS", "3"))
+
+LAYOUT_TEMPLATE_DIR = os.getenv(
+    "LAYOUT_TEMPLATE_DIR",
+    os.path.join(tempfile.gettempdir(), "kairos-layout-templates"),
+)
+LAYOUT_TEMPLATE_TTL_SECONDS = float(
+    os.getenv("LAYOUT_TEMPLATE_TTL_SECONDS", str(90 * 24 * 3600))
+)
+
+# Campos que se leen desde plantillas, por extractor
+TEMPLATE_FIELD_TYPES = {
+    "client": CLIENT_FIELD_TYPES,
+    "product": PRODUCT_FIELD_TYPES,
+}
+
+# Etiquetas de cada campo, para desambiguar valores repetidos al aprender
+FIELD_LABELS: Dict[str, List[str]] = {
+    **DEFAULT_LABELS,
+    "name": CLIENT_NAME_LABELS,
+    "rut": CLIENT_RUT_LABELS,
+}
+
+# Etiquetas que forman la huella del diseño (se buscan al inicio de cada texto).
+# Los encabezados de secciones descartadas no se usan: la publicidad cambia
+# de un mes a otro.
+ANCHOR_PATTERNS = [
+    re.compile(pattern)
+    for pattern in dict.fromkeys(
+        [label for labels in DEFAULT_LABELS.values() for label in labels]
+        + [
+            label
+            for bank in BANK_LABELS.values()
+            for labels in bank.values()
+            for label in labels
+        ]
+        + [
+            label
+            for section, labels in SECTION_MARKERS.items()
+            if section not in DROPPED_SECTIONS
+            for label in labels
+        ]
+        + [r"NOMBRE DEL TITULAR", r"NOMBRE TITULAR", r"R\.?U\.?T\.?(?= |:|$)"]
+    )
+]
+
+# Etiquetas que pueden anclar la posición de un campo. Al aprender solo se
+# guarda la etiqueta, nunca el resto de la línea (puede traer el nombre del
+# titular u otros datos del documento).
+LABEL_PATTERNS = list(
+    dict.fromkeys(
+        ANCHOR_PATTERNS
+        + [re.compile(label) for labels in FIELD_LABELS.values() for label in labels]
+    )
+)
+
+# Lo que puede haber entre una etiqueta y su valor en la misma línea
+_LABEL_SEPARATOR = re.compile(r"[\s:$.\-]*")
+
+_OPERAND = re.compile(
+    rb"(?P<literal>\((?:\\.|[^\\)])*\))"
+    rb"|(?P<hex><[0-9A-Fa-f\s]*>)"
+    rb"|(?P<array>\[(?:\((?:\\.|[^\\)])*\)|[^\]])*\])"
+    rb"|(?P<name>/[^\s/\[\]()<>{}%]+)"
+    rb"|(?P<number>[-+]?(?:\d+\.?\d*|\.\d+))"
+    rb"|(?P<operator>[A-Za-z*'\"]+)",
+    re.S,
+)
+_ARRAY_ITEM = re.compile(rb"(\((?:\\.|[^\\)])*\))|([-+]?(?:\d+\.?\d*|\.\d+))")
+
+# Ajuste de un TJ (milésimas de em) a partir del cual se asume un espacio
+_TJ_SPACE = -200
+
+# Forma de las plantillas guardadas. Cambiarla deja sin uso las anteriores
+# (expiran con `LAYOUT_TEMPLATE_TTL_SECONDS`); las de la forma 1 guardaban la
+# línea completa junto al valor en vez de solo la etiqueta.
+_TEMPLATE_FORMAT = "2"
+
+_template_store: Optional[TieredCache] = None
+_store_lock = threading.Lock()
+
+
+class TextRun(NamedTuple):
+    """Texto mostrado por un operador de la página, con su posición de inicio."""
+
+    x: float
+    y: float
+    font: str
+    text: str
+
+
+class PageLayout(NamedTuple):
+    """Textos de la primera página y huella de su diseño."""
+
+    runs: List[TextRun]
+    issuer: Optional[str]
+    fingerprint: Optional[str]
+
+
+def _array_text(array: bytes) -> str:
+    parts = []
+    for literal, adjustment in _ARRAY_ITEM.findall(array):
+        if literal:
+            parts.append(decode_literal(literal))
+        elif float(adjustment) <= _TJ_SPACE:
+            parts.append(" ")
+    return "".join(parts)
+
+
+def page_runs(data: bytes) -> List[TextRun]:
+    """
+    Lee los textos de un content stream con su posición (origen de la línea)
+    y fuente.
+
+    Se siguen los operadores de texto (`Tf`, `TL`, `Td`, `TD`, `Tm`, `T*`,
+    `Tj`, `TJ`, `'`, `"`); la matriz de transformación (`cm`) se ignora, lo
+    que basta para comparar documentos del mismo diseño. Los textos mostrados
+    sin moverse se unen al anterior. Los strings hexadecimales (fuentes CID)
+    no se leen.
+
+    Args:
+        data (bytes): Content stream decodificado de la página.
+
+    Returns:
+        List[TextRun]: Textos normalizados (`normalize_text`), en orden.
+    """
+    runs: List[TextRun] = []
+    operands: List[Tuple[str, bytes]] = []
+    font, leading = "", 0.0
+    line_x = line_y = 0.0
+    scale_x = scale_y = 1.0
+    moved = True
+
+    for match in _OPERAND.finditer(data):
+        kind = match.lastgroup
+        if kind != "operator":
+            operands.append((kind, match.group(0)))
+            continue
+
+        op = match.group(0).decode("latin-1")
+        numbers = [float(value) for k, value in operands if k == "number"]
+        if op == "BT":
+            line_x = line_y = 0.0
+            scale_x = scale_y = 1.0
+            moved = True
+        elif op == "Tf":
+            names = [value for k, value in operands if k == "name"]
+            font = names[-1][1:].decode("latin-1") if names else font
+        elif op == "TL" and numbers:
+            leading = numbers[-1]
+        elif op in ("Td", "TD") and len(numbers) >= 2:
+            line_x += numbers[-2] * scale_x
+            line_y += numbers[-1] * scale_y
+            if op == "TD":
+                leading = -numbers[-1]
+            moved = True
+        elif op == "Tm" and len(numbers) >= 6:
+            scale_x, scale_y = numbers[-6] or 1.0, numbers[-3] or 1.0
+            line_x, line_y = numbers[-2], numbers[-1]
+            moved = True
+        elif op == "T*":
+            line_y -= leading * scale_y
+            moved = True
+        elif op in ("Tj", "TJ", "'", '"'):
+            if op in ("'", '"'):
+                line_y -= leading * scale_y
+                moved = True
+            text = ""
+            for k, value in operands:
+                if k == "literal":
+                    text = decode_literal(value)
+                elif k == "array":
+                    text = _array_text(value)
+            if text:
+                if not moved and runs:
+                    last = runs[-1]
+                    runs[-1] = last._replace(text=last.text + text)
+                else:
+                    runs.append(TextRun(round(line_x, 1), round(line_y, 1), font, text))
+                moved = False
+        operands = []
+
+    return [
+        run._replace(text=normalize_text(run.text).strip())
+        for run in runs
+        if run.text.strip()
+    ]
+
+
+def _grid(value: float) -> int:
+    return int(round(value / LAYOUT_POSITION_TOLERANCE))
+
+
+def _anchor(text: str) -> Optional[str]:
+    """Etiqueta conocida más larga al inicio del texto."""
+    best = None
+    for pattern in ANCHOR_PATTERNS:
+        match = pattern.match(text)
+        if match and (best is None or len(match.group(0)) > len(best)):
+            best = match.group(0)
+    return best
+
+
+def _field_label(text: str) -> Optional[str]:
+    """Etiqueta conocida con que termina el texto (antes del valor), o None."""
+    best = None
+    for pattern in LABEL_PATTERNS:
+        for match in pattern.finditer(text):
+            if _LABEL_SEPARATOR.fullmatch(text, match.end()) and (
+                best is None or match.start() < best.start()
+            ):
+                best = match
+    return best.group(0).strip() if best else None
+
+
+def fingerprint(runs: List[TextRun], issuer: Optional[str], page_size: Tuple[float, float]) -> Optional[str]:
+    """
+    Calcula la huella del diseño de la primera página.
+
+    Args:
+        runs (List[TextRun]): Textos de la página.
+        issuer (Optional[str]): Emisor detectado (`detect_bank`).
+        page_size (Tuple[float, float]): Ancho y alto de la página.
+
+    Returns:
+        Optional[str]: Huella hexadecimal, o None si la página tiene menos de
+        `LAYOUT_MIN_ANCHORS` etiquetas conocidas.
+    """
+    anchors = set()
+    for run in runs:
+        label = _anchor(run.text)
+        if label:
+            anchors.add(f"{label}|{_grid(run.x)}|{_grid(run.y)}|{run.font}")
+
+    if len(anchors) < LAYOUT_MIN_ANCHORS:
+        return None
+
+    key = "\n".join(
+        [_TEMPLATE_FORMAT, issuer or "desconocido", f"{page_size[0]:.0f}x{page_size[1]:.0f}"]
+        + sorted(anchors)
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:24]
+
+
+def read_layout(file_content: Union[bytes, str]) -> Optional[PageLayout]:
+    """
+    Lee la primera página de un PDF y calcula la huella de su diseño.
+
+    Args:
+        file_content (Union[bytes, str]): Contenido del PDF o ruta al archivo.
+
+    Returns:
+        Optional[PageLayout]: Textos y huella, o None si las plantillas están
+        desactivadas o la página no se pudo leer.
+    """
+    if not LAYOUT_TEMPLATES_ENABLED:
+        return None
+
+    import PyPDF2
+
+    def _read(reader) -> Optional[PageLayout]:
+        page = reader.pages[0]
+        contents = page.get_contents()
+        if contents is None:
+            return None
+        runs = page_runs(contents.get_data())
+        issuer = detect_bank("\n".join(run.text for run in runs))
+        size = (float(page.mediabox.width), float(page.mediabox.height))
+        return PageLayout(runs, issuer, fingerprint(runs, issuer, size))
+
+    try:
+        if isinstance(file_content, str):
+            with open(file_content, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as buffer:
+                return _read(PyPDF2.PdfReader(buffer))
+        return _read(PyPDF2.PdfReader(io.BytesIO(file_content)))
+    except Exception as e:
+        logger.info(f"No se pudo leer el diseño de la primera página: {str(e)}")
+        return None
+
+
+def get_template_store() -> TieredCache:
+    """
+    Retorna el almacén de plantillas compartido (memoria y disco).
+
+    `LAYOUT_TEMPLATE_DIR` puede apuntar a un volumen compartido para que
+    todas las instancias aprendan de los mismos documentos.
+
+    Returns:
+        TieredCache: Almacén de plantillas.
+    """
+    global _template_store
+    if _template_store is None:
+        stores = [MemoryLRUStore(1024, LAYOUT_TEMPLATE_TTL_SECONDS)]
+        try:
+            stores.append(
+                DiskStore(LAYOUT_TEMPLATE_DIR, LAYOUT_TEMPLATE_TTL_SECONDS, 50 * 1024 * 1024)
+            )
+        except OSError as e:
+            logger.warning(f"Plantillas en disco deshabilitadas: {str(e)}")
+        _template_store = TieredCache(stores)
+    return _template_store
+
+
+def _near(run: TextRun, x: float, y: float) -> bool:
+    return (
+        abs(run.x - x) <= LAYOUT_POSITION_TOLERANCE
+        and abs(run.y - y) <= LAYOUT_POSITION_TOLERANCE
+    )
+
+
+def _find_run(runs: List[TextRun], x: float, y: float, label: str = "") -> Optional[TextRun]:
+    for run in runs:
+        if _near(run, x, y) and label in run.text:
+            return run
+    return None
+
+
+def _convert(text: str, field_type: tuple):
+    """Primer valor del tipo del campo dentro del texto, o None."""
+    pattern, convert = field_type
+    for match in re.finditer(pattern, text):
+        try:
+            return convert(match.group(1))
+        except ValueError:
+            continue
+    return None
+
+
+def _read_slot(runs: List[TextRun], slot: dict, field_type: tuple):
+    """Lee el valor de un campo desde la posición aprendida."""
+    anchor = _find_run(runs, slot["x"], slot["y"], slot["anchor"])
+    if anchor is None:
+        return None
+    if slot["mode"] == "inline":
+        label = re.search(re.escape(slot["anchor"]) + _LABEL_SEPARATOR.pattern, anchor.text)
+        return _convert(anchor.text[label.end():], field_type) if label else None
+
+    target = _find_run(runs, anchor.x + slot["dx"], anchor.y + slot["dy"])
+    return _convert(target.text, field_type) if target is not None else None
+
+
+def _validate(extractor: str, fields: dict) -> dict:
+    """Descarta los valores inconsistentes (RUT, tasas y cupos)."""
+    if extractor == "product":
+        return validate_product_fields(fields)
+    if "rut" in fields and not rut_is_valid(fields["rut"]):
+        return {key: value for key, value in fields.items() if key != "rut"}
+    return fields
+
+
+def _active_slot(candidates: dict) -> Optional[dict]:
+    """Posición con más documentos, si alcanza `LAYOUT_TEMPLATE_MIN_SAMPLES`."""
+    if not candidates:
+        return None
+    best = max(candidates.values(), key=lambda candidate: candidate["count"])
+    return best["slot"] if best["count"] >= LAYOUT_TEMPLATE_MIN_SAMPLES else None
+
+
+def template_fields(layout: Optional[PageLayout]) -> Dict[str, dict]:
+    """
+    Lee los campos de cliente y producto desde la plantilla del diseño.
+
+    Los campos que no aparecen donde indica la plantilla (diseño modificado)
+    o cuyo valor no valida se omiten y se olvida su posición, para volver a
+    aprenderla desde la extracción del LLM.
+
+    Args:
+        layout (Optional[PageLayout]): Resultado de `read_layout`.
+
+    Returns:
+        Dict[str, dict]: Campos por extractor ("client", "product"); vacío si
+        no hay plantilla.
+    """
+    if layout is None or layout.fingerprint is None:
+        return {}
+
+    store = get_template_store()
+    template = store.get(layout.fingerprint)
+    if template is None:
+        log_event("layout_template", issuer=layout.issuer, known=False)
+        return {}
+
+    fields, drifted = {}, []
+    for extractor, field_types in TEMPLATE_FIELD_TYPES.items():
+        values = {}
+        for field, field_type in field_types.items():
+            slot = _active_slot(template["fields"].get(field))
+            if slot is None:
+                continue
+            value = _read_slot(layout.runs, slot, field_type)
+            if value is None:
+                drifted.append(field)
+            else:
+                values[field] = value
+        valid = _validate(extractor, values)
+        drifted += [field for field in values if field not in valid]
+        if valid:
+            fields[extractor] = valid
+
+    if drifted:
+        logger.info(f"Plantilla {template['issuer']} v{template['version']} modificada: {drifted}")
+        with _store_lock:
+            template = store.get(layout.fingerprint) or template
+            for field in drifted:
+                template["fields"].pop(field, None)
+            store.set(layout.fingerprint, template)
+
+    log_event(
+        "layout_template",
+        issuer=template["issuer"],
+        version=template["version"],
+        known=True,
+        fields=sum(len(values) for values in fields.values()),
+        drifted=len(drifted),
+    )
+    return fields
+
+
+def _slot_key(slot: dict) -> str:
+    return json.dumps(slot, sort_keys=True)
+
+
+def _label_before(runs: List[TextRun], run: TextRun) -> Optional[TextRun]:
+    """Texto con letras más cercano a la izquierda en la misma línea o, si no hay, encima."""
+    same_line = [
+        other
+        for other in runs
+        if other is not run
+        and abs(other.y - run.y) <= LAYOUT_POSITION_TOLERANCE
+        and other.x < run.x
+        and re.search(r"[A-Z]{2}", other.text)
+    ]
+    if same_line:
+        return max(same_line, key=lambda other: other.x)
+
+    above = [
+        other
+        for other in runs
+        if other.y > run.y
+        and abs(other.x - run.x) <= LAYOUT_POSITION_TOLERANCE * 10
+        and re.search(r"[A-Z]{2}", other.text)
+    ]
+    return min(above, key=lambda other: other.y) if above else None
+
+
+def _same_value(found, value) -> bool:
+    if isinstance(found, float) or isinstance(value, float):
+        try:
+            return abs(float(found) - float(value)) < 1e-6
+        except (TypeError, ValueError):
+            return False
+    if isinstance(found, str):
+        return normalize_text(found).strip() == normalize_text(str(value)).strip()
+    return found == value
+
+
+def _locate(runs: List[TextRun], field: str, value, field_type: tuple, issuer: str) -> Optional[dict]:
+    """Posición del valor de un campo en la página, si es única."""
+    pattern, convert = field_type
+    normalized_value = normalize_text(str(value)).strip()
+    slots = []
+    for run in runs:
+        starts = {match.start() for match in re.finditer(pattern, run.text)}
+        if isinstance(value, str):
+            starts.add(run.text.find(normalized_value))
+        for start in sorted(starts - {-1}):
+            match = re.match(pattern, run.text[start:])
+            if not match:
+                continue
+            try:
+                found = convert(match.group(1))
+            except ValueError:
+                continue
+            if not _same_value(found, value):
+                continue
+
+            label = _field_label(run.text[:start])
+            if label is not None:
+                slots.append({"mode": "inline", "anchor": label, "x": run.x, "y": run.y})
+                continue
+            anchor = _label_before(runs, run)
+            label = _field_label(anchor.text) if anchor is not None else None
+            if label is not None and anchor.text.startswith(label):
+                slots.append(
+                    {
+                        "mode": "offset",
+                        "anchor": label,
+                        "x": anchor.x,
+                        "y": anchor.y,
+                        "dx": round(run.x - anchor.x, 1),
+                        "dy": round(run.y - anchor.y, 1),
+                    }
+                )
+
+    if len(slots) > 1:
+        # Valor repetido (p. ej. cupo utilizado = total facturado): usar la etiqueta del campo
+        labels = FIELD_LABELS.get(field, []) + BANK_LABELS.get(issuer, {}).get(field, [])
+        slots = [slot for slot in slots if any(re.search(label, slot["anchor"]) for label in labels)]
+    return slots[0] if len(slots) == 1 else None
+
+
+def learn_layout(layout: Optional[PageLayout], results: Dict[str, dict]) -> int:
+    """
+    Registra la posición de los valores validados de una extracción en la
+    plantilla de su diseño (creándola si es nueva).
+
+    Solo se aprenden campos cuyo valor aparece una única vez en la primera
+    página (o una vez junto a su etiqueta), junto a una etiqueta conocida, y
+    que pasan las validaciones de `statement_rules`. De cada posición se
+    guarda solo la etiqueta, no el resto de la línea. Nunca lanza
+    excepciones.
+
+    Args:
+        layout (Optional[PageLayout]): Resultado de `read_layout`.
+        results (Dict[str, dict]): Campos por extractor ("client",
+            "product") obtenidos del LLM; los que vienen de reglas o de la
+            misma plantilla no se deben pasar (ver `utils`).
+
+    Returns:
+        int: Campos registrados.
+    """
+    if layout is None or layout.fingerprint is None:
+        return 0
+
+    try:
+        located = {}
+        for extractor, field_types in TEMPLATE_FIELD_TYPES.items():
+            result = results.get(extractor) or {}
+            values = {
+                field: result[field]
+                for field in field_types
+                if result.get(field) not in (None, "", "No encontrado")
+            }
+            for field, value in _validate(extractor, values).items():
+                slot = _locate(layout.runs, field, value, field_types[field], layout.issuer)
+                if slot is not None:
+                    located[field] = slot
+        if not located:
+            return 0
+
+        store = get_template_store()
+        with _store_lock:
+            template = store.get(layout.fingerprint)
+            if template is None:
+                # Cada diseño nuevo de un emisor es una nueva versión de su plantilla
+                issuer_key = f"issuer-{layout.issuer or 'desconocido'}"
+                versions = store.get(issuer_key) or []
+                versions.append(layout.fingerprint)
+                store.set(issuer_key, versions)
+                template = {
+                    "fingerprint": layout.fingerprint,
+                    "issuer": layout.issuer,
+                    "version": len(versions),
+                    "samples": 0,
+                    "fields": {},
+                }
+                logger.info(
+                    f"Nueva plantilla de diseño {layout.issuer} v{template['version']}"
+                )
+
+            template["samples"] += 1
+            for field, slot in located.items():
+                candidates = template["fields"].setdefault(field, {})
+                key = _slot_key(slot)
+                candidate = candidates.setdefault(key, {"slot": slot, "count": 0})
+                candidate["count"] += 1
+            store.set(layout.fingerprint, template)
+
+        return len(located)
+    except Exception as e:
+        logger.warning(f"No se pudo aprender la plantilla de diseño: {type(e).__name__}: {str(e)}")
+        return 0
+
+
+def match_layout(file_content: Union[bytes, str]) -> Tuple[Optional[PageLayout], Dict[str, dict]]:
+    """
+    Lee el diseño de la primera página y los campos que resuelve su plantilla.
+
+    Args:
+        file_content (Union[bytes, str]): Contenido del PDF o ruta al archivo.
+
+    Returns:
+        Tuple[Optional[PageLayout], Dict[str, dict]]: Diseño (para
+        `learn_layout`) y campos por extractor (ver `template_fields`).
+    """
+    layout = read_layout(file_content)
+    try:
+        return layout, template_fields(layout)
+    except Exception as e:
+        logger.warning(f"No se pudo aplicar la plantilla de diseño: {type(e).__name__}: {str(e)}")
+        return layout, {}
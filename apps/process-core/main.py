@@ -1,16 +1,19 @@
 # main.py
+import asyncio
 import os
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from mangum import Mangum
-from routers import upload_router
+from metrics import LOG_LEVEL
+from jobs import JOB_EVENT_KEY
+from routers import job_dispatcher, upload_router
 
 load_dotenv()
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
 
 app = FastAPI(title="Lambda Function API", version="1.0")
 
@@ -35,4 +38,16 @@ async def root():
     return {"message": "Hello Kairo"}
 
 # Adaptador para AWS Lambda
-handler = Mangum(app, lifespan="off")
\ No newline at end of file
+asgi_handler = Mangum(app, lifespan="off")
+
+
+def handler(event, context):
+    """
+    Punto de entrada de Lambda: requests HTTP vía Mangum y trabajos de carga
+    asíncrona que la función se envía a sí misma (ver `jobs.LambdaJobDispatcher`).
+    """
+    if isinstance(event, dict) and JOB_EVENT_KEY in event:
+        # Mismo event loop que usa Mangum, que se mantiene entre invocaciones
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(job_dispatcher.run(event[JOB_EVENT_KEY]))
+    return asgi_handler(event, context)
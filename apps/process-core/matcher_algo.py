@@ -1,35 +1,33 @@
 import re
-import os
-import openai
+import time
 from fastapi import HTTPException
 
-# Configuración de OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from metrics import log_event
+from prompts.completion import acreate_completion
+from prompts.model_router import choose_route, record_route, routed_params
 
 # @REFACTOR: para que acá haga la recomendación financiera
 async def calculate_match_score(resume: str, job_description: str) -> dict:
  
-    print(f"\n calculate_match_score resume : {resume}")
-    print("::::::::::::::::::::::::::::::::::::::::::::::")
-    print(f"\n calculate_match_score job_description : {job_description}")
+    log_event("match_score_request", resume_chars=len(resume), job_chars=len(job_description))
 
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Eres un asistente que compara currículums con descripciones de trabajo, tu mayor propósito es encontrar la información mas exacta que coincida con el candidato. Puedes extraer sus habilidades o skills, para saber si coinciden con la descripción de trabajo, y tener su email que siempre cumpla con: '[\w\.-]+@[\w\.-]+\.\w{2,4}' la anterior expresión regular. Proporciona una puntuación numérica del 1 al 100.   "},
-                {"role": "user", "content": f"Currículum: {resume}\nDescripción del trabajo: {job_description} \nProporciona una puntuación del 1 al 100, seguida de una breve explicación de por qué le diste esa puntuación. La puntuación debe ser solo un número."}
-            ]
-        )
+        messages = [
+            {"role": "system", "content": "Eres un asistente que compara currículums con descripciones de trabajo, tu mayor propósito es encontrar la información mas exacta que coincida con el candidato. Puedes extraer sus habilidades o skills, para saber si coinciden con la descripción de trabajo, y tener su email que siempre cumpla con: '[\w\.-]+@[\w\.-]+\.\w{2,4}' la anterior expresión regular. Proporciona una puntuación numérica del 1 al 100.   "},
+            {"role": "user", "content": f"Currículum: {resume}\nDescripción del trabajo: {job_description} \nProporciona una puntuación del 1 al 100, seguida de una breve explicación de por qué le diste esa puntuación. La puntuación debe ser solo un número."}
+        ]
+        route = choose_route("match_score", messages)
+        start = time.perf_counter()
+        # Pasa por la caché de prompts y el gateway sin bloquear el event loop
+        response = await acreate_completion(**routed_params(route, {"messages": messages}))
+        record_route(route, time.perf_counter() - start, response)
         full_response   = response['choices'][0]['message']['content'].strip()
         score_match     = re.search(r'\b(\d+)\b', full_response)
         score           = int(score_match.group(1)) if score_match else 0
         explanation     = re.sub(r'^\d+\s*[:.-]\s*', '', full_response).strip()
         
-        print("::::::::::::::::::::::::::::::::::::::::::::::")
-        print(f"\n OPENAI score : {score}")
-        print(f"\n OPENAI explanation : {explanation}")
+        log_event("match_score", score=score)
 
 
 
@@ -0,0 +1,364 @@
+# app/merchant_categories.py
+"""
+Categorización local de movimientos por comercio.
+
+Los nombres de comercio conocidos se buscan en una sola pasada sobre cada
+descripción con un autómata Aho-Corasick. Lo que no se reconoce se envía al
+LLM en un único lote y las categorías aprendidas se guardan en el diccionario.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from statement_rules import normalize_text
+
+logger = logging.getLogger()
+
+# Permite desactivar la categorización local y volver a usar solo el LLM
+LOCAL_CATEGORIZER_ENABLED = os.getenv("LOCAL_CATEGORIZER_ENABLED", "true") == "true"
+
+# Archivo donde se guardan los comercios aprendidos del LLM
+MERCHANT_CATEGORIES_PATH = os.getenv(
+    "MERCHANT_CATEGORIES_PATH",
+    os.path.join(tempfile.gettempdir(), "kairos-merchant-categories.json"),
+)
+
+# Diccionario curado comercio -> categoría (texto normalizado)
+MERCHANT_CATEGORIES: Dict[str, str] = {
+    # combustible
+    "COPEC": "combustible",
+    "SHELL": "combustible",
+    "PETROBRAS": "combustible",
+    "ARAMCO": "combustible",
+    "ENEX": "combustible",
+    # movilidad
+    "UBER": "movilidad",
+    "CABIFY": "movilidad",
+    "DIDI": "movilidad",
+    "BEAT": "movilidad",
+    "METRO DE SANTIAGO": "movilidad",
+    "CARGA BIP": "movilidad",
+    "TURBUS": "movilidad",
+    "PULLMAN": "movilidad",
+    "AUTOPASE": "movilidad",
+    "COSTANERA NORTE": "movilidad",
+    # supermercados
+    "LIDER": "supermercados",
+    "JUMBO": "supermercados",
+    "UNIMARC": "supermercados",
+    "SANTA ISABEL": "supermercados",
+    "TOTTUS": "supermercados",
+    "ACUENTA": "supermercados",
+    "MAYORISTA 10": "supermercados",
+    "ALVI": "supermercados",
+    # restaurantes
+    "UBER EATS": "restaurantes",
+    "RAPPI": "restaurantes",
+    "PEDIDOSYA": "restaurantes",
+    "STARBUCKS": "restaurantes",
+    "MCDONALDS": "restaurantes",
+    "BURGER KING": "restaurantes",
+    "DOMINOS": "restaurantes",
+    "JUAN MAESTRO": "restaurantes",
+    "DOGGIS": "restaurantes",
+    # entretenimiento
+    "NETFLIX": "entretenimiento",
+    "SPOTIFY": "entretenimiento",
+    "CINEMARK": "entretenimiento",
+    "CINEPLANET": "entretenimiento",
+    "HBO": "entretenimiento",
+    "DISNEY": "entretenimiento",
+    "STEAM": "entretenimiento",
+    "PLAYSTATION": "entretenimiento",
+    "PUNTOTICKET": "entretenimiento",
+    # salud
+    "CRUZ VERDE": "salud",
+    "SALCOBRAND": "salud",
+    "AHUMADA": "salud",
+    "DR SIMI": "salud",
+    "FARMACIA": "salud",
+    "CLINICA": "salud",
+    "ISAPRE": "salud",
+    # servicios
+    "ENEL": "servicios",
+    "AGUAS ANDINAS": "servicios",
+    "METROGAS": "servicios",
+    "ENTEL": "servicios",
+    "MOVISTAR": "servicios",
+    "WOM": "servicios",
+    "CLARO": "servicios",
+    "VTR": "servicios",
+    # tiendas
+    "FALABELLA": "tiendas",
+    "PARIS": "tiendas",
+    "RIPLEY": "tiendas",
+    "HITES": "tiendas",
+    "LA POLAR": "tiendas",
+    "SODIMAC": "tiendas",
+    "EASY": "tiendas",
+    "MERCADOLIBRE": "tiendas",
+}
+
+# Descripciones que no son compras (pagos y abonos a la tarjeta)
+_NON_PURCHASE = re.compile(r"\b(PAGO|ABONO|MONTO CANCELADO|TRASPASO DEUDA)\b")
+
+_DATE = r"\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?"
+
+# Monto con "$" o con separador de miles ("$ 25.990", "-$ 1.000", "25.990"),
+# para no confundirlo con un número de cuotas
+_AMOUNT = r"-?\s?(?:\$\s?-?\d+(?:\.\d{3})*|\d{1,3}(?:\.\d{3})+)"
+
+# Línea de movimiento: "12/03/2024 COPEC ESTACION 123 $ 25.990". En las compras
+# en cuotas, después del monto de la operación pueden venir el valor cuota, la
+# cuota ("01/03") o el número de cuotas, que se ignoran
+_MOVEMENT_LINE = re.compile(
+    rf"^\s*({_DATE})\s+(.+?)\s+({_AMOUNT})(?:\s+(?:{_AMOUNT}|\d{{1,2}}/\d{{1,2}}|\d{{1,2}}))*\s*$"
+)
+
+# Línea que empieza con una fecha, aunque no se pueda leer como movimiento
+_DATED_LINE = re.compile(rf"^\s*{_DATE}\s+\S")
+
+
+class AhoCorasick:
+    """
+    Autómata Aho-Corasick para buscar muchos patrones en una sola pasada.
+
+    Solo se aceptan coincidencias de palabras completas y, si varias se
+    solapan, gana la más larga (p. ej. "UBER EATS" sobre "UBER").
+
+    Args:
+        patterns (Dict[str, str]): Patrón -> valor asociado.
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, str]]] = [[]]
+
+        for pattern, value in patterns.items():
+            self._add(pattern, value)
+        self._build()
+
+    def _add(self, pattern: str, value: str) -> None:
+        node = 0
+        for char in pattern:
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._output[node].append((len(pattern), value))
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                if node == 0:
+                    # Los hijos de la raíz siempre fallan hacia la raíz
+                    self._fail[child] = 0
+                    continue
+
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def search(self, text: str) -> Optional[str]:
+        """
+        Retorna el valor del patrón más largo encontrado como palabra completa.
+
+        Args:
+            text (str): Texto normalizado.
+
+        Returns:
+            Optional[str]: Valor asociado o None si no hay coincidencias.
+        """
+        best_length, best_value = 0, None
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+
+            for length, value in self._output[node]:
+                start = end - length + 1
+                before_ok = start == 0 or not text[start - 1].isalnum()
+                after_ok = end + 1 == len(text) or not text[end + 1].isalnum()
+                if before_ok and after_ok and length > best_length:
+                    best_length, best_value = length, value
+
+        return best_value
+
+
+def merchant_key(description: str) -> str:
+    """
+    Normaliza una descripción para usarla como nombre de comercio aprendido.
+
+    Se eliminan números y signos, y se conservan las tres primeras palabras
+    (p. ej. "COMERCIAL XYZ 1234 SANTIAGO" -> "COMERCIAL XYZ SANTIAGO").
+
+    Args:
+        description (str): Descripción del movimiento.
+
+    Returns:
+        str: Llave del comercio.
+    """
+    words = re.sub(r"[^A-ZÑ ]", " ", normalize_text(description)).split()
+    return " ".join(words[:3])
+
+
+def split_movement_lines(text: str) -> Tuple[List[Tuple[str, int]], List[str]]:
+    """
+    Extrae (descripción, monto) de las líneas de movimientos del estado de
+    cuenta y retorna aparte las líneas con fecha que no se pudieron leer. Se
+    omiten pagos y abonos a la tarjeta.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+
+    Returns:
+        Tuple[List[Tuple[str, int]], List[str]]: (movimientos encontrados,
+        líneas con fecha sin leer).
+    """
+    movements, unparsed = [], []
+    for line in normalize_text(text).splitlines():
+        match = _MOVEMENT_LINE.match(line)
+        if not match:
+            if _DATED_LINE.match(line) and not _NON_PURCHASE.search(line):
+                unparsed.append(line.strip())
+            continue
+        description, amount = match.group(2), match.group(3)
+        if _NON_PURCHASE.search(description):
+            continue
+        value = int(re.sub(r"\D", "", amount))
+        movements.append((description.strip(), -value if "-" in amount else value))
+    return movements, unparsed
+
+
+def parse_movement_lines(text: str) -> List[Tuple[str, int]]:
+    """
+    Extrae (descripción, monto) de las líneas de movimientos del estado de
+    cuenta. Se omiten pagos y abonos a la tarjeta.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+
+    Returns:
+        List[Tuple[str, int]]: Movimientos encontrados.
+    """
+    return split_movement_lines(text)[0]
+
+
+class MerchantCategorizer:
+    """
+    Categoriza descripciones de movimientos con el diccionario curado más
+    los comercios aprendidos, que se persisten en `path`.
+
+    Args:
+        path (str): Archivo JSON con los comercios aprendidos.
+    """
+
+    def __init__(self, path: str = MERCHANT_CATEGORIES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.learned: Dict[str, str] = self._load()
+        self._automaton = AhoCorasick({**MERCHANT_CATEGORIES, **self.learned})
+
+    def _load(self) -> Dict[str, str]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudieron leer los comercios aprendidos: {str(e)}")
+            return {}
+
+    def categorize(self, description: str) -> Optional[str]:
+        """
+        Retorna la categoría del movimiento o None si el comercio no se conoce.
+
+        Args:
+            description (str): Descripción del movimiento.
+
+        Returns:
+            Optional[str]: Categoría encontrada.
+        """
+        automaton = self._automaton
+        return automaton.search(normalize_text(description)) or automaton.search(
+            merchant_key(description)
+        )
+
+    def learn(self, mappings: Dict[str, str]) -> None:
+        """
+        Agrega comercios aprendidos al diccionario y los persiste.
+
+        Args:
+            mappings (Dict[str, str]): Comercio -> categoría.
+        """
+        new = {
+            merchant_key(merchant): category.strip().lower()
+            for merchant, category in mappings.items()
+            if merchant_key(merchant) and category
+        }
+        if not new:
+            return
+
+        with self._lock:
+            self.learned.update(new)
+            self._automaton = AhoCorasick({**MERCHANT_CATEGORIES, **self.learned})
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.learned, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"No se pudieron guardar los comercios aprendidos: {str(e)}")
+
+        logger.info(f"Comercios aprendidos: {new}")
+
+
+def sum_by_category(movements: Iterable[Tuple[str, int]], categories: List[str]) -> dict:
+    """
+    Suma los montos por categoría en una sola operación vectorizada.
+
+    Args:
+        movements (Iterable): (descripción, monto) de cada movimiento.
+        categories (List[str]): Categoría de cada movimiento, en el mismo orden.
+
+    Returns:
+        dict: Resultado con el formato de `extract_movements`:
+        {"categoria": [{"nombre": str, "total": int}, ...]}
+    """
+    import numpy as np
+
+    amounts = np.fromiter((amount for _, amount in movements), dtype=np.int64)
+    names, index = np.unique(np.asarray(categories, dtype=object), return_inverse=True)
+    totals = np.bincount(index, weights=amounts, minlength=len(names))
+
+    ranking = np.argsort(-totals, kind="stable")
+    return {
+        "categoria": [
+            {"nombre": str(names[i]), "total": int(round(totals[i]))} for i in ranking
+        ]
+    }
+
+
+_categorizer: Optional[MerchantCategorizer] = None
+
+
+def get_categorizer() -> MerchantCategorizer:
+    """Retorna el categorizador compartido del proceso."""
+    global _categorizer
+    if _categorizer is None:
+        _categorizer = MerchantCategorizer()
+    return _categorizer
@@ -0,0 +1,298 @@
+# app/metrics.py
+"""
+Métricas y trazas por etapa del pipeline.
+
+`span("etapa")` mide la duración de un bloque y la registra en el
+histograma `kairos_stage_duration_seconds`. Los errores se cuentan en
+`kairos_stage_errors_total` y los tokens de OpenAI en
+`kairos_llm_tokens_total`, asociados a la etapa en curso. La latencia y el
+costo de cada ruta de modelo (ver `prompts.model_router`) quedan en
+`kairos_llm_route_*`. Todo se expone en formato Prometheus en
+`GET /metrics`.
+
+Si `OTEL_ENABLED=true` y `opentelemetry-api` está instalado, cada etapa
+también se exporta como span de OpenTelemetry (el exportador se configura
+con las variables estándar `OTEL_*` o `opentelemetry-instrument`).
+
+`log_event` reemplaza los prints de depuración: escribe una línea JSON solo
+para una muestra de los eventos (`LOG_SAMPLE_RATE`).
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false") == "true"
+
+# Límites de los buckets de latencia (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace
+
+        _tracer = trace.get_tracer("kairos.process-core")
+    except ImportError:
+        logger.warning("OTEL_ENABLED=true pero opentelemetry-api no está instalado")
+
+_current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        key + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    """Contador monótono con labels."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(labels)} {value}"
+                for labels, value in sorted(self._values.items())
+            ]
+
+
+class Gauge(Counter):
+    """Valor instantáneo con labels."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+
+class Histogram:
+    """Histograma con buckets acumulados, suma y cantidad por labels."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [conteo por bucket (+Inf al final), suma]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    le = (("le", str(bound)),)
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    "kairos_stage_duration_seconds", "Duración de cada etapa del pipeline"
+)
+STAGE_ERRORS = Counter("kairos_stage_errors_total", "Errores por etapa del pipeline")
+LLM_CALLS = Counter(
+    "kairos_llm_calls_total", "Llamadas a OpenAI por etapa y origen (api o cache)"
+)
+LLM_TOKENS = Counter("kairos_llm_tokens_total", "Tokens de OpenAI por etapa y tipo")
+GAUGES = Gauge("kairos_component_state", "Estado de cachés y del gateway de OpenAI")
+LLM_ROUTE_DURATION = Histogram(
+    "kairos_llm_route_duration_seconds",
+    "Latencia de las llamadas a OpenAI por tarea, nivel de modelo y resultado",
+)
+LLM_ROUTE_COST = Counter(
+    "kairos_llm_route_cost_usd_total", "Costo estimado (USD) por tarea y nivel de modelo"
+)
+LLM_ROUTE_ESCALATIONS = Counter(
+    "kairos_llm_route_escalations_total", "Escalamientos a un nivel de modelo más fuerte"
+)
+UPLOAD_DEDUPE = Counter(
+    "kairos_upload_dedupe_total", "Cargas repetidas resueltas sin volver a extraer"
+)
+
+REGISTRY = (
+    STAGE_DURATION,
+    STAGE_ERRORS,
+    LLM_CALLS,
+    LLM_TOKENS,
+    GAUGES,
+    LLM_ROUTE_DURATION,
+    LLM_ROUTE_COST,
+    LLM_ROUTE_ESCALATIONS,
+    UPLOAD_DEDUPE,
+)
+
+
+def current_stage() -> Optional[str]:
+    """Retorna la etapa en curso (la del `span` más interno)."""
+    return _current_stage.get()
+
+
+@contextmanager
+def span(stage: str, **attributes) -> Iterator[None]:
+    """
+    Mide la duración de una etapa del pipeline.
+
+    Funciona tanto en código síncrono como alrededor de `await`. Los
+    atributos solo se envían a OpenTelemetry, no como labels de Prometheus.
+
+    Args:
+        stage (str): Nombre de la etapa (p. ej. "pdf_parse", "extractor.client").
+        **attributes: Atributos del span.
+    """
+    token = _current_stage.set(stage)
+    otel_span = _tracer.start_as_current_span(stage, attributes=attributes) if _tracer else None
+    if otel_span is not None:
+        otel_span.__enter__()
+
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        if otel_span is not None:
+            otel_span.__exit__(type(e), e, e.__traceback__)
+            otel_span = None
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+        if otel_span is not None:
+            otel_span.__exit__(None, None, None)
+        _current_stage.reset(token)
+
+
+def observe_stage(stage: str, seconds: float, error: BaseException = None) -> None:
+    """
+    Registra la duración de una etapa medida manualmente (p. ej. en un
+    generador, donde no se puede usar `span` alrededor de cada `yield`).
+
+    Args:
+        stage (str): Nombre de la etapa.
+        seconds (float): Duración.
+        error (BaseException): Error de la etapa, si falló.
+    """
+    STAGE_DURATION.observe(seconds, stage=stage)
+    if error is not None:
+        STAGE_ERRORS.inc(stage=stage, error=type(error).__name__)
+
+
+def record_llm_call(usage: dict = None, cached: bool = False) -> None:
+    """
+    Registra una llamada a OpenAI y sus tokens en la etapa en curso.
+
+    Args:
+        usage (dict): `usage` de la respuesta de OpenAI.
+        cached (bool): Si la respuesta vino de la caché de prompts.
+    """
+    stage = current_stage() or "unknown"
+    LLM_CALLS.inc(stage=stage, source="cache" if cached else "api")
+    if cached or not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        LLM_TOKENS.inc(usage.get(kind, 0), stage=stage, type=kind.split("_")[0])
+
+
+def set_component_state(component: str, values: dict) -> None:
+    """
+    Publica como gauges los valores numéricos de un dict de estadísticas
+    (p. ej. `TieredCache.stats()`), aplanando los dicts anidados.
+
+    Args:
+        component (str): Nombre del componente.
+        values (dict): Estadísticas.
+    """
+    for key, value in values.items():
+        if isinstance(value, dict):
+            set_component_state(f"{component}.{key}", value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            GAUGES.set(value, component=component, metric=key)
+
+
+def render_prometheus() -> str:
+    """
+    Retorna todas las métricas en el formato de texto de Prometheus.
+
+    Returns:
+        str: Cuerpo para `GET /metrics`.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def log_event(event: str, sample_rate: float = None, level: int = logging.INFO, **fields) -> None:
+    """
+    Escribe un evento como una línea JSON para una muestra de las llamadas.
+
+    Args:
+        event (str): Nombre del evento.
+        sample_rate (float): Fracción de eventos que se escriben. Por defecto
+            `LOG_SAMPLE_RATE`; los errores deberían usar 1.
+        level (int): Nivel de logging.
+        **fields: Campos del evento. No incluir datos del cliente.
+    """
+    rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate < 1 and random.random() >= rate:
+        return
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(
+        level,
+        json.dumps(
+            {"event": event, "stage": current_stage(), **fields},
+            ensure_ascii=False,
+            default=str,
+        ),
+    )
@@ -0,0 +1,99 @@
+# app/pipeline.py
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar, Union
+
+from utils import extract_document_text
+
+logger = logging.getLogger()
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Cantidad máxima de archivos procesados en paralelo dentro de un request
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4"))
+
+# Workers del pool que parsea PDFs (CPU-bound)
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+_pdf_executor: Optional[Executor] = None
+
+
+def get_pdf_executor() -> Executor:
+    """
+    Retorna el pool compartido para parsear PDFs.
+
+    Se intenta usar un pool de procesos para sacar PyPDF2 del event loop y del
+    GIL. En entornos sin soporte de semáforos POSIX (p. ej. AWS Lambda, que no
+    tiene /dev/shm) se usa un pool de threads.
+
+    Returns:
+        Executor: Pool de procesos o, si no está disponible, de threads.
+    """
+    global _pdf_executor
+    if _pdf_executor is None:
+        try:
+            _pdf_executor = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS)
+        except (OSError, NotImplementedError) as e:
+            logger.warning(
+                f"Pool de procesos no disponible ({str(e)}), se usan threads para PDFs"
+            )
+            _pdf_executor = ThreadPoolExecutor(max_workers=PDF_PARSE_WORKERS)
+    return _pdf_executor
+
+
+async def parse_document(file_content: Union[bytes, str], kind: str = "pdf") -> str:
+    """
+    Extrae el texto de un PDF, HTML o correo en el pool de parseo sin
+    bloquear el event loop.
+
+    Conviene pasar la ruta del archivo: al pool de procesos solo viaja la
+    ruta en vez de todo el contenido.
+
+    Args:
+        file_content (Union[bytes, str]): Contenido del archivo o ruta.
+        kind (str): "pdf", "html" o "eml" (ver `html_text.document_kind`).
+
+    Returns:
+        str: Texto del documento.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_pdf_executor(), extract_document_text, file_content, kind
+    )
+
+
+async def run_bounded(
+    items: Sequence[T],
+    worker: Callable[[int, T], Awaitable[R]],
+    max_concurrency: int = UPLOAD_MAX_CONCURRENCY,
+) -> List[R]:
+    """
+    Ejecuta `worker` sobre cada elemento con concurrencia acotada.
+
+    Los resultados se devuelven en el mismo orden de entrada. Si un elemento
+    falla, se cancelan los que siguen en curso y se propaga el error.
+
+    Args:
+        items (Sequence): Elementos a procesar.
+        worker (Callable): Corrutina que recibe (índice, elemento).
+        max_concurrency (int): Máximo de elementos procesándose a la vez.
+
+    Returns:
+        List: Resultados en el orden de `items`.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _run(index: int, item: T) -> R:
+        async with semaphore:
+            return await worker(index, item)
+
+    tasks = [asyncio.ensure_future(_run(i, item)) for i, item in enumerate(items)]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
@@ -0,0 +1,70 @@
+import json
+from typing import Dict
+
+from prompts.response_parser import LenientModel, arequest_json, decode_response, request_json
+
+# Prompt para OpenAI: Categorías de comercios desconocidos
+SYSTEM_PROMPT = """
+    eres experto analizando finanzas.
+
+    te adjunto una lista de descripciones de movimientos de una tarjeta de credito chilena.
+
+    clasifica cada descripcion en una categoria. las más comunes son:
+    supermercados, restaurantes, movilidad, combustible, entretenimiento, salud, servicios, tiendas.
+    considera otras relevantes. si no puedes identificar el comercio usa "otros".
+
+    por ejemplo: shell, copec, petrobras, aramco o similares son "combustible".
+    uber, cabify, didi o similares son "movilidad".
+
+    *Sin comentarios*
+    Por favor, responde siempre con un JSON que siga esta estructura exacta:
+    {
+        "comercios": {
+            "descripcion": "categoria"
+        }
+    }
+    donde cada key es la descripcion exacta que recibiste.
+    las categorias son en minusculas.
+"""
+
+
+class MerchantCategoriesResponse(LenientModel):
+    comercios: Dict[str, str] = {}
+
+
+def _completion_params(descriptions: list) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(descriptions, ensure_ascii=False)},
+        ],
+        "temperature": 0.2,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def parse_categories_response(content: str) -> dict:
+    # Procesar respuesta
+    tc_data = decode_response(content, MerchantCategoriesResponse)
+    return tc_data.get("comercios", {})
+
+
+def categorize_merchants(descriptions: list) -> dict:
+    """
+    Clasifica en un solo lote las descripciones de comercios desconocidos.
+
+    Args:
+        descriptions (list): Descripciones sin categoría local.
+
+    Returns:
+        dict: Descripción -> categoría.
+    """
+    return request_json(
+        _completion_params(descriptions), parse_categories_response, task="categorize"
+    )
+
+
+async def categorize_merchants_async(descriptions: list) -> dict:
+    return await arequest_json(
+        _completion_params(descriptions), parse_categories_response, task="categorize"
+    )
@@ -0,0 +1,198 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
+
+from clients import get_openai
+from metrics import record_llm_call
+from prompts.llm_gateway import get_gateway
+from prompts.prompt_cache import get_prompt_cache
+
+# Acumulador de tokens activo (ver `track_usage`)
+_usage_tracker: ContextVar[Optional[dict]] = ContextVar("usage_tracker", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[dict]:
+    """
+    Acumula las llamadas y tokens consumidos dentro del bloque.
+
+    El acumulador se propaga a las tareas de asyncio y threads creados dentro
+    del bloque, por lo que cubre también llamadas concurrentes.
+
+    Yields:
+        dict: Contadores `calls`, `cached_calls`, `prompt_tokens`,
+        `completion_tokens` y `total_tokens`. Las respuestas obtenidas desde
+        la caché de prompts no suman tokens.
+    """
+    usage = {
+        "calls": 0,
+        "cached_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+    }
+    token = _usage_tracker.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage_tracker.reset(token)
+
+
+def _record_usage(response) -> None:
+    record_llm_call(response.get("usage"))
+    usage = _usage_tracker.get()
+    if usage is None:
+        return
+
+    usage["calls"] += 1
+    response_usage = response.get("usage") or {}
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        usage[key] += response_usage.get(key, 0)
+
+
+def _record_cache_hit() -> None:
+    record_llm_call(cached=True)
+    usage = _usage_tracker.get()
+    if usage is not None:
+        usage["cached_calls"] += 1
+
+
+def _cached_response(kwargs: dict):
+    """Retorna la respuesta en caché con la misma forma que la de OpenAI."""
+    cache = get_prompt_cache()
+    cached = cache.get(kwargs) if cache else None
+    if cached is None:
+        return None
+
+    _record_cache_hit()
+    return get_openai().util.convert_to_openai_object(
+        {
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": cached["content"]},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": cached.get("usage", {}),
+            "cached": True,
+        }
+    )
+
+
+def _store_response(kwargs: dict, response) -> None:
+    cache = get_prompt_cache()
+    if cache is None:
+        return
+
+    choice = response.choices[0]
+    # Las respuestas cortadas por max_tokens no se reutilizan
+    if choice.get("finish_reason") == "length":
+        return
+    usage = response.get("usage") or {}
+    cache.set(kwargs, choice.message.content, {key: usage[key] for key in usage})
+
+
+def discard_cached_completion(**kwargs) -> None:
+    """
+    Elimina de la caché de prompts la respuesta de una llamada, p. ej.
+    cuando su contenido resultó inválido.
+
+    Args:
+        **kwargs: Parámetros de la llamada.
+    """
+    cache = get_prompt_cache()
+    if cache is not None:
+        cache.discard(kwargs)
+
+
+def create_completion(**kwargs):
+    """
+    Llama a la API de chat de OpenAI de forma bloqueante.
+
+    Si la misma llamada (modelo, mensajes normalizados y parámetros) ya se
+    hizo, se responde desde la caché de prompts. Si no, la llamada pasa por
+    el gateway (límites de RPM/TPM, reintentos y circuit breaker).
+
+    Args:
+        **kwargs: Parámetros de `openai.ChatCompletion.create`.
+
+    Returns:
+        Respuesta cruda de OpenAI.
+    """
+    response = _cached_response(kwargs)
+    if response is not None:
+        return response
+
+    response = get_gateway().call(
+        kwargs, lambda: get_openai().ChatCompletion.create(**kwargs)
+    )
+    _record_usage(response)
+    _store_response(kwargs, response)
+    return response
+
+
+async def acreate_completion(**kwargs):
+    """
+    Llama a la API de chat de OpenAI sin bloquear el event loop.
+
+    Usa la caché de prompts y el gateway igual que `create_completion`.
+
+    Args:
+        **kwargs: Parámetros de `openai.ChatCompletion.acreate`.
+
+    Returns:
+        Respuesta cruda de OpenAI.
+    """
+    response = await asyncio.to_thread(_cached_response, kwargs)
+    if response is not None:
+        return response
+
+    response = await get_gateway().acall(
+        kwargs, lambda: get_openai().ChatCompletion.acreate(**kwargs)
+    )
+    _record_usage(response)
+    await asyncio.to_thread(_store_response, kwargs, response)
+    return response
+
+
+async def astream_completion(**kwargs) -> AsyncIterator[str]:
+    """
+    Llama a la API de chat de OpenAI en modo streaming.
+
+    Args:
+        **kwargs: Parámetros de `openai.ChatCompletion.acreate` (sin `stream`).
+
+    Yields:
+        str: Fragmentos de texto a medida que el modelo los genera. Si la
+        respuesta está en la caché de prompts se entrega en un solo fragmento.
+    """
+    cache = get_prompt_cache()
+    cached = await asyncio.to_thread(cache.get, kwargs) if cache else None
+    if cached is not None:
+        _record_cache_hit()
+        yield cached["content"]
+        return
+
+    record_llm_call()
+    usage = _usage_tracker.get()
+    if usage is not None:
+        usage["calls"] += 1
+
+    parts = []
+    finish_reason = None
+    # El gateway cubre el inicio del stream; un corte a mitad no se reintenta
+    response = await get_gateway().acall(
+        kwargs, lambda: get_openai().ChatCompletion.acreate(stream=True, **kwargs)
+    )
+    async for chunk in response:
+        choice = chunk.choices[0]
+        finish_reason = choice.get("finish_reason") or finish_reason
+        content = choice.delta.get("content")
+        if content:
+            parts.append(content)
+            yield content
+
+    if cache and finish_reason != "length":
+        await asyncio.to_thread(cache.set, kwargs, "".join(parts))
@@ -1,72 +1,113 @@
-import openai
+import logging
 
+from metrics import log_event
+from prompts.response_parser import LenientModel, arequest_json, decode_response, request_json
+from statement_rules import RULES_FAST_PATH_ENABLED, field_sources, parse_client_fields
 
-def extract_client(text: str) -> dict:
-    # Prompt para OpenAI: Datos del cliente
-    system_prompt = """
-        eres experto analizando finanzas.
-        vas a extraer los datos de un cliente desde un pdf, el pdf es un estado de cuenta de la tarjeta de credito.
+logger = logging.getLogger()
 
-        toma solo las cuentas nacionales. No trabajas con cuentas internacionales y no trabajas con cuentas o movimientos en dolares.
+# Prompt para OpenAI: Datos del cliente
+SYSTEM_PROMPT = """
+    eres experto analizando finanzas.
+    vas a extraer los datos de un cliente desde un pdf, el pdf es un estado de cuenta de la tarjeta de credito.
 
-        identifica los datos que identifiquen al cliente, por ejemplo; nombre, rut.
+    toma solo las cuentas nacionales. No trabajas con cuentas internacionales y no trabajas con cuentas o movimientos en dolares.
 
-        Por favor, responde siempre con un JSON que siga esta estructura exacta:
-        {
-        "cliente": {
-        "rut": "string",
-        "nombre": "string"
-        }
-        }
-        donde la key "cliente" es para identificar toda la información de cliente.
-        las keys son en minusculas y sin espacios.
-    """
+    identifica los datos que identifiquen al cliente, por ejemplo; nombre, rut.
+
+    Por favor, responde siempre con un JSON que siga esta estructura exacta:
+    {
+    "cliente": {
+    "rut": "string",
+    "nombre": "string"
+    }
+    }
+    donde la key "cliente" es para identificar toda la información de cliente.
+    las keys son en minusculas y sin espacios.
+"""
+
+
+class ClientFields(LenientModel):
+    rut: str = None
+    nombre: str = None
+
+
+class ClientResponse(LenientModel):
+    cliente: ClientFields = ClientFields()
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": system_prompt},
+
+def _completion_params(text: str) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": text},
         ],
-        temperature=0.2,
-        max_tokens=800,
-        response_format={"type": "json_object"},
-    )
-    # Imprimir respuesta cruda de OpenAI
-    print("\n" + "=" * 50)
-    print("RESPUESTA CRUDA DE OPENAI:")
-    print("-" * 50)
-    print(response.choices[0].message.content)
-    print("=" * 50 + "\n")
-
-    # Procesar respuesta
-    tc_data = eval(response.choices[0].message.content)
-
-    # Debug de tc_data
-    print("\n" + "=" * 50)
-    print("DATOS EXTRAÍDOS (BANK DOCUMENT):")
-    print("-" * 50)
-    for key, value in tc_data.items():
-        print(f"{key}: {value}")
-    print("=" * 50 + "\n")
+        "temperature": 0.2,
+        "response_format": {"type": "json_object"},
+    }
 
+
+def build_client_result(tc_data: dict) -> dict:
     client = tc_data.get("cliente", {})
 
     # Crear diccionario final
-    result = {
+    return {
         "name": client.get("nombre", "No encontrado"),
         "rut": client.get("rut", "No encontrado"),
     }
 
-    # Debug del resultado final
-    print("\n" + "=" * 50)
-    print("RESULTADO FINAL PROCESADO:")
-    print("-" * 50)
-    for key, value in result.items():
-        if key == "texto_completo":
-            print(f"{key}: [TEXTO COMPLETO OMITIDO]")
-        else:
-            print(f"{key}: {value}")
-    print("=" * 50 + "\n")
 
+def parse_client_response(content: str) -> dict:
+    tc_data = decode_response(content, ClientResponse)
+    result = build_client_result(tc_data)
+
+    found = sum(1 for value in result.values() if value != "No encontrado")
+    log_event("llm_response", extractor="client", chars=len(content), fields=found)
     return result
+
+
+def _rule_fields(text: str) -> dict:
+    if not RULES_FAST_PATH_ENABLED:
+        return {}
+    return parse_client_fields(text)
+
+
+def _combine(rule_fields: dict, llm_result: dict = None, template_fields: dict = None) -> dict:
+    """Combina los campos de reglas y plantilla con los del LLM y registra su origen."""
+    known = {**(template_fields or {}), **rule_fields}
+    result = {**(llm_result or {"name": "No encontrado", "rut": "No encontrado"}), **known}
+
+    sources = field_sources(result, rule_fields, template_fields=template_fields)
+    logger.info(f"Origen de campos de cliente: {sources}")
+    return result
+
+
+def extract_client(text: str, known: dict = None) -> dict:
+    """
+    Extrae nombre y RUT del cliente.
+
+    Si el parser de reglas y la plantilla del diseño (`known`, ver
+    `layout_templates`) resuelven ambos campos no se llama a OpenAI.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+        known (dict): Campos ya resueltos por la plantilla del diseño.
+
+    Returns:
+        dict: Campos "name" y "rut".
+    """
+    rule_fields = _rule_fields(text)
+    if len({**(known or {}), **rule_fields}) == 2:
+        return _combine(rule_fields, template_fields=known)
+
+    result = request_json(_completion_params(text), parse_client_response, task="client")
+    return _combine(rule_fields, result, known)
+
+
+async def extract_client_async(text: str, known: dict = None) -> dict:
+    rule_fields = _rule_fields(text)
+    if len({**(known or {}), **rule_fields}) == 2:
+        return _combine(rule_fields, template_fields=known)
+
+    result = await arequest_json(_completion_params(text), parse_client_response, task="client")
+    return _combine(rule_fields, result, known)
@@ -1,70 +1,75 @@
-import openai
+from typing import List
 
+from metrics import log_event
+from prompts.response_parser import LenientModel, arequest_json, decode_response, request_json
 
-def extract_interests(text: str) -> dict:
-    # Prompt para OpenAI: Datos del cliente
-    system_prompt = """
-        eres experto analizando finanzas.
+# Prompt para OpenAI: Intereses, cargos y comisiones
+SYSTEM_PROMPT = """
+    eres experto analizando finanzas.
+
+    te adjunto un estado de cuenta de la tarjeta de credito.
+
+    necesito que analices todos los movimientos asociados a los intereses.
+
+    no trabajas con cuentas al extranjeno, solo con cuentas nacionales. Solo con monedas CLP.
 
-        te adjunto un estado de cuenta de la tarjeta de credito.
+    busca valores como cargos, comisiones, impuestos y abonos.
 
-        necesito que analices todos los movimientos asociados a los intereses.
+    *Sin comentarios*
+    Por favor, responde siempre con un JSON que siga esta estructura exacta:
+    {
+        "categoria": [
+            {"nombre": "string", "total": "integer"},
+        ]
+    }
+    el json serán todos los movimientos asociados a cada categoría.
+"""
 
-        no trabajas con cuentas al extranjeno, solo con cuentas nacionales. Solo con monedas CLP.
 
-        busca valores como cargos, comisiones, impuestos y abonos.
+class CategoryTotal(LenientModel):
+    nombre: str = "otros"
+    total: int = 0
 
-        *Sin comentarios*
-        Por favor, responde siempre con un JSON que siga esta estructura exacta:
-        {
-            "categoria": [
-                {"nombre": "string", "total": "integer"},
-            ]
-        }
-        el json serán todos los movimientos asociados a cada categoría.
-    """
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": system_prompt},
+class CategoryResponse(LenientModel):
+    categoria: List[CategoryTotal] = []
+
+
+def _completion_params(text: str) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": text},
         ],
-        temperature=0.2,
-        max_tokens=800,
-    )
-    # Imprimir respuesta cruda de OpenAI
-    print("\n" + "=" * 50)
-    print("RESPUESTA CRUDA DE OPENAI:")
-    print("-" * 50)
-    print(response.choices[0].message.content)
-    print("=" * 50 + "\n")
-
-    # Procesar respuesta
-    tc_data = eval(response.choices[0].message.content)
-
-    # Debug de tc_data
-    print("\n" + "=" * 50)
-    print("DATOS EXTRAÍDOS (BANK DOCUMENT):")
-    print("-" * 50)
-    for key, value in tc_data.items():
-        print(f"{key}: {value}")
-    print("=" * 50 + "\n")
+        "temperature": 0.2,
+    }
+
 
+def build_interests_result(tc_data: dict) -> dict:
     # Crear diccionario final
     movimientos = tc_data
 
-    result = movimientos
+    return movimientos
 
-    # Debug del resultado final
-    print("\n" + "=" * 50)
-    print("RESULTADO FINAL PROCESADO:")
-    print("-" * 50)
-    for key, value in result.items():
-        if key == "texto_completo":
-            print(f"{key}: [TEXTO COMPLETO OMITIDO]")
-        else:
-            print(f"{key}: {value}")
-    print("=" * 50 + "\n")
 
+def parse_interests_response(content: str) -> dict:
+    tc_data = decode_response(content, CategoryResponse)
+    result = build_interests_result(tc_data)
+
+    log_event(
+        "llm_response",
+        extractor="interests",
+        chars=len(content),
+        categories=len(result.get("categoria", [])),
+    )
     return result
+
+
+def extract_interests(text: str) -> dict:
+    return request_json(_completion_params(text), parse_interests_response, task="interests")
+
+
+async def extract_interests_async(text: str) -> dict:
+    return await arequest_json(
+        _completion_params(text), parse_interests_response, task="interests"
+    )
@@ -1,75 +1,186 @@
-import openai
+import asyncio
+import logging
+from typing import Optional
 
+from merchant_categories import (
+    LOCAL_CATEGORIZER_ENABLED,
+    get_categorizer,
+    split_movement_lines,
+    sum_by_category,
+)
+from metrics import log_event
+from prompts.categorize_merchants import categorize_merchants, categorize_merchants_async
+from prompts.extract_interests import CategoryResponse
+from prompts.response_parser import arequest_json, decode_response, request_json
 
-def extract_movements(text: str) -> dict:
-    # Prompt para OpenAI: Datos del cliente
-    system_prompt = """
-        eres experto analizando finanzas.
+logger = logging.getLogger()
 
-        te adjunto un estado de cuenta de la tarjeta de credito.
+# Prompt para OpenAI: Movimientos por categoría
+SYSTEM_PROMPT = """
+    eres experto analizando finanzas.
 
-        necesito que analices todos los movimientos asociados a una transacción.
+    te adjunto un estado de cuenta de la tarjeta de credito.
 
-        vas a extraer 3 campos. fechas, el nombre de la transaccion (descripcion) y el monto de la transaccion (cargos).
+    necesito que analices todos los movimientos asociados a una transacción.
 
-        luego, vas a clasificar las descripciones en categorias como titulo principal y vas a sumar todos los movimientos asociados. 
+    vas a extraer 3 campos. fechas, el nombre de la transaccion (descripcion) y el monto de la transaccion (cargos).
 
-        por ejemplo, si en el archivo encuentras: shell, copec, petrobras, aramco o similares, tendras que crear la categoria "combustible" y sumar todos los montos de las bencineras. 
+    luego, vas a clasificar las descripciones en categorias como titulo principal y vas a sumar todos los movimientos asociados.
 
-        otro ejemplo, si aparece uber, cabify, didi o similares, tendrás que crear la categoria "movilidad" y sumar todas las transacciones asociadas. 
+    por ejemplo, si en el archivo encuentras: shell, copec, petrobras, aramco o similares, tendras que crear la categoria "combustible" y sumar todos los montos de las bencineras.
+
+    otro ejemplo, si aparece uber, cabify, didi o similares, tendrás que crear la categoria "movilidad" y sumar todas las transacciones asociadas.
+
+    y así con todas las categorias que encuentres. las más comunes son: supermercados, restaurantes, movilidad, combustible, entretenimiento, salud. considera otras relevantes.
+    *Sin comentarios*
+    Por favor, responde siempre con un JSON que siga esta estructura exacta:
+    {
+        "categoria": [
+            {"nombre": "string", "total": "integer"},
+        ]
+    }
+    el json serán todos los movimientos asociados a cada categoría.
+"""
 
-        y así con todas las categorias que encuentres. las más comunes son: supermercados, restaurantes, movilidad, combustible, entretenimiento, salud. considera otras relevantes.
-        *Sin comentarios*
-        Por favor, responde siempre con un JSON que siga esta estructura exacta:
-        {
-            "categoria": [
-                {"nombre": "string", "total": "integer"},
-            ]
-        }
-        el json serán todos los movimientos asociados a cada categoría.
-    """
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": system_prompt},
+def _completion_params(text: str) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": text},
         ],
-        temperature=0.2,
-        max_tokens=800,
-    )
-    # Imprimir respuesta cruda de OpenAI
-    print("\n" + "=" * 50)
-    print("RESPUESTA CRUDA DE OPENAI:")
-    print("-" * 50)
-    print(response.choices[0].message.content)
-    print("=" * 50 + "\n")
-
-    # Procesar respuesta
-    tc_data = eval(response.choices[0].message.content)
-
-    # Debug de tc_data
-    print("\n" + "=" * 50)
-    print("DATOS EXTRAÍDOS (BANK DOCUMENT):")
-    print("-" * 50)
-    for key, value in tc_data.items():
-        print(f"{key}: {value}")
-    print("=" * 50 + "\n")
+        "temperature": 0.2,
+    }
+
 
+def build_movements_result(tc_data: dict) -> dict:
     # Crear diccionario final
     movimientos = tc_data
 
-    result = movimientos
+    return movimientos
+
 
-    # Debug del resultado final
-    print("\n" + "=" * 50)
-    print("RESULTADO FINAL PROCESADO:")
-    print("-" * 50)
-    for key, value in result.items():
-        if key == "texto_completo":
-            print(f"{key}: [TEXTO COMPLETO OMITIDO]")
-        else:
-            print(f"{key}: {value}")
-    print("=" * 50 + "\n")
+def parse_movements_response(content: str) -> dict:
+    tc_data = decode_response(content, CategoryResponse)
+    result = build_movements_result(tc_data)
 
+    log_event(
+        "llm_response",
+        extractor="movements",
+        chars=len(content),
+        categories=len(result.get("categoria", [])),
+    )
     return result
+
+
+def _categorize_locally(text: str) -> Optional[tuple]:
+    """
+    Categoriza los movimientos con el diccionario local de comercios.
+
+    Returns:
+        Optional[tuple]: (movimientos, categorías, descripciones desconocidas,
+        líneas con fecha sin leer) o None si no se pudieron leer las líneas de
+        movimientos.
+    """
+    if not LOCAL_CATEGORIZER_ENABLED:
+        return None
+
+    movements, unparsed = split_movement_lines(text)
+    if not movements:
+        return None
+
+    categorizer = get_categorizer()
+    categories = [categorizer.categorize(description) for description, _ in movements]
+    unknown = sorted(
+        {description for (description, _), category in zip(movements, categories) if category is None}
+    )
+    return movements, categories, unknown, unparsed
+
+
+def _summarize(
+    movements: list, categories: list, unknown: list, learned: dict, unparsed: list, extra: dict
+) -> dict:
+    if learned:
+        get_categorizer().learn(learned)
+
+    resolved = [
+        category or learned.get(description, "otros").strip().lower() or "otros"
+        for (description, _), category in zip(movements, categories)
+    ]
+    logger.info(
+        f"Movimientos categorizados localmente: {len(movements)} "
+        f"(desconocidos enviados al LLM: {len(unknown)}, "
+        f"líneas sin leer enviadas al LLM: {len(unparsed)})"
+    )
+
+    # Totales que el LLM calculó con las líneas que no se pudieron leer
+    extra_totals = extra.get("categoria", [])
+    movements = movements + [(item["nombre"], item["total"]) for item in extra_totals]
+    resolved += [item["nombre"].strip().lower() or "otros" for item in extra_totals]
+    return sum_by_category(movements, resolved)
+
+
+def extract_movements(text: str) -> dict:
+    """
+    Extrae los totales de movimientos por categoría.
+
+    Los comercios conocidos se categorizan localmente y solo los desconocidos
+    se envían a OpenAI, en una sola llamada. Las líneas con fecha que no se
+    pudieron leer como movimiento se envían con el prompt completo y sus
+    totales se suman a los locales. Si no se reconocen líneas de movimientos
+    se usa el prompt completo con todo el texto.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+
+    Returns:
+        dict: {"categoria": [{"nombre": str, "total": int}, ...]}
+    """
+    local = _categorize_locally(text)
+    if local is None:
+        return request_json(_completion_params(text), parse_movements_response, task="movements")
+
+    movements, categories, unknown, unparsed = local
+    learned = {}
+    if unknown:
+        try:
+            learned = categorize_merchants(unknown)
+        except Exception as e:
+            logger.warning(f"No se pudieron categorizar comercios desconocidos: {str(e)}")
+
+    extra = {}
+    if unparsed:
+        extra = request_json(
+            _completion_params("\n".join(unparsed)), parse_movements_response, task="movements"
+        )
+
+    return _summarize(movements, categories, unknown, learned, unparsed, extra)
+
+
+async def extract_movements_async(text: str) -> dict:
+    local = _categorize_locally(text)
+    if local is None:
+        return await arequest_json(
+            _completion_params(text), parse_movements_response, task="movements"
+        )
+
+    movements, categories, unknown, unparsed = local
+
+    async def categorize_unknown() -> dict:
+        if not unknown:
+            return {}
+        try:
+            return await categorize_merchants_async(unknown)
+        except Exception as e:
+            logger.warning(f"No se pudieron categorizar comercios desconocidos: {str(e)}")
+            return {}
+
+    async def extract_unparsed() -> dict:
+        if not unparsed:
+            return {}
+        return await arequest_json(
+            _completion_params("\n".join(unparsed)), parse_movements_response, task="movements"
+        )
+
+    learned, extra = await asyncio.gather(categorize_unknown(), extract_unparsed())
+    return _summarize(movements, categories, unknown, learned, unparsed, extra)
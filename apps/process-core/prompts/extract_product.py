@@ -1,79 +1,129 @@
-import openai
-
-
-def extract_product(text: str) -> dict:
-    # Prompt para OpenAI: Datos del cliente
-    system_prompt = """
-        eres experto analizando finanzas.
-        vas a extraer los datos de un cliente desde un pdf, el pdf es un estado de cuenta de la tarjeta de credito.
-
-        toma solo las cuentas nacionales. No trabajas con cuentas internacionales y no trabajas con cuentas o movimientos en dolares.
-
-        identifica los datos que identifiquen al producto, por ejemplo:
-        fecha_estado_cuenta, pagar_hasta, total_facturado, minimo_pagar, cupo total, cupo utilizado, cupo disponible, 
-        
-        Si es que aplican las tasas de interes o cae:
-        tasas_interes_vigente_rotativo, tasas_interes_vigente compra_en_cuotas,tasas interes_vigente  avance_en_cuotas, cae rotativo, cae compra en cuotas.
-        (Ten en cuenta que esto puede cambiar dependiendo del banco)
-
-        Por favor, responde siempre con un JSON que siga esta estructura exacta:
-        {
-        "producto": {
-        "nombre_titular": "string",
-        "numero_tarjeta": "string",
-        "fecha_estado_cuenta": "string",
-        "cupo_total": "integer",
-        "cupo_utilizado": "integer",
-        "cupo_disponible": "integer",
-        "cupo_total_avance_efectivo": "integer",
-        "cupo_utilizado_avance_efectivo": "integer",
-        "cupo_disponible_avance_efectivo": "integer",
-        "tasas_interes_vigente_rotativo": "float",
-        "tasas_interes_vigente_compra_cuotas": "float",
-        "tasas_interes_vigente_avance_cuotas": "float",
-        "cae_rotativo": "float",
-        "cae_compra_cuotas": "float",
-        "cae_avance_cuotas": "float",
-        "fecha_pagar_hasta": "string",
-        "monto_total_facturado": "integer",
-        "monto_minimo_pagar": "integer",
-        }
-        }
-        donde la key "producto" es para identificar toda la información del producto.
-        las keys son en minusculas y sin espacios.
-    """
+import json
+import logging
+
+from metrics import log_event
+from prompts.response_parser import (
+    LenientModel,
+    arequest_json,
+    decode_response,
+    model_from_schema,
+    request_json,
+)
+from statement_rules import RULES_FAST_PATH_ENABLED, field_sources, parse_product_fields
+
+logger = logging.getLogger()
+
+# Prompt para OpenAI: Datos del producto
+SYSTEM_PROMPT = """
+    eres experto analizando finanzas.
+    vas a extraer los datos de un cliente desde un pdf, el pdf es un estado de cuenta de la tarjeta de credito.
+
+    toma solo las cuentas nacionales. No trabajas con cuentas internacionales y no trabajas con cuentas o movimientos en dolares.
+
+    identifica los datos que identifiquen al producto, por ejemplo:
+    fecha_estado_cuenta, pagar_hasta, total_facturado, minimo_pagar, cupo total, cupo utilizado, cupo disponible,
+
+    Si es que aplican las tasas de interes o cae:
+    tasas_interes_vigente_rotativo, tasas_interes_vigente compra_en_cuotas,tasas interes_vigente  avance_en_cuotas, cae rotativo, cae compra en cuotas.
+    (Ten en cuenta que esto puede cambiar dependiendo del banco)
+
+    Por favor, responde siempre con un JSON que siga esta estructura exacta:
+    {
+    "producto": {
+    "nombre_titular": "string",
+    "numero_tarjeta": "string",
+    "fecha_estado_cuenta": "string",
+    "cupo_total": "integer",
+    "cupo_utilizado": "integer",
+    "cupo_disponible": "integer",
+    "cupo_total_avance_efectivo": "integer",
+    "cupo_utilizado_avance_efectivo": "integer",
+    "cupo_disponible_avance_efectivo": "integer",
+    "tasas_interes_vigente_rotativo": "float",
+    "tasas_interes_vigente_compra_cuotas": "float",
+    "tasas_interes_vigente_avance_cuotas": "float",
+    "cae_rotativo": "float",
+    "cae_compra_cuotas": "float",
+    "cae_avance_cuotas": "float",
+    "fecha_pagar_hasta": "string",
+    "monto_total_facturado": "integer",
+    "monto_minimo_pagar": "integer",
+    }
+    }
+    donde la key "producto" es para identificar toda la información del producto.
+    las keys son en minusculas y sin espacios.
+"""
+
+
+# Tipo esperado de cada campo del producto
+PRODUCT_SCHEMA = {
+    "nombre_titular": "string",
+    "numero_tarjeta": "string",
+    "fecha_estado_cuenta": "string",
+    "cupo_total": "integer",
+    "cupo_utilizado": "integer",
+    "cupo_disponible": "integer",
+    "cupo_total_avance_efectivo": "integer",
+    "cupo_utilizado_avance_efectivo": "integer",
+    "cupo_disponible_avance_efectivo": "integer",
+    "tasas_interes_vigente_rotativo": "float",
+    "tasas_interes_vigente_compra_cuotas": "float",
+    "tasas_interes_vigente_avance_cuotas": "float",
+    "cae_rotativo": "float",
+    "cae_compra_cuotas": "float",
+    "cae_avance_cuotas": "float",
+    "fecha_pagar_hasta": "string",
+    "monto_total_facturado": "integer",
+    "monto_minimo_pagar": "integer",
+}
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
+ProductFields = model_from_schema("ProductFields", PRODUCT_SCHEMA)
+
+
+class ProductResponse(LenientModel):
+    producto: ProductFields = ProductFields()
+
+
+# Prompt para OpenAI: Solo los campos que el parser de reglas no resolvió
+PARTIAL_SYSTEM_PROMPT = """
+    eres experto analizando finanzas.
+    vas a extraer los datos de un producto desde un pdf, el pdf es un estado de cuenta de la tarjeta de credito.
+
+    toma solo las cuentas nacionales. No trabajas con cuentas internacionales y no trabajas con cuentas o movimientos en dolares.
+
+    extrae solo los campos que se piden a continuación.
+    (Ten en cuenta que los nombres pueden cambiar dependiendo del banco)
+
+    Por favor, responde siempre con un JSON que siga esta estructura exacta:
+    {{
+    "producto": {schema}
+    }}
+    donde la key "producto" es para identificar toda la información del producto.
+    las keys son en minusculas y sin espacios.
+"""
+
+
+def _completion_params(text: str, fields: list = None) -> dict:
+    if fields is None or len(fields) == len(PRODUCT_SCHEMA):
+        system_prompt = SYSTEM_PROMPT
+    else:
+        schema = json.dumps({field: PRODUCT_SCHEMA[field] for field in fields}, indent=4)
+        system_prompt = PARTIAL_SYSTEM_PROMPT.format(schema=schema)
+
+    return {
+        "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": text},
         ],
-        temperature=0.2,
-        max_tokens=800,
-    )
-    # Imprimir respuesta cruda de OpenAI
-    print("\n" + "=" * 50)
-    print("RESPUESTA CRUDA DE OPENAI:")
-    print("-" * 50)
-    print(response.choices[0].message.content)
-    print("=" * 50 + "\n")
-
-    # Procesar respuesta
-    tc_data = eval(response.choices[0].message.content)
-
-    # Debug de tc_data
-    print("\n" + "=" * 50)
-    print("DATOS EXTRAÍDOS (BANK DOCUMENT):")
-    print("-" * 50)
-    for key, value in tc_data.items():
-        print(f"{key}: {value}")
-    print("=" * 50 + "\n")
+        "temperature": 0.2,
+    }
+
 
+def build_product_result(tc_data: dict) -> dict:
     product = tc_data.get("producto", {})
 
     # Crear diccionario final
-    result = {
+    return {
         "nombre_titular": product.get("nombre_titular", "No encontrado"),
         "numero_tarjeta": product.get("numero_tarjeta", "No encontrado"),
         "fecha_estado_cuenta": product.get("fecha_estado_cuenta", "No encontrado"),
@@ -106,15 +156,67 @@ def extract_product(text: str) -> dict:
         "monto_minimo_pagar": product.get("monto_minimo_pagar", "No encontrado"),
     }
 
-    # Debug del resultado final
-    print("\n" + "=" * 50)
-    print("RESULTADO FINAL PROCESADO:")
-    print("-" * 50)
-    for key, value in result.items():
-        if key == "texto_completo":
-            print(f"{key}: [TEXTO COMPLETO OMITIDO]")
-        else:
-            print(f"{key}: {value}")
-    print("=" * 50 + "\n")
 
+def parse_product_response(content: str) -> dict:
+    tc_data = decode_response(content, ProductResponse)
+    result = build_product_result(tc_data)
+
+    found = sum(1 for value in result.values() if value != "No encontrado")
+    log_event("llm_response", extractor="product", chars=len(content), fields=found)
     return result
+
+
+def _rule_fields(text: str) -> dict:
+    if not RULES_FAST_PATH_ENABLED:
+        return {}
+    return parse_product_fields(text)
+
+
+def _combine(rule_fields: dict, llm_result: dict = None, template_fields: dict = None) -> dict:
+    """Combina los campos de reglas y plantilla con los del LLM y registra su origen."""
+    known = {**(template_fields or {}), **rule_fields}
+    result = build_product_result({"producto": known})
+    if llm_result:
+        result = {**llm_result, **known}
+
+    sources = field_sources(result, rule_fields, template_fields=template_fields)
+    logger.info(f"Origen de campos de producto: {sources}")
+    return result
+
+
+def extract_product(text: str, known: dict = None) -> dict:
+    """
+    Extrae los datos del producto.
+
+    Primero se aplica el parser de reglas (`statement_rules`) y se suman los
+    campos ya leídos desde la plantilla del diseño (`known`, ver
+    `layout_templates`); solo los campos que faltan se piden a OpenAI.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+        known (dict): Campos ya resueltos por la plantilla del diseño.
+
+    Returns:
+        dict: Campos del producto.
+    """
+    rule_fields = _rule_fields(text)
+    missing = [field for field in PRODUCT_SCHEMA if field not in {**(known or {}), **rule_fields}]
+    if not missing:
+        return _combine(rule_fields, template_fields=known)
+
+    result = request_json(
+        _completion_params(text, missing), parse_product_response, task="product"
+    )
+    return _combine(rule_fields, result, known)
+
+
+async def extract_product_async(text: str, known: dict = None) -> dict:
+    rule_fields = _rule_fields(text)
+    missing = [field for field in PRODUCT_SCHEMA if field not in {**(known or {}), **rule_fields}]
+    if not missing:
+        return _combine(rule_fields, template_fields=known)
+
+    result = await arequest_json(
+        _completion_params(text, missing), parse_product_response, task="product"
+    )
+    return _combine(rule_fields, result, known)
@@ -0,0 +1,121 @@
+from metrics import log_event
+from prompts.extract_client import ClientFields, build_client_result
+from prompts.extract_interests import CategoryResponse, build_interests_result
+from prompts.extract_movements import build_movements_result
+from prompts.extract_product import ProductFields, build_product_result
+from prompts.response_parser import LenientModel, arequest_json, decode_response, request_json
+
+# Prompt para OpenAI: Estado de cuenta completo en una sola llamada
+SYSTEM_PROMPT = """
+    eres experto analizando finanzas.
+    vas a extraer desde un pdf, un estado de cuenta de la tarjeta de credito.
+
+    toma solo las cuentas nacionales. No trabajas con cuentas internacionales y no trabajas con cuentas o movimientos en dolares.
+
+    1. cliente: identifica los datos que identifiquen al cliente, por ejemplo; nombre, rut.
+
+    2. producto: identifica los datos del producto, por ejemplo:
+    fecha_estado_cuenta, pagar_hasta, total_facturado, minimo_pagar, cupo total, cupo utilizado, cupo disponible.
+    Si es que aplican las tasas de interes o cae:
+    tasas_interes_vigente_rotativo, tasas_interes_vigente compra_en_cuotas,tasas interes_vigente  avance_en_cuotas, cae rotativo, cae compra en cuotas.
+    (Ten en cuenta que esto puede cambiar dependiendo del banco)
+
+    3. movimientos: analiza todos los movimientos asociados a una transacción (fecha, descripcion y cargos).
+    clasifica las descripciones en categorias y suma todos los movimientos asociados.
+    por ejemplo, si encuentras: shell, copec, petrobras, aramco o similares, crea la categoria "combustible" y suma todos los montos de las bencineras.
+    si aparece uber, cabify, didi o similares, crea la categoria "movilidad" y suma todas las transacciones asociadas.
+    las categorias más comunes son: supermercados, restaurantes, movilidad, combustible, entretenimiento, salud. considera otras relevantes.
+
+    4. intereses: analiza todos los movimientos asociados a los intereses.
+    busca valores como cargos, comisiones, impuestos y abonos.
+
+    *Sin comentarios*
+    Por favor, responde siempre con un JSON que siga esta estructura exacta:
+    {
+    "cliente": {
+        "rut": "string",
+        "nombre": "string"
+    },
+    "producto": {
+        "nombre_titular": "string",
+        "numero_tarjeta": "string",
+        "fecha_estado_cuenta": "string",
+        "cupo_total": "integer",
+        "cupo_utilizado": "integer",
+        "cupo_disponible": "integer",
+        "cupo_total_avance_efectivo": "integer",
+        "cupo_utilizado_avance_efectivo": "integer",
+        "cupo_disponible_avance_efectivo": "integer",
+        "tasas_interes_vigente_rotativo": "float",
+        "tasas_interes_vigente_compra_cuotas": "float",
+        "tasas_interes_vigente_avance_cuotas": "float",
+        "cae_rotativo": "float",
+        "cae_compra_cuotas": "float",
+        "cae_avance_cuotas": "float",
+        "fecha_pagar_hasta": "string",
+        "monto_total_facturado": "integer",
+        "monto_minimo_pagar": "integer"
+    },
+    "movimientos": {
+        "categoria": [
+            {"nombre": "string", "total": "integer"}
+        ]
+    },
+    "intereses": {
+        "categoria": [
+            {"nombre": "string", "total": "integer"}
+        ]
+    }
+    }
+    las keys son en minusculas y sin espacios.
+"""
+
+
+class StatementResponse(LenientModel):
+    cliente: ClientFields = ClientFields()
+    producto: ProductFields = ProductFields()
+    movimientos: CategoryResponse = CategoryResponse()
+    intereses: CategoryResponse = CategoryResponse()
+
+
+def _completion_params(text: str) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": text},
+        ],
+        "temperature": 0.2,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def parse_statement_response(content: str) -> tuple:
+    tc_data = decode_response(content, StatementResponse)
+    log_event("llm_response", extractor="statement", chars=len(content))
+
+    client = build_client_result(tc_data)
+    product = build_product_result(tc_data)
+    movements = build_movements_result(tc_data.get("movimientos", {}))
+    interests = build_interests_result(tc_data.get("intereses", {}))
+
+    return client, product, movements, interests
+
+
+def extract_statement(text: str) -> tuple:
+    """
+    Extrae cliente, producto, movimientos e intereses con una sola llamada.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+
+    Returns:
+        tuple: (client, product, movements, interests), con el mismo formato
+        que los extractores individuales.
+    """
+    return request_json(_completion_params(text), parse_statement_response, task="statement")
+
+
+async def extract_statement_async(text: str) -> tuple:
+    return await arequest_json(
+        _completion_params(text), parse_statement_response, task="statement"
+    )
@@ -0,0 +1,422 @@
+"""
+Gateway compartido para las llamadas a OpenAI.
+
+Todas las llamadas de `prompts.completion` pasan por aquí:
+
+- Token buckets de requests por minuto (RPM) y tokens estimados por minuto
+  (TPM), para no superar los límites de la cuenta.
+- Cola de prioridad: cuando hay que esperar capacidad, las cargas
+  interactivas pasan antes que el trabajo batch (ver `llm_priority`).
+- Reintentos con backoff exponencial y jitter ante 429, timeouts y errores
+  del servidor, respetando `Retry-After` si viene.
+- Circuit breaker: tras varios errores seguidos se deja de llamar a OpenAI
+  por un tiempo y las llamadas fallan de inmediato con `CircuitOpenError`.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, TypeVar
+
+from statement_text import count_tokens
+
+logger = logging.getLogger()
+
+T = TypeVar("T")
+
+OPENAI_RPM_LIMIT = float(os.getenv("OPENAI_RPM_LIMIT", "3500"))
+OPENAI_TPM_LIMIT = float(os.getenv("OPENAI_TPM_LIMIT", "90000"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_RETRY_BASE_SECONDS = float(os.getenv("OPENAI_RETRY_BASE_SECONDS", "1"))
+OPENAI_RETRY_MAX_SECONDS = float(os.getenv("OPENAI_RETRY_MAX_SECONDS", "20"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
+
+# Prioridades: menor número, antes se atiende
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+# Intervalo máximo entre revisiones de la cola mientras se espera turno
+_POLL_SECONDS = 0.05
+
+# Errores de `openai.error` que vale la pena reintentar
+_RETRYABLE_ERRORS = (
+    "RateLimitError",
+    "Timeout",
+    "APIError",
+    "APIConnectionError",
+    "ServiceUnavailableError",
+    "TryAgain",
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """OpenAI falló de forma persistente y las llamadas están suspendidas."""
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """
+    Fija la prioridad de las llamadas a OpenAI hechas dentro del bloque
+    (incluidas las de tareas y threads creados dentro de él).
+
+    Args:
+        priority (int): `PRIORITY_INTERACTIVE`, `PRIORITY_BATCH` u otro valor.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(params: dict) -> int:
+    """
+    Estima los tokens de una llamada: mensajes más el máximo de respuesta.
+
+    Args:
+        params (dict): Parámetros de `ChatCompletion.create`.
+
+    Returns:
+        int: Tokens estimados.
+    """
+    prompt = sum(count_tokens(m.get("content") or "") for m in params.get("messages", []))
+    return prompt + int(params.get("max_tokens") or 0)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Indica si un error de OpenAI es transitorio."""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    return type(error).__module__.startswith("openai") and (
+        type(error).__name__ in _RETRYABLE_ERRORS
+    )
+
+
+def _retry_after(error: BaseException) -> float:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TokenBucket:
+    """
+    Token bucket con recarga continua.
+
+    Args:
+        per_minute (float): Capacidad y tasa de recarga por minuto.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos hasta que haya `amount` disponibles (0 si ya los hay)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas tras `threshold` fallas seguidas durante
+    `reset_seconds`. Luego deja pasar una llamada de prueba: si funciona se
+    cierra y si no, se vuelve a abrir.
+
+    Args:
+        threshold (int): Fallas seguidas que abren el circuito.
+        reset_seconds (float): Segundos que el circuito permanece abierto.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        """
+        Admite una llamada o la rechaza si el circuito está abierto.
+
+        Returns:
+            Token de la llamada de prueba si el circuito está medio abierto
+            (se libera con `release_trial`), o None.
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto o ya hay una
+            llamada de prueba en curso.
+        """
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._trial is not None):
+                raise CircuitOpenError("OpenAI no disponible, circuito abierto")
+            if state == "half_open":
+                self._trial = object()
+                return self._trial
+            return None
+
+    def release_trial(self, trial) -> None:
+        """
+        Libera la llamada de prueba si terminó sin registrar resultado (p. ej.
+        se canceló mientras esperaba turno), para que otra pueda probar.
+
+        Args:
+            trial: Token retornado por `before_call`.
+        """
+        with self._lock:
+            if trial is not None and self._trial is trial:
+                self._trial = None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            trial_failed = self._trial is not None
+            if trial_failed or self.failures >= self.threshold:
+                if self.opened_at is None or trial_failed:
+                    self.opens += 1
+                    logger.warning(
+                        f"Circuito de OpenAI abierto por {self.reset_seconds}s "
+                        f"tras {self.failures} fallas seguidas"
+                    )
+                self.opened_at = time.monotonic()
+                self._trial = None
+
+
+class LLMGateway:
+    """
+    Limita, prioriza y reintenta las llamadas a OpenAI. Es seguro usarlo
+    desde el event loop y desde threads a la vez.
+
+    Args:
+        rpm (float): Requests por minuto.
+        tpm (float): Tokens estimados por minuto.
+        max_retries (int): Reintentos por llamada ante errores transitorios.
+        breaker (CircuitBreaker): Circuit breaker compartido.
+        timeout (float): Segundos máximos por intento en `acall`.
+    """
+
+    def __init__(
+        self,
+        rpm: float,
+        tpm: float,
+        max_retries: int,
+        breaker: CircuitBreaker,
+        timeout: float = OPENAI_TIMEOUT_SECONDS,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.breaker = breaker
+        self.timeout = timeout
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self._queue: list = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enqueue(self, priority: int) -> list:
+        ticket = [priority, next(self._counter)]
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _try_admit(self, ticket: list, tokens: int) -> float:
+        """Retorna 0 si el ticket pasa (consumiendo capacidad) o cuánto esperar."""
+        with self._lock:
+            if self._queue[0] is not ticket:
+                return _POLL_SECONDS
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return min(wait, _POLL_SECONDS)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            heapq.heappop(self._queue)
+            return 0.0
+
+    def _leave(self, ticket: list) -> None:
+        with self._lock:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+
+    def _settle(self, estimated: int, response) -> None:
+        """Devuelve al bucket de tokens la diferencia con el consumo real."""
+        usage = response.get("usage") if hasattr(response, "get") else None
+        if not usage:
+            return
+        with self._lock:
+            self.tokens.refund(max(0, estimated - usage.get("total_tokens", estimated)))
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(
+            0, min(OPENAI_RETRY_MAX_SECONDS, OPENAI_RETRY_BASE_SECONDS * 2 ** attempt)
+        )
+        return max(delay, _retry_after(error))
+
+    def _on_error(self, error: BaseException, attempt: int) -> float:
+        """Registra la falla y retorna la espera antes de reintentar, o relanza."""
+        if not is_retryable(error):
+            # OpenAI respondió (p. ej. request inválido): no cuenta como caída
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        delay = self._backoff(attempt, error)
+        self.retries += 1
+        logger.warning(
+            f"OpenAI falló ({type(error).__name__}: {error}), "
+            f"reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s"
+        )
+        return delay
+
+    def call(self, params: dict, fn: Callable[[], T]) -> T:
+        """
+        Ejecuta una llamada bloqueante a OpenAI a través del gateway.
+
+        Args:
+            params (dict): Parámetros de la llamada (para estimar tokens).
+            fn (Callable): Función que hace la llamada.
+
+        Returns:
+            Respuesta de `fn`.
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto.
+        """
+        estimated = estimate_tokens(params)
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.before_call()
+            try:
+                ticket = self._enqueue(_priority.get())
+                try:
+                    while True:
+                        wait = self._try_admit(ticket, estimated)
+                        if not wait:
+                            break
+                        self.throttled_seconds += wait
+                        time.sleep(wait)
+                finally:
+                    self._leave(ticket)
+
+                try:
+                    response = fn()
+                except Exception as e:
+                    delay = self._on_error(e, attempt)
+                else:
+                    self.breaker.record_success()
+                    self._settle(estimated, response)
+                    return response
+            finally:
+                self.breaker.release_trial(trial)
+            time.sleep(delay)
+
+    async def acall(self, params: dict, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Versión asíncrona de `call`; `fn` retorna una corrutina nueva en cada
+        intento.
+
+        Cada intento tiene un tope de `timeout` segundos; vencerlo cuenta
+        como falla y se reintenta, así un OpenAI colgado termina abriendo el
+        circuito igual que uno que responde con error. Si en cambio quien
+        llama cancela la tarea, la cancelación se propaga sin tocar el
+        circuito (solo se libera la llamada de prueba).
+        """
+        estimated = estimate_tokens(params)
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.before_call()
+            try:
+                ticket = self._enqueue(_priority.get())
+                try:
+                    while True:
+                        wait = self._try_admit(ticket, estimated)
+                        if not wait:
+                            break
+                        self.throttled_seconds += wait
+                        await asyncio.sleep(wait)
+                finally:
+                    self._leave(ticket)
+
+                try:
+                    response = await asyncio.wait_for(fn(), self.timeout)
+                except Exception as e:
+                    delay = self._on_error(e, attempt)
+                else:
+                    self.breaker.record_success()
+                    self._settle(estimated, response)
+                    return response
+            finally:
+                self.breaker.release_trial(trial)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """
+        Retorna el estado del gateway.
+
+        Returns:
+            dict: Cola, reintentos, tiempo esperado por límites y circuito.
+        """
+        return {
+            "queued": len(self._queue),
+            "retries": self.retries,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "circuit_state": self.breaker.state,
+            "circuit_opens": self.breaker.opens,
+        }
+
+
+_gateway = LLMGateway(
+    OPENAI_RPM_LIMIT,
+    OPENAI_TPM_LIMIT,
+    OPENAI_MAX_RETRIES,
+    CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS),
+)
+
+
+def get_gateway() -> LLMGateway:
+    """Retorna el gateway compartido por todas las llamadas a OpenAI."""
+    return _gateway
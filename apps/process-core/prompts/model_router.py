@@ -0,0 +1,269 @@
+"""
+Elección del modelo y del presupuesto de salida de cada llamada a OpenAI.
+
+Cada tarea (extractor, categorización, sugerencia, ...) tiene una política:
+el nivel de modelo con que parte y cuántos tokens de respuesta necesita. El
+router cuenta los tokens de entrada y elige el primer nivel donde caben la
+entrada y la respuesta, recorriendo los niveles del más barato al más caro.
+Si `MODEL_TIERS` define un nivel "long", las entradas largas de las tareas
+con `long_input_tokens` pasan directo a ese nivel.
+
+Si la respuesta no pasa la validación después de volver a preguntar
+(`response_parser.request_json`), la llamada se repite una vez en el
+siguiente nivel. Cada llamada registra latencia y costo estimado por tarea y
+nivel en `GET /metrics` (`kairos_llm_route_*`) para ajustar la política.
+
+Los niveles y las políticas se pueden reemplazar con las variables
+`MODEL_TIERS` y `MODEL_ROUTING_POLICY` (JSON con la misma forma que
+`DEFAULT_TIERS` y `DEFAULT_POLICIES`).
+"""
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+from metrics import LLM_ROUTE_COST, LLM_ROUTE_DURATION, LLM_ROUTE_ESCALATIONS, log_event
+from statement_text import count_tokens
+
+logger = logging.getLogger()
+
+# Con el router desactivado todas las llamadas usan el primer nivel y
+# `LEGACY_MAX_TOKENS`, sin escalar
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true") == "true"
+
+# Escalamientos máximos por llamada cuando la respuesta no valida
+MODEL_MAX_ESCALATIONS = int(os.getenv("MODEL_MAX_ESCALATIONS", "1"))
+
+LEGACY_MAX_TOKENS = 800
+
+# Niveles de modelo, del más barato al más capaz. Precios en USD por 1K tokens.
+DEFAULT_TIERS: Dict[str, dict] = {
+    "fast": {
+        "model": "gpt-4o-mini",
+        "context_window": 128000,
+        "max_output_tokens": 16384,
+        "input_cost_1k": 0.00015,
+        "output_cost_1k": 0.0006,
+    },
+    "strong": {
+        "model": "gpt-4o",
+        "context_window": 128000,
+        "max_output_tokens": 16384,
+        "input_cost_1k": 0.0025,
+        "output_cost_1k": 0.01,
+    },
+}
+
+# Política por tarea:
+# - tier: nivel inicial.
+# - max_tokens: presupuesto base de respuesta.
+# - output_ratio: tokens de respuesta adicionales por token de entrada
+#   (tareas cuya respuesta crece con la entrada).
+# - long_input_tokens: sobre esta entrada se parte en el nivel "long", si
+#   `MODEL_TIERS` lo define (el nivel "fast" por defecto ya tiene contexto
+#   largo).
+DEFAULT_POLICIES: Dict[str, dict] = {
+    "client": {"tier": "fast", "max_tokens": 120},
+    "product": {"tier": "fast", "max_tokens": 600},
+    "interests": {"tier": "fast", "max_tokens": 400},
+    "movements": {"tier": "fast", "max_tokens": 800},
+    "statement": {"tier": "fast", "max_tokens": 1500},
+    "categorize": {"tier": "fast", "max_tokens": 200, "output_ratio": 1.5},
+    "suggestion": {"tier": "fast", "max_tokens": 400},
+    "match_score": {"tier": "fast", "max_tokens": 300},
+}
+
+MODEL_TIERS: Dict[str, dict] = json.loads(os.getenv("MODEL_TIERS", "null")) or DEFAULT_TIERS
+MODEL_ROUTING_POLICY: Dict[str, dict] = {
+    **DEFAULT_POLICIES,
+    **(json.loads(os.getenv("MODEL_ROUTING_POLICY", "null")) or {}),
+}
+
+
+def tier_cost(tier: dict) -> float:
+    """Precio de referencia de un nivel: entrada más salida por 1K tokens."""
+    return tier["input_cost_1k"] + tier["output_cost_1k"]
+
+
+# Orden de escalamiento: del más barato al más caro, también cuando
+# `MODEL_TIERS` viene desordenado (a igual precio se respeta el orden dado)
+TIER_ORDER: List[str] = sorted(MODEL_TIERS, key=lambda name: tier_cost(MODEL_TIERS[name]))
+
+# Tokens extra por mensaje del formato de chat
+_TOKENS_PER_MESSAGE = 4
+
+
+class Route(NamedTuple):
+    """Modelo elegido para una llamada."""
+
+    task: str
+    tier: str
+    model: str
+    max_tokens: int
+    input_tokens: int
+    escalations: int = 0
+
+
+def count_message_tokens(messages: List[dict]) -> int:
+    """
+    Cuenta los tokens de entrada de una lista de mensajes de chat.
+
+    Args:
+        messages (List[dict]): Mensajes (`role`, `content`).
+
+    Returns:
+        int: Tokens estimados.
+    """
+    return sum(
+        count_tokens(message.get("content") or "") + _TOKENS_PER_MESSAGE for message in messages
+    )
+
+
+def _output_budget(policy: dict, tier: dict, input_tokens: int) -> int:
+    budget = policy.get("max_tokens", LEGACY_MAX_TOKENS)
+    budget += int(policy.get("output_ratio", 0) * input_tokens)
+    return min(budget, tier["max_output_tokens"])
+
+
+def _route_from(
+    task: str, tiers: List[str], input_tokens: int, escalations: int
+) -> Optional[Route]:
+    """Primer nivel de `tiers` donde caben la entrada y la respuesta."""
+    policy = MODEL_ROUTING_POLICY.get(task, {})
+    for name in tiers:
+        tier = MODEL_TIERS[name]
+        max_tokens = _output_budget(policy, tier, input_tokens)
+        if input_tokens + max_tokens <= tier["context_window"]:
+            return Route(task, name, tier["model"], max_tokens, input_tokens, escalations)
+    return None
+
+
+def choose_route(task: str, messages: List[dict]) -> Route:
+    """
+    Elige el nivel de modelo y el presupuesto de respuesta de una llamada.
+
+    Args:
+        task (str): Tarea (ver `DEFAULT_POLICIES`).
+        messages (List[dict]): Mensajes de la llamada.
+
+    Returns:
+        Route: Modelo elegido. Si la entrada no cabe en ningún nivel se usa
+        el de mayor contexto y OpenAI rechazará la llamada.
+    """
+    input_tokens = count_message_tokens(messages)
+    first = TIER_ORDER[0]
+    if not MODEL_ROUTING_ENABLED:
+        return Route(task, first, MODEL_TIERS[first]["model"], LEGACY_MAX_TOKENS, input_tokens)
+
+    policy = MODEL_ROUTING_POLICY.get(task, {})
+    start = policy.get("tier", first)
+    if input_tokens > policy.get("long_input_tokens", float("inf")) and "long" in MODEL_TIERS:
+        start = "long"
+
+    route = _route_from(task, TIER_ORDER[TIER_ORDER.index(start):], input_tokens, 0)
+    if route is None:
+        name = max(TIER_ORDER, key=lambda tier: MODEL_TIERS[tier]["context_window"])
+        tier = MODEL_TIERS[name]
+        max_tokens = _output_budget(policy, tier, input_tokens)
+        route = Route(task, name, tier["model"], max_tokens, input_tokens)
+    return route
+
+
+def escalate(route: Route) -> Optional[Route]:
+    """
+    Retorna la ruta del siguiente nivel de modelo tras una respuesta que no
+    validó, o None si no quedan niveles o escalamientos.
+
+    Args:
+        route (Route): Ruta que falló.
+
+    Returns:
+        Optional[Route]: Ruta del nivel siguiente.
+    """
+    if not MODEL_ROUTING_ENABLED or route.escalations >= MODEL_MAX_ESCALATIONS:
+        return None
+
+    stronger = TIER_ORDER[TIER_ORDER.index(route.tier) + 1:]
+    escalated = _route_from(route.task, stronger, route.input_tokens, route.escalations + 1)
+    if escalated is not None:
+        LLM_ROUTE_ESCALATIONS.inc(task=route.task, source=route.tier, target=escalated.tier)
+        logger.warning(
+            f"Respuesta inválida de {route.model} para {route.task}, se escala a {escalated.model}"
+        )
+    return escalated
+
+
+def routed_params(route: Route, params: dict) -> dict:
+    """
+    Aplica el modelo y el presupuesto de respuesta de una ruta a los
+    parámetros de una llamada.
+
+    Args:
+        route (Route): Ruta elegida.
+        params (dict): Parámetros de `ChatCompletion.create` (sin modelo).
+
+    Returns:
+        dict: Parámetros completos.
+    """
+    return {**params, "model": route.model, "max_tokens": route.max_tokens}
+
+
+def estimate_cost(route: Route, usage: dict) -> float:
+    """
+    Estima el costo (USD) de una llamada según el precio de su nivel.
+
+    Args:
+        route (Route): Ruta de la llamada.
+        usage (dict): `usage` de la respuesta de OpenAI.
+
+    Returns:
+        float: Costo estimado.
+    """
+    tier = MODEL_TIERS[route.tier]
+    return (
+        usage.get("prompt_tokens", 0) * tier["input_cost_1k"]
+        + usage.get("completion_tokens", 0) * tier["output_cost_1k"]
+    ) / 1000
+
+
+def record_route(
+    route: Optional[Route],
+    seconds: float,
+    response=None,
+    outcome: str = "ok",
+    usage: dict = None,
+) -> None:
+    """
+    Registra la latencia y el costo de una llamada en las métricas de su ruta.
+
+    Las respuestas obtenidas desde la caché de prompts no suman costo.
+
+    Args:
+        route (Optional[Route]): Ruta de la llamada (None no registra nada).
+        seconds (float): Duración de la llamada.
+        response: Respuesta de OpenAI, si la hubo.
+        outcome (str): "ok", "invalid" (no pasó la validación) o "error".
+        usage (dict): Tokens de la llamada si no vienen en `response`
+            (p. ej. streaming).
+    """
+    if route is None:
+        return
+
+    cached = bool(response is not None and response.get("cached"))
+    if usage is None and response is not None:
+        usage = response.get("usage") or {}
+    cost = 0.0 if cached else estimate_cost(route, usage or {})
+
+    labels = {"task": route.task, "tier": route.tier, "model": route.model}
+    LLM_ROUTE_DURATION.observe(seconds, outcome="cache" if cached else outcome, **labels)
+    LLM_ROUTE_COST.inc(cost, **labels)
+    log_event(
+        "llm_route",
+        **labels,
+        outcome=outcome,
+        cached=cached,
+        seconds=round(seconds, 3),
+        input_tokens=route.input_tokens,
+        max_tokens=route.max_tokens,
+        cost_usd=round(cost, 6),
+    )
@@ -0,0 +1,146 @@
+"""
+Caché de respuestas de OpenAI por prompt.
+
+Muchas entradas se repiten entre usuarios y estados de cuenta (las mismas
+secciones de un banco, el mismo `history` para la sugerencia), así que las
+respuestas se guardan por modelo, mensajes normalizados y parámetros de
+generación. La usan todas las llamadas de `prompts.completion`.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Optional
+
+from cache_store import DiskStore, MemoryLRUStore, SQLiteStore, TieredCache
+
+logger = logging.getLogger()
+
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true") == "true"
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "1024"))
+PROMPT_CACHE_MAX_MEMORY_BYTES = int(
+    os.getenv("PROMPT_CACHE_MAX_MEMORY_BYTES", str(32 * 1024 * 1024))
+)
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Nivel persistente: "sqlite", "disk" o "none"
+PROMPT_CACHE_BACKEND = os.getenv("PROMPT_CACHE_BACKEND", "sqlite")
+PROMPT_CACHE_PATH = os.getenv(
+    "PROMPT_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "kairos-prompt-cache.sqlite3"),
+)
+PROMPT_CACHE_MAX_BYTES = int(
+    os.getenv("PROMPT_CACHE_MAX_BYTES", str(100 * 1024 * 1024))
+)
+
+# Parámetros que cambian la respuesta además de los mensajes
+_KEY_PARAMS = ("model", "temperature", "max_tokens", "response_format", "top_p")
+
+_prompt_cache: Optional["PromptCache"] = None
+
+
+def normalize_content(content: str) -> str:
+    """
+    Normaliza el texto de un mensaje para la llave de caché: espacios
+    repetidos y saltos de línea se reducen a uno.
+
+    Args:
+        content (str): Texto del mensaje.
+
+    Returns:
+        str: Texto normalizado.
+    """
+    return re.sub(r"\s+", " ", content or "").strip()
+
+
+def prompt_key(params: dict) -> str:
+    """
+    Calcula la llave de caché de una llamada a OpenAI.
+
+    Args:
+        params (dict): Parámetros de `ChatCompletion.create`.
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+    payload = {
+        "messages": [
+            [message.get("role"), normalize_content(message.get("content"))]
+            for message in params.get("messages", [])
+        ],
+        **{name: params.get(name) for name in _KEY_PARAMS},
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    Caché de respuestas de OpenAI.
+
+    Se guarda solo lo que usan los llamadores: el contenido de la respuesta
+    y el consumo de tokens.
+
+    Args:
+        cache (TieredCache): Niveles de almacenamiento.
+    """
+
+    def __init__(self, cache: TieredCache):
+        self.cache = cache
+
+    def get(self, params: dict) -> Optional[dict]:
+        return self.cache.get(prompt_key(params))
+
+    def set(self, params: dict, content: str, usage: dict = None) -> None:
+        self.cache.set(prompt_key(params), {"content": content, "usage": usage or {}})
+
+    def discard(self, params: dict) -> None:
+        """Elimina una respuesta que resultó inválida para que no se reutilice."""
+        self.cache.delete(prompt_key(params))
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+def get_prompt_cache() -> Optional[PromptCache]:
+    """
+    Retorna la caché de prompts compartida o None si está deshabilitada.
+
+    Si el nivel persistente no es utilizable se usa solo la memoria.
+
+    Returns:
+        Optional[PromptCache]: Caché compartida.
+    """
+    global _prompt_cache
+    if not PROMPT_CACHE_ENABLED:
+        return None
+
+    if _prompt_cache is None:
+        stores = [
+            MemoryLRUStore(
+                PROMPT_CACHE_MAX_ENTRIES,
+                PROMPT_CACHE_TTL_SECONDS,
+                PROMPT_CACHE_MAX_MEMORY_BYTES,
+            )
+        ]
+        try:
+            if PROMPT_CACHE_BACKEND == "sqlite":
+                stores.append(
+                    SQLiteStore(
+                        PROMPT_CACHE_PATH, PROMPT_CACHE_TTL_SECONDS, PROMPT_CACHE_MAX_BYTES
+                    )
+                )
+            elif PROMPT_CACHE_BACKEND == "disk":
+                stores.append(
+                    DiskStore(
+                        os.path.splitext(PROMPT_CACHE_PATH)[0],
+                        PROMPT_CACHE_TTL_SECONDS,
+                        PROMPT_CACHE_MAX_BYTES,
+                    )
+                )
+        except OSError as e:
+            logger.warning(f"Caché de prompts persistente deshabilitada: {str(e)}")
+        _prompt_cache = PromptCache(TieredCache(stores))
+
+    return _prompt_cache
@@ -0,0 +1,412 @@
+"""
+Decodificación de las respuestas JSON de los extractores.
+
+Cada respuesta pasa por tres etapas, de la más barata a la más cara:
+
+1. Parseo directo con `orjson` (si está instalado) o `json`.
+2. Reparación local de defectos comunes: bloques ```json, texto alrededor
+   del JSON, comas finales, arreglos/objetos truncados y dicts con sintaxis
+   de Python.
+3. Como último recurso, se vuelve a preguntar solo al extractor que falló
+   (`request_json` / `arequest_json`) y, si sigue sin validar, se repite en
+   un nivel de modelo más fuerte (`model_router`).
+
+El resultado se valida contra un modelo de pydantic; los valores escalares
+se convierten al tipo del esquema (p. ej. "$1.234.567" -> 1234567) y los que
+no se pueden convertir se descartan en vez de fallar.
+"""
+import ast
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError, create_model, validator
+from pydantic.fields import SHAPE_SINGLETON
+
+from prompts.completion import (
+    acreate_completion,
+    create_completion,
+    discard_cached_completion,
+)
+from prompts.model_router import Route, choose_route, escalate, record_route, routed_params
+
+logger = logging.getLogger()
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+    _DECODE_ERRORS = (orjson.JSONDecodeError, TypeError)
+except ImportError:
+    _loads = json.loads
+    _DECODE_ERRORS = (json.JSONDecodeError, TypeError)
+
+T = TypeVar("T")
+
+# Veces que se vuelve a preguntar al modelo si su respuesta no se pudo reparar
+RESPONSE_REASK_ATTEMPTS = int(os.getenv("RESPONSE_REASK_ATTEMPTS", "1"))
+
+REASK_PROMPT = """
+    tu respuesta anterior no se pudo leer: {error}.
+    responde de nuevo solo con el JSON completo y válido, con la estructura pedida.
+    *Sin comentarios*
+"""
+
+# Tipos de los esquemas de los prompts
+SCHEMA_TYPES = {"string": str, "integer": int, "float": float}
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)\s*(?:```|$)", re.S)
+_DANGLING_KEY = re.compile(r'[{,]\s*"(?:[^"\\]|\\.)*"$')
+_NUMBER = re.compile(r"\d[\d.,]*\d|\d")
+_PARTIAL_LITERAL = re.compile(r"(?<=[:\[,])\s*(?:-|\d+\.|t|tr|tru|f|fa|fal|fals|n|nu|nul)$")
+
+
+class ResponseParseError(ValueError):
+    """La respuesta del modelo no se pudo convertir al esquema esperado."""
+
+
+def _coerce_int(value: Any) -> Optional[int]:
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str):
+        # Montos en CLP ("$ 1.234.567", "-$8.786", "1234567,00") o con formato
+        # de EE.UU. ("$558,786", "1,234,567.00")
+        number = _NUMBER.search(value)
+        if not number:
+            return None
+        amount = number.group(0)
+        last = max(amount.rfind("."), amount.rfind(","))
+        # Un separador seguido de exactamente 3 dígitos es de miles; si no, de decimales
+        if last >= 0 and len(amount) - last - 1 != 3:
+            amount = amount[:last]
+        digits = re.sub(r"\D", "", amount)
+        negative = "-" in value[: number.start()]
+        return -int(digits) if negative else int(digits)
+    return None
+
+
+def _coerce_float(value: Any) -> Optional[float]:
+    if isinstance(value, str):
+        number = value.replace("%", "").strip()
+        if "," in number:
+            number = number.replace(".", "").replace(",", ".")
+        try:
+            return float(number)
+        except ValueError:
+            return None
+    return None
+
+
+def _coerce_str(value: Any) -> Optional[str]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+_COERCERS = {int: _coerce_int, float: _coerce_float, str: _coerce_str}
+
+
+class LenientModel(BaseModel):
+    """
+    Modelo base que convierte los valores escalares al tipo del campo y usa
+    el valor por defecto si no se pueden convertir.
+    """
+
+    @validator("*", pre=True, allow_reuse=True)
+    def _coerce(cls, value, field):
+        if value is None or field.shape != SHAPE_SINGLETON:
+            return value
+
+        expected = field.type_
+        if expected not in _COERCERS:
+            return value
+        if isinstance(value, expected) and not isinstance(value, bool):
+            return value
+        if expected is float and isinstance(value, int) and not isinstance(value, bool):
+            return float(value)
+
+        coerced = _COERCERS[expected](value)
+        if coerced is None:
+            logger.info(f"Valor descartado en {field.name}: {value!r}")
+            return field.default
+        return coerced
+
+
+def model_from_schema(name: str, schema: Dict[str, str]) -> Type[LenientModel]:
+    """
+    Crea un modelo con campos opcionales a partir de un esquema de prompt
+    ({"campo": "string" | "integer" | "float"}).
+
+    Args:
+        name (str): Nombre del modelo.
+        schema (Dict[str, str]): Esquema del prompt.
+
+    Returns:
+        Type[LenientModel]: Modelo de pydantic.
+    """
+    fields = {
+        field: (Optional[SCHEMA_TYPES[type_name]], None)
+        for field, type_name in schema.items()
+    }
+    return create_model(name, __base__=LenientModel, **fields)
+
+
+def _strip_trailing_comma(out: list) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(content: str) -> str:
+    """
+    Corrige los defectos más comunes de una respuesta JSON del modelo.
+
+    - Quita bloques de código (```json ... ```) y texto antes/después del JSON.
+    - Elimina comas antes de `}` o `]`.
+    - Cierra strings, arreglos y objetos truncados (respuesta cortada por
+      `max_tokens`), descartando la última llave o valor incompleto.
+
+    Args:
+        content (str): Respuesta cruda del modelo.
+
+    Returns:
+        str: Texto que debería ser JSON válido.
+    """
+    text = content.strip()
+    fence = _FENCE.search(text)
+    if fence:
+        text = fence.group(1)
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    out, stack = [], []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            out.append(stack.pop() if stack else ch)
+            if not stack:
+                break
+            continue
+        out.append(ch)
+
+    if not stack:
+        return "".join(out)
+
+    # Respuesta truncada: cerrar lo que quedó abierto
+    if in_string:
+        out.append('"')
+    repaired = "".join(out).rstrip()
+    repaired = _PARTIAL_LITERAL.sub(" null", repaired)
+    if repaired.endswith(","):
+        repaired = repaired[:-1]
+    if repaired.endswith(":"):
+        repaired += " null"
+    elif stack[-1] == "}" and _DANGLING_KEY.search(repaired):
+        repaired += ": null"
+
+    return repaired + "".join(reversed(stack))
+
+
+def decode_json(content: str) -> Any:
+    """
+    Decodifica una respuesta JSON, reparándola localmente si es necesario.
+
+    Args:
+        content (str): Respuesta cruda del modelo.
+
+    Returns:
+        Any: Objeto decodificado.
+
+    Raises:
+        ResponseParseError: Si no se pudo decodificar.
+    """
+    try:
+        return _loads(content)
+    except _DECODE_ERRORS:
+        pass
+
+    repaired = repair_json(content)
+    try:
+        data = _loads(repaired)
+        logger.info("Respuesta JSON reparada localmente")
+        return data
+    except _DECODE_ERRORS as e:
+        error = e
+
+    # Dicts con sintaxis de Python (comillas simples, True/None)
+    try:
+        return ast.literal_eval(repaired)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        raise ResponseParseError(f"JSON inválido: {error}")
+
+
+def decode_response(content: str, model: Type[BaseModel]) -> dict:
+    """
+    Decodifica una respuesta y la valida contra un modelo.
+
+    Args:
+        content (str): Respuesta cruda del modelo.
+        model (Type[BaseModel]): Esquema esperado.
+
+    Returns:
+        dict: Datos validados, sin los campos vacíos.
+
+    Raises:
+        ResponseParseError: Si la respuesta no es JSON o no cumple el esquema.
+    """
+    data = decode_json(content)
+    if not isinstance(data, dict):
+        raise ResponseParseError(f"Se esperaba un objeto JSON, llegó {type(data).__name__}")
+    try:
+        return model.parse_obj(data).dict(exclude_none=True)
+    except ValidationError as e:
+        raise ResponseParseError(f"La respuesta no cumple el esquema: {e}")
+
+
+def _reask_params(params: dict, content: str, error: Exception) -> dict:
+    messages = list(params["messages"]) + [
+        {"role": "assistant", "content": content},
+        {"role": "user", "content": REASK_PROMPT.format(error=error)},
+    ]
+    return {**params, "messages": messages}
+
+
+def _request_once(
+    params: dict, parse: Callable[[str], T], reasks: int, route: Optional[Route]
+) -> T:
+    """Pide y parsea la respuesta en un solo nivel de modelo, volviendo a preguntar."""
+    current = params
+    for attempt in range(reasks + 1):
+        start = time.perf_counter()
+        try:
+            response = create_completion(**current)
+        except Exception:
+            record_route(route, time.perf_counter() - start, outcome="error")
+            raise
+        elapsed = time.perf_counter() - start
+
+        content = response.choices[0].message.content
+        try:
+            result = parse(content)
+        except ResponseParseError as e:
+            record_route(route, elapsed, response, outcome="invalid")
+            discard_cached_completion(**current)
+            if attempt == reasks:
+                raise
+            logger.warning(f"Respuesta inválida, se vuelve a preguntar: {str(e)}")
+            current = _reask_params(params, content, e)
+            continue
+
+        record_route(route, elapsed, response)
+        return result
+
+
+def request_json(
+    params: dict,
+    parse: Callable[[str], T],
+    reasks: int = RESPONSE_REASK_ATTEMPTS,
+    task: str = None,
+) -> T:
+    """
+    Llama al modelo y parsea su respuesta. Si no se puede parsear ni reparar,
+    se vuelve a preguntar (solo esta llamada) hasta `reasks` veces.
+
+    Si se indica la tarea, el modelo y `max_tokens` los elige el router
+    (`model_router`) y, si la respuesta sigue sin validar tras los
+    reintentos, se repite en el siguiente nivel de modelo.
+
+    Args:
+        params (dict): Parámetros de la llamada a OpenAI.
+        parse (Callable): Función que convierte el contenido de la respuesta;
+            debe lanzar `ResponseParseError` si no es válido.
+        reasks (int): Reintentos máximos.
+        task (str): Tarea para el router (p. ej. "client", "movements").
+
+    Returns:
+        Resultado de `parse`.
+
+    Raises:
+        ResponseParseError: Si se agotaron los reintentos y los niveles.
+    """
+    route = choose_route(task, params["messages"]) if task else None
+    while True:
+        try:
+            return _request_once(
+                routed_params(route, params) if route else params, parse, reasks, route
+            )
+        except ResponseParseError:
+            route = escalate(route) if route else None
+            if route is None:
+                raise
+
+
+async def _arequest_once(
+    params: dict, parse: Callable[[str], T], reasks: int, route: Optional[Route]
+) -> T:
+    """Versión asíncrona de `_request_once`."""
+    current = params
+    for attempt in range(reasks + 1):
+        start = time.perf_counter()
+        try:
+            response = await acreate_completion(**current)
+        except Exception:
+            record_route(route, time.perf_counter() - start, outcome="error")
+            raise
+        elapsed = time.perf_counter() - start
+
+        content = response.choices[0].message.content
+        try:
+            result = parse(content)
+        except ResponseParseError as e:
+            record_route(route, elapsed, response, outcome="invalid")
+            await asyncio.to_thread(discard_cached_completion, **current)
+            if attempt == reasks:
+                raise
+            logger.warning(f"Respuesta inválida, se vuelve a preguntar: {str(e)}")
+            current = _reask_params(params, content, e)
+            continue
+
+        record_route(route, elapsed, response)
+        return result
+
+
+async def arequest_json(
+    params: dict,
+    parse: Callable[[str], T],
+    reasks: int = RESPONSE_REASK_ATTEMPTS,
+    task: str = None,
+) -> T:
+    """Versión asíncrona de `request_json`."""
+    route = choose_route(task, params["messages"]) if task else None
+    while True:
+        try:
+            return await _arequest_once(
+                routed_params(route, params) if route else params, parse, reasks, route
+            )
+        except ResponseParseError:
+            route = escalate(route) if route else None
+            if route is None:
+                raise
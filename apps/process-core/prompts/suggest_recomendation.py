@@ -1,28 +1,69 @@
-import openai
+import time
+from typing import AsyncIterator
 
+from debt_engine import debt_projection
+from metrics import log_event
+from prompts.completion import astream_completion, create_completion
+from prompts.model_router import choose_route, record_route, routed_params
+from statement_text import count_tokens
 
-def suggest_recomendation(history: dict) -> dict:
-    history_str = str(history)
+# Prompt para OpenAI: Recomendación financiera
+SYSTEM_PROMPT = """
+    Adjunto mi estado de cuenta para que analices mis finanzas personales. Por favor, identifica cuáles transacciones son recurrentes y cuáles son puntuales, y clasifícalas en categorías como supermercados, movilidad, entretenimiento, restaurantes, combustible, salud, entre otras. Evalúa si estoy utilizando mi tarjeta de crédito de manera responsable en relación al cupo disponible, indicando si estoy al límite, tengo capacidad de ahorro o estoy generando intereses por sobregiros o pagos mínimos. Si incluyo varios estados de cuenta, analiza mi historial de pagos, señalando si he pagado al día o si estoy acumulando intereses. Finalmente, proporciona recomendaciones específicas para optimizar mi uso de la tarjeta, reducir gastos innecesarios y mejorar mi salud financiera en general. resume en 100 carácteres.
+    Si viene "proyeccion_deuda", usa solo esos números (meses, intereses y ahorro de cada escenario de pago) para recomendar cuánto pagar y abonar a capital; no recalcules montos ni tasas.
+"""
 
-    # Prompt para OpenAI: Datos del cliente
-    system_prompt = """
-        Adjunto mi estado de cuenta para que analices mis finanzas personales. Por favor, identifica cuáles transacciones son recurrentes y cuáles son puntuales, y clasifícalas en categorías como supermercados, movilidad, entretenimiento, restaurantes, combustible, salud, entre otras. Evalúa si estoy utilizando mi tarjeta de crédito de manera responsable en relación al cupo disponible, indicando si estoy al límite, tengo capacidad de ahorro o estoy generando intereses por sobregiros o pagos mínimos. Si incluyo varios estados de cuenta, analiza mi historial de pagos, señalando si he pagado al día o si estoy acumulando intereses. Finalmente, proporciona recomendaciones específicas para optimizar mi uso de la tarjeta, reducir gastos innecesarios y mejorar mi salud financiera en general. resume en 100 carácteres.
-    """
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": system_prompt},
+def _completion_params(history: dict) -> dict:
+    # La proyección se calcula localmente; el modelo solo la redacta
+    if "proyeccion_deuda" not in history:
+        projection = debt_projection(history.get("product") or {})
+        if projection is not None:
+            history = {**history, "proyeccion_deuda": projection}
+    history_str = str(history)
+
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": history_str},
         ],
-        temperature=0.2,
-        max_tokens=800,
-    )
-    # Imprimir respuesta cruda de OpenAI
-    print("\n" + "=" * 50)
-    print("RESPUESTA CRUDA DE OPENAI:")
-    print("-" * 50)
-    print(response.choices[0].message.content)
-    print("=" * 50 + "\n")
-
-    return response.choices[0].message.content
+        "temperature": 0.2,
+    }
+
+
+def suggest_recomendation(history: dict) -> dict:
+    params = _completion_params(history)
+    route = choose_route("suggestion", params["messages"])
+    start = time.perf_counter()
+    response = create_completion(**routed_params(route, params))
+    record_route(route, time.perf_counter() - start, response)
+
+    suggestion = response.choices[0].message.content
+    log_event("suggestion", chars=len(suggestion))
+    return suggestion
+
+
+async def suggest_recomendation_stream(history: dict) -> AsyncIterator[str]:
+    """
+    Genera la recomendación en modo streaming.
+
+    Args:
+        history (dict): Datos del estado de cuenta del candidato.
+
+    Yields:
+        str: Fragmentos de la recomendación a medida que se generan.
+    """
+    params = _completion_params(history)
+    route = choose_route("suggestion", params["messages"])
+    start = time.perf_counter()
+    parts = []
+    async for content in astream_completion(**routed_params(route, params)):
+        parts.append(content)
+        yield content
+
+    # El streaming no trae `usage`: los tokens de respuesta se cuentan localmente
+    usage = {
+        "prompt_tokens": route.input_tokens,
+        "completion_tokens": count_tokens("".join(parts)),
+    }
+    record_route(route, time.perf_counter() - start, usage=usage)
@@ -1,20 +1,51 @@
 # app/routers.py
+import asyncio
+import contextlib
+import functools
+import json
 import logging
 import os
 import re
-from typing import List, Optional
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
 
-import boto3
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
-from supabase import Client, create_client
-
-from prompts.suggest_recomendation import suggest_recomendation
+from fastapi import APIRouter, File, Form, Header, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from clients import get_supabase
+from debt_engine import debt_projection
+from extraction_cache import get_extraction_cache
+from history_analytics import HISTORY_MONTHS, insert_statement_metrics, load_history
+from html_text import document_kind
+from jobs import create_job_backend, create_job_dispatcher, stream_job_events
+from metrics import (
+    LOG_LEVEL,
+    UPLOAD_DEDUPE,
+    observe_stage,
+    render_prometheus,
+    set_component_state,
+    span,
+)
+from pipeline import parse_document, run_bounded
+from prompts.llm_gateway import PRIORITY_BATCH, get_gateway, llm_priority
+from prompts.prompt_cache import get_prompt_cache
+from prompts.suggest_recomendation import (
+    suggest_recomendation,
+    suggest_recomendation_stream,
+)
+from upload_dedupe import (
+    get_idempotency_store,
+    request_flights,
+    request_fingerprint,
+    run_idempotent,
+    upload_flights,
+)
+from uploads import SpooledUpload, spool_bytes, spool_upload, upload_spooled_to_s3
 from utils import (
-    extract_bank_document,
-    insert_candidate_to_supabase,
+    build_candidate_row,
+    extract_bank_document_async,
+    insert_candidates_to_supabase,
     insert_suggestion_to_supabase,
 )
 
@@ -27,19 +58,10 @@ load_dotenv()
 # Configuración del enrutador y logger
 upload_router = APIRouter()
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
 
-supabase: Client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
-
-
-# Cliente S3 solo se usa en modo producción
-s3 = None
-if os.getenv("MODE_UPLOAD_DEBUG") != "true":
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_S3"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_KEY_S3"),
-    )
+# Los clientes de Supabase y S3 se crean en el primer uso (ver `clients`).
+# S3 solo se usa en modo producción (MODE_UPLOAD_DEBUG != "true").
 
 
 def clean_html_text(html_content: str) -> str:
@@ -55,6 +77,8 @@ def clean_html_text(html_content: str) -> str:
     if not html_content:
         return ""
 
+    from bs4 import BeautifulSoup
+
     # Eliminar el HTML usando BeautifulSoup
     soup = BeautifulSoup(html_content, "html.parser")
     clean_text = soup.get_text(separator=" ")
@@ -66,32 +90,38 @@ def clean_html_text(html_content: str) -> str:
     return clean_text
 
 
-async def get_history(process_id: str, user_id: str) -> Optional[str]:
+async def get_history(process_id: str, user_id: str) -> Optional[dict]:
     """
-    Recupera la descripción del trabajo desde Supabase para un proceso específico.
+    Recupera el último estado de cuenta procesado de un usuario en un proceso.
+
+    El orden y el límite se aplican en Supabase, por lo que solo viaja una fila.
 
     Args:
         process_id (str): UUID del proceso.
+        user_id (str): UUID del usuario.
 
     Returns:
-        Optional[str]: Descripción del trabajo combinada o None si no se encuentra.
+        Optional[dict]: Datos del último estado de cuenta o None si no hay.
 
     Raises:
         HTTPException: Si hay un error al recuperar los datos o el proceso no existe.
     """
     try:
-        response = (
-            supabase.table("candidates")
+        query = (
+            get_supabase().table("candidates")
             .select("client, product, movements, interests")
             .eq("process_id", process_id)
             .eq("user_id", user_id)
-            .execute()
+            .order("created_at", desc=True)
+            .limit(1)
         )
+        with span("supabase.select_history"):
+            response = await asyncio.to_thread(query.execute)
 
         if not response.data or len(response.data) == 0:
             return None
 
-        process_data = response.data[-1]
+        process_data = response.data[0]
         return process_data
     except Exception as e:
         logger.error(f"Error al recuperar descripción del trabajo: {str(e)}")
@@ -100,12 +130,15 @@ async def get_history(process_id: str, user_id: str) -> Optional[str]:
         )
 
 
-async def upload_to_s3(file_content: bytes, filename: str) -> str:
+async def upload_to_s3(upload: SpooledUpload, filename: str) -> str:
     """
     Sube un archivo a Amazon S3 y devuelve la URL del archivo.
 
+    El archivo se lee desde disco (multiparte si es grande), sin cargarlo
+    completo en memoria.
+
     Args:
-        file_content (bytes): Contenido del archivo en bytes.
+        upload (SpooledUpload): Archivo subido, guardado en disco.
         filename (str): Nombre del archivo para almacenarlo en S3.
 
     Returns:
@@ -115,87 +148,370 @@ async def upload_to_s3(file_content: bytes, filename: str) -> str:
         HTTPException: Si hay un error al subir el archivo a S3.
     """
     try:
-        bucket_name = os.getenv("AWS_S3_BUCKET_NAME")
-        s3.put_object(Bucket=bucket_name, Key=filename, Body=file_content)
-        s3_url = f"https://{bucket_name}.s3.amazonaws.com/{filename}"
-        return s3_url
+        return await upload_spooled_to_s3(upload, filename)
     except Exception as e:
         logger.error(f"Error al subir archivo a S3: {str(e)}")
         raise HTTPException(status_code=500, detail="Error al subir el archivo a S3")
 
 
+@upload_router.get("/cache/stats")
+async def cache_stats():
+    """
+    Retorna los contadores de aciertos y fallos de las cachés de extracciones
+    y de prompts, y de las respuestas guardadas por `Idempotency-Key`.
+    """
+    extraction_cache = get_extraction_cache()
+    prompt_cache = get_prompt_cache()
+    idempotency_store = get_idempotency_store()
+    return {
+        "extraction": extraction_cache.stats() if extraction_cache else None,
+        "prompt": prompt_cache.stats() if prompt_cache else None,
+        "idempotency": idempotency_store.stats() if idempotency_store else None,
+    }
+
+
+@upload_router.get("/history/{user_id}/analytics")
+async def get_history_analytics(user_id: str, months: int = HISTORY_MONTHS):
+    """
+    Retorna el análisis del historial de estados de cuenta de un usuario:
+    gasto por categoría, tendencias, variación mes a mes, gasto recurrente
+    vs. puntual, intereses acumulados y uso del cupo.
+
+    Args:
+        user_id (str): UUID del usuario.
+        months (int): Meses de historial a analizar.
+
+    Returns:
+        dict: Resumen de `StatementHistory.summary`.
+    """
+    if months < 1:
+        raise HTTPException(status_code=400, detail="months debe ser mayor que 0")
+    try:
+        history = await load_history(user_id, months)
+    except Exception as e:
+        logger.error(f"Error al recuperar el historial: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error al recuperar el historial")
+
+    if not len(history):
+        raise HTTPException(status_code=404, detail="No hay estados de cuenta para este usuario")
+    with span("history_analytics"):
+        return await asyncio.to_thread(history.summary)
+
+
+@upload_router.get("/metrics")
+async def get_metrics():
+    """Retorna las métricas del servicio en formato Prometheus."""
+    extraction_cache = get_extraction_cache()
+    prompt_cache = get_prompt_cache()
+    if extraction_cache:
+        set_component_state("cache.extraction", extraction_cache.stats())
+    if prompt_cache:
+        set_component_state("cache.prompt", prompt_cache.stats())
+    set_component_state("llm_gateway", get_gateway().stats())
+    set_component_state(
+        "upload_dedupe",
+        {"in_flight_files": len(upload_flights), "in_flight_requests": len(request_flights)},
+    )
+
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def process_file(
+    filename: str,
+    upload: SpooledUpload,
+    process_id: str,
+    user_id: str,
+    progress: Callable[[str], Awaitable[None]] = None,
+) -> Tuple[dict, dict]:
+    """
+    Procesa un estado de cuenta: parseo, extracción, S3 y sugerencia.
+
+    La subida a S3 corre en paralelo con la extracción. La fila de
+    `candidates` no se inserta aquí: se devuelve para que el request la
+    inserte junto con las de los demás archivos (ver `persist_upload`). La
+    sugerencia se calcula con los datos recién extraídos, sin volver a
+    leerlos desde Supabase.
+
+    Args:
+        filename (str): Nombre del archivo subido (PDF, HTML o .eml).
+        upload (SpooledUpload): Archivo subido, guardado en disco.
+        process_id (str): UUID del proceso.
+        user_id (str): UUID del usuario.
+        progress (Callable): Corrutina opcional que recibe la etapa en curso.
+
+    Returns:
+        Tuple[dict, dict]: (resultado del archivo, fila de `candidates`).
+    """
+
+    async def report(stage: str) -> None:
+        if progress is not None:
+            await progress(stage)
+
+    # Subir a S3 (si no está en modo debug) mientras se extraen los datos
+    s3_task = None
+    if os.getenv("MODE_UPLOAD_DEBUG") != "true":
+        s3_task = asyncio.ensure_future(upload_to_s3(upload, filename))
+
+    await report("extrayendo")
+    kind = document_kind(filename) or "pdf"
+    try:
+        client, product, movements, interests = await extract_bank_document_async(
+            upload.path,
+            pdf_parser=functools.partial(parse_document, kind=kind),
+            digest=upload.digest,
+            kind=kind,
+        )
+    except BaseException:
+        if s3_task is not None:
+            s3_task.cancel()
+        raise
+
+    s3_url = None
+    if s3_task is not None:
+        if not s3_task.done():
+            await report("subiendo_s3")
+        s3_url = await s3_task
+
+    # @TODO: cada vez que se inserta debería guardarse la url del objeto PDF de s3
+
+    candidate = build_candidate_row(
+        process_id,
+        user_id=user_id,
+        client=client,
+        product=product,
+        movements=movements,
+        interests=interests,
+        document_hash=upload.digest,
+    )
+
+    # La sugerencia usa los mismos datos que se van a guardar
+    await report("sugerencia")
+    with span("debt_projection"):
+        projection = debt_projection(product)
+    history = {
+        "client": client,
+        "product": product,
+        "movements": movements,
+        "interests": interests,
+    }
+    if projection is not None:
+        history["proyeccion_deuda"] = projection
+    with span("suggestion"):
+        suggestion = await asyncio.to_thread(suggest_recomendation, history)
+
+    result = {
+        "filename": filename,
+        "size": upload.size,
+        "suggestion": suggestion,
+        "debt_projection": projection,
+        # "ai_score": match_result["match_score"],
+        # "match_feedback": match_result["explanation"] # ,  "s3_url": s3_url
+    }
+    return result, candidate
+
+
+async def process_file_once(
+    filename: str,
+    upload: SpooledUpload,
+    process_id: str,
+    user_id: str,
+    progress: Callable[[str], Awaitable[None]] = None,
+) -> Tuple[dict, dict, bool]:
+    """
+    `process_file` con las cargas simultáneas del mismo archivo agrupadas.
+
+    Si otro request ya está procesando el mismo (user_id, process_id,
+    SHA-256), se espera su resultado en vez de volver a extraer, subir a S3
+    y pedir la sugerencia (ver `upload_dedupe`). La fila de `candidates` la
+    guarda solo quien hizo la extracción.
+
+    Args:
+        filename (str): Nombre del archivo subido.
+        upload (SpooledUpload): Archivo subido, guardado en disco.
+        process_id (str): UUID del proceso.
+        user_id (str): UUID del usuario.
+        progress (Callable): Corrutina opcional que recibe la etapa en curso.
+
+    Returns:
+        Tuple[dict, dict, bool]: (resultado del archivo, fila de `candidates`,
+        True si se reutilizó la extracción de otra llamada).
+    """
+    (result, candidate), shared = await upload_flights.run(
+        (user_id, process_id, upload.digest),
+        lambda: process_file(filename, upload, process_id, user_id, progress=progress),
+    )
+    if shared:
+        UPLOAD_DEDUPE.inc(source="in_flight_file")
+        logger.info(f"{filename}: se reutiliza la extracción en curso del mismo archivo")
+        result = {**result, "filename": filename}
+    return result, candidate, shared
+
+
+async def persist_upload(process_id: str, outcomes: list) -> list:
+    """
+    Guarda en Supabase el resultado de todos los archivos de un request: un
+    insert masivo en `candidates`, un upsert de sus métricas en
+    `statement_metrics` (ver `history_analytics`) y una sola actualización de
+    `processes` con la sugerencia del último archivo.
+
+    Las filas de extracciones compartidas no se vuelven a insertar: ya las
+    guarda el request que hizo la extracción.
+
+    Args:
+        process_id (str): UUID del proceso.
+        outcomes (list): (resultado, fila de `candidates`, compartida) de cada
+            archivo (ver `process_file_once`).
+
+    Returns:
+        list: Resultados de los archivos, en orden.
+    """
+    results = [result for result, _, _ in outcomes]
+    candidates = [candidate for _, candidate, shared in outcomes if not shared]
+    await asyncio.gather(
+        asyncio.to_thread(insert_candidates_to_supabase, candidates),
+        asyncio.to_thread(insert_statement_metrics, candidates),
+    )
+    if results:
+        await asyncio.to_thread(
+            insert_suggestion_to_supabase, process_id, results[-1]["suggestion"]
+        )
+    return results
+
+
+async def process_job(job: dict, files: list, progress: Callable) -> dict:
+    """
+    Procesa un trabajo de carga asíncrona (ver `jobs.create_job_dispatcher`).
+
+    Args:
+        job (dict): Trabajo con `process_id` y `user_id`.
+        files (list): (nombre, contenido) de cada archivo.
+        progress (Callable): Corrutina que recibe (índice, etapa).
+
+    Returns:
+        dict: Resultado con el mismo formato que `POST /upload`.
+    """
+
+    async def worker(index: int, item: tuple) -> tuple:
+        filename, content = item
+        try:
+            with await asyncio.to_thread(spool_bytes, filename, content) as upload:
+                return await process_file_once(
+                    filename,
+                    upload,
+                    job["process_id"],
+                    job["user_id"],
+                    progress=lambda stage: progress(index, stage),
+                )
+        except Exception:
+            await progress(index, "error")
+            raise
+
+    # Las cargas interactivas pasan antes que los trabajos en segundo plano
+    with llm_priority(PRIORITY_BATCH):
+        outcomes = await run_bounded(files, worker)
+
+    for index in range(len(files)):
+        await progress(index, "guardando")
+    results = await persist_upload(job["process_id"], outcomes)
+    for index in range(len(files)):
+        await progress(index, "listo")
+
+    return {"processed_files": results}
+
+
+job_backend = create_job_backend()
+job_dispatcher = create_job_dispatcher(job_backend, process_job)
+
+
 @upload_router.post("/upload")
 async def upload_files(
     files: List[UploadFile] = File(...),
     process_id: str = Form(...),
     user_id: str = Form(...),
+    async_job: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
     """
     Recibe múltiples archivos PDF y un ID de proceso, procesa los CVs y guarda la información en Supabase.
 
+    También se aceptan estados de cuenta en HTML (.html, .htm) o correos
+    (.eml), cuyo texto se extrae sin pasar por PyPDF2 (ver `html_text`).
+
+    Los archivos se procesan en paralelo (hasta `UPLOAD_MAX_CONCURRENCY` a la
+    vez) y los resultados se devuelven en el orden en que fueron subidos.
+    Cada archivo se copia por trozos a disco (hasta `UPLOAD_MAX_BYTES`) en
+    vez de leerlo completo en memoria.
+
+    Con `async_job=true` se responde de inmediato (202) con el id de un
+    trabajo, cuyo avance se consulta en `/jobs/{job_id}` o por SSE en
+    `/jobs/{job_id}/events`.
+
+    Un reintento con el mismo header `Idempotency-Key` recibe la respuesta
+    del primero sin volver a procesar, y los requests simultáneos con el
+    mismo archivo comparten una sola extracción (ver `upload_dedupe`).
+
     Args:
-        files (List[UploadFile]): Lista de archivos PDF subidos.
+        files (List[UploadFile]): Lista de archivos PDF, HTML o .eml subidos.
         process_id (str): UUID del proceso al que se asociarán los candidatos.
+        user_id (str): UUID del usuario.
+        async_job (bool): Procesar en segundo plano.
+        idempotency_key (Optional[str]): Header `Idempotency-Key`.
 
     Returns:
-        JSONResponse: Respuesta con la información procesada de los CVs.
+        JSONResponse: Respuesta con la información procesada de los CVs, o
+        el id del trabajo en modo asíncrono.
     """
     try:
         logger.info(f"Iniciando proceso de carga para el proceso: {process_id}")
-        print(f"Iniciando proceso de carga para el proceso: {process_id}")
 
         if not process_id or process_id == "undefined":
             raise HTTPException(status_code=400, detail="ID de proceso no válido")
 
-        results = []
         for file in files:
-            if not file.filename.endswith(".pdf"):
+            if document_kind(file.filename) is None:
                 raise HTTPException(
-                    status_code=400, detail=f"El archivo {file.filename} no es un PDF."
+                    status_code=400,
+                    detail=f"El archivo {file.filename} no es un PDF, HTML ni correo (.eml).",
                 )
 
-            content = await file.read()
-
-            client, product, movements, interests = extract_bank_document(content)
-
-            # Subir a S3 si no está en modo debug
-            s3_url = None
-            if os.getenv("MODE_UPLOAD_DEBUG") != "true":
-                s3_url = await upload_to_s3(content, file.filename)
-
-            # @TODO: cada vez que se inserta debería guardarse la url del objeto PDF de s3
-
-            insert_candidate_to_supabase(
+        with contextlib.ExitStack() as spooled:
+            # Se copian todos antes de procesar: el SHA-256 de cada archivo
+            # forma parte de la huella del request (ver `request_fingerprint`)
+            uploads = []
+            for file in files:
+                uploads.append(spooled.enter_context(await spool_upload(file)))
+
+            async def handle() -> Tuple[int, dict]:
+                if async_job:
+                    contents = []
+                    for upload in uploads:
+                        content = await asyncio.to_thread(upload.read_bytes)
+                        contents.append((upload.filename, content))
+                    job = await job_backend.create_job(process_id, user_id, contents)
+                    await job_dispatcher.dispatch(job["id"])
+                    return 202, {
+                        "job_id": job["id"],
+                        "status_url": f"/jobs/{job['id']}",
+                        "events_url": f"/jobs/{job['id']}/events",
+                    }
+
+                async def worker(_: int, upload: SpooledUpload) -> tuple:
+                    return await process_file_once(upload.filename, upload, process_id, user_id)
+
+                outcomes = await run_bounded(uploads, worker)
+                results = await persist_upload(process_id, outcomes)
+                return 200, {"processed_files": results}
+
+            status_code, content = await run_idempotent(
+                user_id,
                 process_id,
-                user_id=user_id,
-                client=client,
-                product=product,
-                movements=movements,
-                interests=interests,
-            )
-
-            # Obtener descripción del trabajo
-            history = await get_history(process_id, user_id)
-            logger.info(f"EL JOB DESCRIPTION del proceso: {history}")
-            print(f"EL JOB DESCRIPTION del proceso: {history}")
-
-            if history:
-                suggestion = suggest_recomendation(history)
-                insert_suggestion_to_supabase(process_id, suggestion)
-            else:
-                suggestion = "Estado de cuenta de Hussam Sufan: Cupo utilizado: $558,786. Cupo disponible: -$8,786. Gastos recurrentes en restaurantes, movilidad y supermercados. Uso de tarjeta al límite, generando intereses. Recomendación: reducir gastos en restaurantes y buscar alternativas de movilidad para mejorar salud financiera."
-
-            results.append(
-                {
-                    "filename": file.filename,
-                    "size": len(content),
-                    "suggestion": suggestion,
-                    # "ai_score": match_result["match_score"],
-                    # "match_feedback": match_result["explanation"] # ,  "s3_url": s3_url
-                }
+                idempotency_key,
+                request_fingerprint(
+                    [(upload.filename, upload.digest) for upload in uploads], async_job
+                ),
+                handle,
             )
-
-        return JSONResponse(content={"processed_files": results})
+        return JSONResponse(status_code=status_code, content=content)
 
     except HTTPException as he:
         logger.error(f"Error HTTP: {str(he)}", exc_info=True)
@@ -205,3 +521,90 @@ async def upload_files(
         raise HTTPException(
             status_code=500, detail=f"Error al procesar los archivos: {str(e)}"
         )
+
+
+@upload_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Retorna el estado de un trabajo de carga y la etapa de cada archivo.
+
+    Args:
+        job_id (str): Id del trabajo.
+
+    Returns:
+        dict: Trabajo con su estado, archivos y resultado si terminó.
+    """
+    job = await job_backend.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
+@upload_router.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, last_event_id: int = 0):
+    """
+    Envía por SSE los eventos de progreso de un trabajo hasta que termine.
+
+    Args:
+        job_id (str): Id del trabajo.
+        last_event_id (int): Último evento recibido, para reanudar el stream.
+
+    Returns:
+        StreamingResponse: Stream `text/event-stream`.
+    """
+    if await job_backend.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    return StreamingResponse(
+        stream_job_events(job_backend, job_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@upload_router.get("/processes/{process_id}/suggestion/stream")
+async def stream_suggestion(process_id: str, user_id: str):
+    """
+    Genera la recomendación del último estado de cuenta y la envía por SSE a
+    medida que el modelo la escribe. Al terminar se guarda en
+    `processes.suggestion`.
+
+    Eventos: `token` ({"text": fragmento}), `done` ({"suggestion": texto
+    completo}) y `error` ({"detail": mensaje}).
+
+    Args:
+        process_id (str): UUID del proceso.
+        user_id (str): UUID del usuario.
+
+    Returns:
+        StreamingResponse: Stream `text/event-stream`.
+    """
+    history = await get_history(process_id, user_id)
+    if not history:
+        raise HTTPException(
+            status_code=404, detail="No hay estados de cuenta para este proceso"
+        )
+
+    async def events():
+        parts = []
+        start = time.perf_counter()
+        try:
+            async for content in suggest_recomendation_stream(history):
+                parts.append(content)
+                yield f"event: token\ndata: {json.dumps({'text': content})}\n\n"
+
+            suggestion = "".join(parts)
+            observe_stage("suggestion_stream", time.perf_counter() - start)
+            await asyncio.to_thread(insert_suggestion_to_supabase, process_id, suggestion)
+            yield f"event: done\ndata: {json.dumps({'suggestion': suggestion})}\n\n"
+        except Exception as e:
+            observe_stage("suggestion_stream", time.perf_counter() - start, error=e)
+            detail = getattr(e, "detail", None) or str(e)
+            logger.error(f"Error en stream de sugerencia: {detail}")
+            yield f"event: error\ndata: {json.dumps({'detail': detail})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
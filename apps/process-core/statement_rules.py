@@ -0,0 +1,338 @@
+# app/statement_rules.py
+"""
+Parser local basado en reglas para los campos rotulados de un estado de
+cuenta de tarjeta de crédito chileno (cupos, tasas, CAE, fechas, montos, RUT).
+
+Solo se devuelven los campos resueltos con confianza: se encontró al menos una
+etiqueta y todos los valores encontrados coinciden. El resto queda para el LLM.
+"""
+
+import os
+import re
+import unicodedata
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Permite desactivar el parser de reglas y volver a usar solo el LLM
+RULES_FAST_PATH_ENABLED = os.getenv("RULES_FAST_PATH_ENABLED", "true") == "true"
+
+# Valores monetarios en CLP: "$ 1.234.567", "-$8.786", "$1234567"
+_MONEY = r"(-?\s?\$\s?-?\s?\d{1,3}(?:\.\d{3})+|-?\s?\$\s?-?\s?\d+)"
+# Tasas: "2,15%", "2.15 %", "25,40%"
+_RATE = r"(\d{1,3}(?:[.,]\d{1,4})?)\s?%"
+# Fechas: "15/03/2024", "15-03-2024", "15/03/24"
+_DATE = r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})"
+# Tarjeta enmascarada: "XXXX XXXX XXXX 1234", "**** 1234", "4567-XXXX-XXXX-1234"
+_CARD = r"((?:[X*\d]{4}[ -]?){3}\d{4}|[X*]{4}[ -]?\d{4})"
+# RUT: "12.345.678-9", "12345678-K"
+_RUT = r"(\d{1,2}\.?\d{3}\.?\d{3}-[\dK])"
+# Nombre en mayúsculas (dos a cinco palabras)
+_NAME = r"([A-ZÑ]+(?: [A-ZÑ]+){1,4})"
+
+# Caracteres permitidos entre la etiqueta y el valor
+_GAP = r"[^\d$%\n]{0,40}?"
+
+
+def _money(value: str) -> int:
+    negative = "-" in value
+    amount = int(re.sub(r"\D", "", value))
+    return -amount if negative else amount
+
+
+def _rate(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+def _text(value: str) -> str:
+    return value.strip()
+
+
+# Palabras que indican que el nombre terminó y empezó otra etiqueta
+_NAME_STOP_WORDS = {"RUT", "RUN", "NUMERO", "TARJETA", "FECHA", "CUPO", "DIRECCION", "MONTO"}
+
+
+def _name(value: str) -> str:
+    words = []
+    for word in value.split():
+        if word in _NAME_STOP_WORDS:
+            break
+        words.append(word)
+    if len(words) < 2:
+        raise ValueError(f"Nombre incompleto: {value}")
+    return " ".join(words)
+
+
+# Tipo de valor de cada campo de producto: (regex del valor, conversor)
+PRODUCT_FIELD_TYPES: Dict[str, Tuple[str, Callable]] = {
+    "nombre_titular": (_NAME, _name),
+    "numero_tarjeta": (_CARD, _text),
+    "fecha_estado_cuenta": (_DATE, _text),
+    "cupo_total": (_MONEY, _money),
+    "cupo_utilizado": (_MONEY, _money),
+    "cupo_disponible": (_MONEY, _money),
+    "cupo_total_avance_efectivo": (_MONEY, _money),
+    "cupo_utilizado_avance_efectivo": (_MONEY, _money),
+    "cupo_disponible_avance_efectivo": (_MONEY, _money),
+    "tasas_interes_vigente_rotativo": (_RATE, _rate),
+    "tasas_interes_vigente_compra_cuotas": (_RATE, _rate),
+    "tasas_interes_vigente_avance_cuotas": (_RATE, _rate),
+    "cae_rotativo": (_RATE, _rate),
+    "cae_compra_cuotas": (_RATE, _rate),
+    "cae_avance_cuotas": (_RATE, _rate),
+    "fecha_pagar_hasta": (_DATE, _text),
+    "monto_total_facturado": (_MONEY, _money),
+    "monto_minimo_pagar": (_MONEY, _money),
+}
+
+# Tipo de valor de los campos del cliente (keys del extractor de cliente)
+CLIENT_FIELD_TYPES: Dict[str, Tuple[str, Callable]] = {
+    "name": (_NAME, _name),
+    "rut": (_RUT, _text),
+}
+
+# Etiquetas comunes a todos los emisores (texto normalizado: mayúsculas, sin tildes)
+DEFAULT_LABELS: Dict[str, List[str]] = {
+    "nombre_titular": [r"NOMBRE DEL TITULAR", r"NOMBRE TITULAR"],
+    "numero_tarjeta": [r"N(?:UMERO|RO\.?|°) DE TARJETA", r"TARJETA N(?:UMERO|RO\.?|°)"],
+    "fecha_estado_cuenta": [r"FECHA (?:DEL )?ESTADO DE CUENTA", r"FECHA DE FACTURACION"],
+    "cupo_total": [r"CUPO TOTAL(?! AVANCE)"],
+    "cupo_utilizado": [r"CUPO UTILIZADO(?! AVANCE)"],
+    "cupo_disponible": [r"CUPO DISPONIBLE(?! AVANCE)"],
+    "cupo_total_avance_efectivo": [r"CUPO TOTAL AVANCE(?: EN)?(?: EFECTIVO)?"],
+    "cupo_utilizado_avance_efectivo": [r"CUPO UTILIZADO AVANCE(?: EN)?(?: EFECTIVO)?"],
+    "cupo_disponible_avance_efectivo": [r"CUPO DISPONIBLE AVANCE(?: EN)?(?: EFECTIVO)?"],
+    "tasas_interes_vigente_rotativo": [r"TASA (?:DE )?INTERES VIGENTE ROTATIVO"],
+    "tasas_interes_vigente_compra_cuotas": [
+        r"TASA (?:DE )?INTERES VIGENTE COMPRAS? EN CUOTAS"
+    ],
+    "tasas_interes_vigente_avance_cuotas": [
+        r"TASA (?:DE )?INTERES VIGENTE AVANCES? EN CUOTAS"
+    ],
+    "cae_rotativo": [r"CAE ROTATIVO"],
+    "cae_compra_cuotas": [r"CAE COMPRAS? EN CUOTAS"],
+    "cae_avance_cuotas": [r"CAE AVANCES? EN CUOTAS"],
+    "fecha_pagar_hasta": [r"PAGAR HASTA", r"FECHA (?:DE )?VENCIMIENTO"],
+    "monto_total_facturado": [
+        r"MONTO TOTAL FACTURADO(?: A PAGAR)?",
+        r"TOTAL FACTURADO",
+    ],
+    "monto_minimo_pagar": [r"MONTO MINIMO A PAGAR", r"PAGO MINIMO"],
+}
+
+# Etiquetas adicionales por emisor. Se suman a las comunes.
+BANK_LABELS: Dict[str, Dict[str, List[str]]] = {
+    "banco_de_chile": {
+        "cupo_total": [r"CUPO NACIONAL"],
+        "monto_total_facturado": [r"MONTO FACTURADO A PAGAR"],
+    },
+    "santander": {
+        "cupo_total": [r"CUPO DE COMPRAS"],
+        "fecha_pagar_hasta": [r"ULTIMO DIA DE PAGO"],
+        "monto_total_facturado": [r"MONTO TOTAL A PAGAR"],
+    },
+    "bci": {
+        "fecha_pagar_hasta": [r"PAGUE HASTA"],
+        "monto_minimo_pagar": [r"MINIMO A PAGAR"],
+    },
+    "falabella": {
+        "cupo_total": [r"CUPO CMR"],
+        "fecha_pagar_hasta": [r"PAGA HASTA"],
+    },
+    "scotiabank": {
+        "monto_minimo_pagar": [r"PAGO MINIMO DEL MES"],
+    },
+}
+
+# Texto que identifica a cada emisor en el estado de cuenta
+BANK_MARKERS: Dict[str, List[str]] = {
+    "banco_de_chile": [r"BANCO DE CHILE", r"BANCOCHILE"],
+    "santander": [r"SANTANDER"],
+    "bci": [r"\bBCI\b", r"BANCO DE CREDITO E INVERSIONES"],
+    "falabella": [r"FALABELLA", r"\bCMR\b"],
+    "scotiabank": [r"SCOTIABANK"],
+}
+
+# Las etiquetas genéricas ("Sr.", "Cliente") aparecen también en saludos y
+# avisos ("Estimado cliente, le informamos..."): se exige la palabra completa
+# seguida de "." o ":"
+CLIENT_NAME_LABELS = [
+    r"\bNOMBRE DEL TITULAR\b",
+    r"\bNOMBRE TITULAR\b",
+    r"\bSR(?:A|\(A\))?(?:\.|\s?:)",
+    r"\bCLIENTE\s?:",
+]
+CLIENT_RUT_LABELS = [r"R\.?U\.?T\.?", r"RUN"]
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza el texto para buscar etiquetas: mayúsculas, sin tildes y con
+    espacios simples (se conservan los saltos de línea).
+
+    Args:
+        text (str): Texto del estado de cuenta.
+
+    Returns:
+        str: Texto normalizado.
+    """
+    text = unicodedata.normalize("NFKD", text.upper())
+    text = "".join(c for c in text if not unicodedata.combining(c) or c == "\u0303")
+    # Recomponer la Ñ y limpiar espacios
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"[ \t\r\f\v]+", " ", text)
+
+
+def detect_bank(text: str) -> Optional[str]:
+    """
+    Identifica el emisor del estado de cuenta por sus marcas de texto.
+
+    Args:
+        text (str): Texto normalizado del estado de cuenta.
+
+    Returns:
+        Optional[str]: Identificador del emisor o None si no se reconoce.
+    """
+    for bank, markers in BANK_MARKERS.items():
+        if any(re.search(marker, text) for marker in markers):
+            return bank
+    return None
+
+
+def _resolve(text: str, labels: List[str], value_pattern: str, convert: Callable):
+    """Retorna el valor si todas las apariciones de las etiquetas coinciden."""
+    values = set()
+    for label in labels:
+        pattern = rf"{label}{_GAP}{value_pattern}"
+        for match in re.finditer(pattern, text):
+            try:
+                values.add(convert(match.group(1)))
+            except ValueError:
+                continue
+
+    if len(values) == 1:
+        return values.pop()
+    return None
+
+
+def rut_is_valid(rut: str) -> bool:
+    """Valida el dígito verificador de un RUT ("12.345.678-9")."""
+    body, dv = rut.replace(".", "").split("-")
+    total, factor = 0, 2
+    for digit in reversed(body):
+        total += int(digit) * factor
+        factor = 2 if factor == 7 else factor + 1
+    expected = 11 - total % 11
+    expected = {10: "K", 11: "0"}.get(expected, str(expected))
+    return dv.upper() == expected
+
+
+def parse_product_fields(text: str, bank: str = None) -> Dict[str, object]:
+    """
+    Extrae con reglas los campos rotulados del producto.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+        bank (str): Emisor. Si no se entrega se detecta desde el texto.
+
+    Returns:
+        Dict[str, object]: Solo los campos resueltos con confianza.
+    """
+    normalized = normalize_text(text)
+    bank = bank or detect_bank(normalized)
+    bank_labels = BANK_LABELS.get(bank, {})
+
+    fields = {}
+    for field, (value_pattern, convert) in PRODUCT_FIELD_TYPES.items():
+        labels = DEFAULT_LABELS.get(field, []) + bank_labels.get(field, [])
+        value = _resolve(normalized, labels, value_pattern, convert)
+        if value is not None:
+            fields[field] = value
+
+    return validate_product_fields(fields)
+
+
+def validate_product_fields(fields: Dict[str, object]) -> Dict[str, object]:
+    """
+    Descarta los campos de producto inconsistentes: tasas fuera de rango y
+    cupos cuyo total no cuadra con utilizado + disponible.
+
+    Args:
+        fields (Dict[str, object]): Campos de producto ya convertidos.
+
+    Returns:
+        Dict[str, object]: Los campos consistentes.
+    """
+    fields = {
+        field: value
+        for field, value in fields.items()
+        if PRODUCT_FIELD_TYPES[field][0] != _RATE or 0 < value < 100
+    }
+
+    # Los cupos deben cuadrar; si no, alguna etiqueta se leyó mal
+    for prefix, suffix in (("cupo", ""), ("cupo", "_avance_efectivo")):
+        keys = [f"{prefix}_{part}{suffix}" for part in ("total", "utilizado", "disponible")]
+        if all(key in fields for key in keys):
+            total, used, available = (fields[key] for key in keys)
+            if total != used + available:
+                for key in keys:
+                    fields.pop(key)
+
+    return fields
+
+
+def parse_client_fields(text: str) -> Dict[str, str]:
+    """
+    Extrae con reglas el nombre y RUT del cliente.
+
+    El RUT solo se acepta si su dígito verificador es válido.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+
+    Returns:
+        Dict[str, str]: Campos resueltos con las keys del extractor de
+        cliente ("name", "rut").
+    """
+    normalized = normalize_text(text)
+    fields = {}
+
+    rut = _resolve(normalized, CLIENT_RUT_LABELS, _RUT, _text)
+    if rut and rut_is_valid(rut):
+        fields["rut"] = rut
+
+    name = _resolve(normalized, CLIENT_NAME_LABELS, _NAME, _name)
+    if name:
+        fields["name"] = name
+
+    return fields
+
+
+def field_sources(
+    result: dict,
+    rule_fields: dict,
+    missing_value: str = "No encontrado",
+    template_fields: dict = None,
+) -> Dict[str, str]:
+    """
+    Indica qué camino produjo cada campo de un resultado combinado.
+
+    Args:
+        result (dict): Resultado final del extractor.
+        rule_fields (dict): Campos resueltos por reglas.
+        missing_value (str): Valor usado para campos no encontrados.
+        template_fields (dict): Campos leídos desde una plantilla de diseño
+            (ver `layout_templates`).
+
+    Returns:
+        Dict[str, str]: Campo -> "reglas", "plantilla", "llm" o "no_encontrado".
+    """
+    sources = {}
+    for key, value in result.items():
+        if key in rule_fields:
+            sources[key] = "reglas"
+        elif template_fields and key in template_fields:
+            sources[key] = "plantilla"
+        elif value == missing_value:
+            sources[key] = "no_encontrado"
+        else:
+            sources[key] = "llm"
+    return sources
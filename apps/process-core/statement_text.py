@@ -0,0 +1,326 @@
+# app/statement_text.py
+"""
+Preprocesamiento del texto de un estado de cuenta antes de enviarlo al LLM.
+
+El texto se separa en secciones (resumen, movimientos nacionales,
+internacionales, condiciones legales, publicidad, ...) y a cada extractor se
+le entregan solo las que usa. Luego se cuentan los tokens localmente y, si el
+texto excede el presupuesto del modelo, se divide en trozos cuyos resultados
+se combinan después.
+"""
+import logging
+import math
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from statement_rules import normalize_text
+
+logger = logging.getLogger()
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _ENCODING = None
+
+# Tokens máximos del texto del estado de cuenta por llamada (sin contar el
+# prompt de sistema ni la respuesta)
+EXTRACTION_INPUT_TOKEN_BUDGET = int(os.getenv("EXTRACTION_INPUT_TOKEN_BUDGET", "12000"))
+
+# Encabezados que inician cada sección (texto normalizado)
+SECTION_MARKERS: Dict[str, List[str]] = {
+    "resumen": [
+        r"INFORMACION GENERAL",
+        r"RESUMEN (?:DEL )?ESTADO DE CUENTA",
+        r"INFORMACION DE PAGO",
+    ],
+    "nacional": [
+        r"MOVIMIENTOS NACIONALES",
+        r"DETALLE DE (?:TRANSACCIONES|MOVIMIENTOS)",
+        r"PERIODO ACTUAL",
+        r"OPERACIONES NACIONALES",
+    ],
+    "intereses": [
+        r"CARGOS,? COMISIONES,? IMPUESTOS Y ABONOS",
+        r"INTERESES Y COMISIONES",
+    ],
+    "internacional": [
+        r"MOVIMIENTOS INTERNACIONALES",
+        r"OPERACIONES INTERNACIONALES",
+        r"ESTADO DE CUENTA INTERNACIONAL",
+        r"MOVIMIENTOS EN (?:DOLARES|US\$|USD)",
+    ],
+    "legal": [
+        r"CONDICIONES GENERALES",
+        r"TERMINOS Y CONDICIONES",
+        r"INFORMACION LEGAL",
+        r"NOTAS? (?:LEGAL|IMPORTANTE)",
+    ],
+    "publicidad": [
+        r"PROMOCIONES",
+        r"BENEFICIOS (?:DEL MES|EXCLUSIVOS)",
+        r"APROVECHA",
+    ],
+}
+
+# Secciones que nunca se envían al LLM
+DROPPED_SECTIONS = {"internacional", "legal", "publicidad"}
+
+# Movimientos en pesos mínimos para conservar una sección descartable (p. ej.
+# compras bajo un encabezado "PROMOCIONES")
+SECTION_MIN_TRANSACTIONS = 3
+
+# Secciones que usa cada extractor ("encabezado" es el texto antes del
+# primer encabezado reconocido)
+EXTRACTOR_SECTIONS: Dict[str, set] = {
+    "client": {"encabezado", "resumen"},
+    "product": {"encabezado", "resumen", "intereses"},
+    "movements": {"encabezado", "nacional"},
+    "interests": {"encabezado", "resumen", "nacional", "intereses"},
+    "statement": {"encabezado", "resumen", "nacional", "intereses"},
+}
+
+_MAX_HEADER_LENGTH = 80
+
+# Los encabezados se buscan al inicio de la línea: "PAGO TERMINOS Y
+# CONDICIONES SPA" es un movimiento, no el inicio de la sección legal
+_SECTION_PATTERNS: Dict[str, re.Pattern] = {
+    section: re.compile(r"^\s*(?:" + "|".join(markers) + ")")
+    for section, markers in SECTION_MARKERS.items()
+}
+
+# Una línea con fecha o monto es un movimiento o un dato, nunca un encabezado
+_DATE_OR_AMOUNT = re.compile(r"\d{1,2}[/-]\d{1,2}|\$\s?-?\d|\d{1,3}(?:\.\d{3})+")
+
+_DATE = re.compile(r"\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b")
+_CLP = re.compile(r"(?<!US)\$\s?-?\d{1,3}(?:\.\d{3})+")
+_USD = re.compile(r"US\$|USD")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cuenta los tokens de un texto.
+
+    Usa `tiktoken` si está instalado; si no, estima 4 caracteres por token.
+
+    Args:
+        text (str): Texto a medir.
+
+    Returns:
+        int: Cantidad de tokens.
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def domestic_transactions(text: str) -> int:
+    """
+    Estima los movimientos en pesos de un texto (fechas y montos en pesos).
+
+    Args:
+        text (str): Texto de una sección o página.
+
+    Returns:
+        int: Cantidad estimada, 0 si el texto tiene montos en dólares.
+    """
+    if _USD.search(text):
+        return 0
+    return min(len(_DATE.findall(text)), len(_CLP.findall(text)))
+
+
+def _section_name(section: str, body: str) -> str:
+    if section in DROPPED_SECTIONS and domestic_transactions(body) >= SECTION_MIN_TRANSACTIONS:
+        return "nacional"
+    return section
+
+
+def _section_of(line: str) -> Optional[str]:
+    if len(line) > _MAX_HEADER_LENGTH or _DATE_OR_AMOUNT.search(line):
+        return None
+    normalized = normalize_text(line)
+    for section, pattern in _SECTION_PATTERNS.items():
+        if pattern.match(normalized):
+            return section
+    return None
+
+
+def segment_statement(text: str) -> List[Tuple[str, str]]:
+    """
+    Separa el estado de cuenta en secciones según sus encabezados.
+
+    Una sección descartable con varios movimientos en pesos se considera
+    nacional.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+
+    Returns:
+        List[Tuple[str, str]]: (nombre de sección, texto) en orden de aparición.
+    """
+    sections = []
+    current, lines = "encabezado", []
+    for line in text.splitlines():
+        section = _section_of(line)
+        if section and section != current:
+            if lines:
+                body = "\n".join(lines)
+                sections.append((_section_name(current, body), body))
+            current, lines = section, []
+        lines.append(line)
+
+    if lines:
+        body = "\n".join(lines)
+        sections.append((_section_name(current, body), body))
+    return sections
+
+
+def prune_for_extractor(text: str, extractor: str) -> str:
+    """
+    Conserva solo las secciones que usa un extractor.
+
+    Si no se reconoce ninguna de sus secciones (formato desconocido) se
+    entrega todo menos las secciones descartadas.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+        extractor (str): Nombre del extractor (ver `EXTRACTOR_SECTIONS`).
+
+    Returns:
+        str: Texto reducido.
+    """
+    sections = segment_statement(text)
+    wanted = EXTRACTOR_SECTIONS.get(extractor, set())
+    present = {name for name, _ in sections}
+
+    if (present & wanted) - {"encabezado"}:
+        keep = wanted
+    else:
+        keep = present - DROPPED_SECTIONS
+
+    pruned = "\n".join(body for name, body in sections if name in keep)
+    dropped = sorted(present - keep)
+    logger.info(
+        f"Texto para {extractor}: {count_tokens(pruned)}/{count_tokens(text)} tokens, "
+        f"secciones descartadas: {dropped}"
+    )
+    return pruned
+
+
+def chunk_text(text: str, max_tokens: int = EXTRACTION_INPUT_TOKEN_BUDGET) -> List[str]:
+    """
+    Divide el texto en trozos de a lo más `max_tokens`, cortando en saltos de
+    línea para no partir movimientos.
+
+    Args:
+        text (str): Texto a dividir.
+        max_tokens (int): Tokens máximos por trozo.
+
+    Returns:
+        List[str]: Trozos en orden. Siempre contiene al menos uno.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks, lines, used = [], [], 0
+    for line in text.splitlines():
+        tokens = count_tokens(line) + 1
+        if lines and used + tokens > max_tokens:
+            chunks.append("\n".join(lines))
+            lines, used = [], 0
+        lines.append(line)
+        used += tokens
+
+    if lines:
+        chunks.append("\n".join(lines))
+
+    logger.info(f"Texto dividido en {len(chunks)} trozos de hasta {max_tokens} tokens")
+    return chunks
+
+
+def prepare_extractor_input(text: str, extractor: str) -> List[str]:
+    """
+    Reduce el texto a las secciones del extractor y lo divide según el
+    presupuesto de tokens.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+        extractor (str): Nombre del extractor.
+
+    Returns:
+        List[str]: Trozos a enviar al extractor.
+    """
+    return chunk_text(prune_for_extractor(text, extractor))
+
+
+def merge_field_results(results: List[dict], missing_value: str = "No encontrado") -> dict:
+    """
+    Combina resultados de campos (cliente, producto) de varios trozos: se
+    conserva el primer valor encontrado de cada campo.
+
+    Args:
+        results (List[dict]): Resultados por trozo.
+        missing_value (str): Valor usado para campos no encontrados.
+
+    Returns:
+        dict: Resultado combinado.
+    """
+    merged = dict(results[0])
+    for result in results[1:]:
+        for key, value in result.items():
+            if merged.get(key, missing_value) == missing_value:
+                merged[key] = value
+    return merged
+
+
+def merge_category_results(results: List[dict]) -> dict:
+    """
+    Combina resultados por categoría (movimientos, intereses) de varios
+    trozos sumando los totales de cada categoría.
+
+    Args:
+        results (List[dict]): Resultados {"categoria": [...]} por trozo.
+
+    Returns:
+        dict: Resultado combinado con el mismo formato.
+    """
+    totals: Dict[str, float] = {}
+    for result in results:
+        for item in result.get("categoria", []):
+            name = str(item.get("nombre", "otros")).strip().lower()
+            try:
+                total = float(item.get("total", 0) or 0)
+            except (TypeError, ValueError):
+                continue
+            totals[name] = totals.get(name, 0) + total
+
+    ranking = sorted(totals.items(), key=lambda item: -item[1])
+    return {"categoria": [{"nombre": name, "total": int(total)} for name, total in ranking]}
+
+
+# Función de combinación por extractor
+MERGERS: Dict[str, Callable[[List[dict]], dict]] = {
+    "client": merge_field_results,
+    "product": merge_field_results,
+    "movements": merge_category_results,
+    "interests": merge_category_results,
+}
+
+
+def merge_statement_results(results: List[tuple]) -> tuple:
+    """
+    Combina resultados (client, product, movements, interests) de varios trozos.
+
+    Args:
+        results (List[tuple]): Tuplas por trozo.
+
+    Returns:
+        tuple: Tupla combinada.
+    """
+    names = ("client", "product", "movements", "interests")
+    return tuple(
+        MERGERS[name]([result[index] for result in results])
+        for index, name in enumerate(names)
+    )
@@ -0,0 +1,78 @@
+import pytest
+
+import debt_engine
+from debt_engine import amortization_schedule, debt_projection, monthly_rate, simulate_payments
+
+
+def test_monthly_rate_prefers_monthly_rate_over_cae():
+    assert monthly_rate({"tasas_interes_vigente_rotativo": 2.5, "cae_rotativo": 40}) == 0.025
+    assert monthly_rate({"cae_rotativo": 26.82418}) == pytest.approx(0.02, abs=1e-6)
+    assert monthly_rate({"cae_rotativo": "No encontrado"}) is None
+
+
+def test_paying_everything_costs_no_interest():
+    result = simulate_payments(100_000, 0.02, [100_000])
+    assert list(result["months"]) == [1]
+    assert list(result["interest"]) == [0]
+    assert bool(result["paid_off"][0])
+
+
+def test_fixed_payment_matches_schedule():
+    rows = amortization_schedule(100_000, 0.02, 30_000)
+    assert [row["mes"] for row in rows] == [1, 2, 3, 4]
+    assert rows[0] == {"mes": 1, "pago": 30_000, "interes": 1_400, "capital": 28_600, "saldo": 71_400}
+    assert rows[-1]["saldo"] == 0
+    assert sum(row["capital"] for row in rows) == pytest.approx(100_000, abs=2)
+
+
+def test_payment_below_interest_stalls():
+    result = simulate_payments(1_000_000, 0.05, [40_000, 200_000])
+    assert list(result["stalled"]) == [True, False]
+    assert list(result["paid_off"]) == [False, True]
+
+
+def test_minimum_payment_follows_balance():
+    result = simulate_payments(
+        200_000, 0.02, [0.0], minimum=[True], min_ratio=0.1, min_floor=10_000, schedule=True
+    )
+    payments = result["payment_by_month"][0]
+    assert payments[0] == 20_000
+    assert payments[1] < payments[0]
+    assert payments[-1] <= 10_000
+    assert bool(result["paid_off"][0])
+
+
+def test_debt_projection_scenarios():
+    product = {
+        "monto_total_facturado": 500_000,
+        "monto_minimo_pagar": 25_000,
+        "tasas_interes_vigente_rotativo": 2.0,
+    }
+    projection = debt_projection(product, custom_payments=[100_000])
+    scenarios = {scenario["nombre"]: scenario for scenario in projection["escenarios"]}
+
+    assert list(scenarios) == [
+        "pago_minimo",
+        "fijo_1x_minimo",
+        "fijo_1.5x_minimo",
+        "fijo_2x_minimo",
+        "fijo_3x_minimo",
+        "total_facturado",
+        "personalizado_100000",
+    ]
+    assert scenarios["total_facturado"]["meses"] == 1
+    assert scenarios["total_facturado"]["intereses_totales"] == 0
+    assert scenarios["pago_minimo"]["pago_mensual"] == 25_000
+    # Pagar más liquida antes y con menos intereses
+    assert scenarios["fijo_3x_minimo"]["meses"] < scenarios["fijo_1x_minimo"]["meses"]
+    assert (
+        scenarios["fijo_3x_minimo"]["intereses_totales"]
+        < scenarios["fijo_1x_minimo"]["intereses_totales"]
+    )
+
+
+def test_debt_projection_needs_balance_and_rate(monkeypatch):
+    assert debt_projection({"monto_total_facturado": 500_000}) is None
+    assert debt_projection({"tasas_interes_vigente_rotativo": 2.0}) is None
+    monkeypatch.setattr(debt_engine, "DEBT_PROJECTION_ENABLED", False)
+    assert debt_projection({"monto_total_facturado": 1, "cae_rotativo": 30}) is None
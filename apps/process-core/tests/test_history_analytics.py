@@ -0,0 +1,128 @@
+from datetime import date
+
+import pytest
+
+import history_analytics
+from history_analytics import (
+    METRICS_CONFLICT_KEY,
+    StatementHistory,
+    insert_statement_metrics,
+    metric_rows,
+    product_key,
+    statement_month,
+)
+
+
+def candidate(card="XXXX XXXX XXXX 1234", fecha="15/09/2024", cupo=1_000_000, cae=30.0, **extra):
+    return {
+        "user_id": "u1",
+        "process_id": "p1",
+        "product": {
+            "numero_tarjeta": card,
+            "fecha_estado_cuenta": fecha,
+            "cupo_total": cupo,
+            "cupo_utilizado": cupo // 2,
+            "cae_rotativo": cae,
+        },
+        "movements": {"categoria": [{"nombre": "Supermercado", "total": 50_000}]},
+        "interests": {"categoria": [{"nombre": "comision", "total": 3_000}]},
+        **extra,
+    }
+
+
+@pytest.mark.parametrize(
+    "fecha, expected",
+    [
+        ("15/09/2024", date(2024, 9, 1)),
+        ("03-01-24", date(2024, 1, 1)),
+        ("fecha 31/12/2023", date(2023, 12, 1)),
+        ("99/99/2024", date(2020, 5, 1)),
+        (None, date(2020, 5, 1)),
+    ],
+)
+def test_statement_month(fecha, expected):
+    assert statement_month({"fecha_estado_cuenta": fecha}, default=date(2020, 5, 17)) == expected
+
+
+@pytest.mark.parametrize(
+    "row, expected",
+    [
+        (candidate(), "tarjeta:1234"),
+        (candidate(card="**** 9876"), "tarjeta:9876"),
+        (candidate(card=None, document_hash="abc"), "documento:abc"),
+    ],
+)
+def test_product_key(row, expected):
+    assert product_key(row) == expected
+
+
+def test_product_key_without_card_or_hash_depends_on_product():
+    first = candidate(card=None, cupo=1_000_000)
+    second = candidate(card=None, cupo=2_000_000)
+    assert product_key(first).startswith("producto:")
+    assert product_key(first) == product_key(candidate(card=None, cupo=1_000_000))
+    assert product_key(first) != product_key(second)
+
+
+def test_two_cards_in_same_month_do_not_collide():
+    rows = metric_rows(candidate()) + metric_rows(candidate(card="XXXX 5678"))
+    keys = {tuple(row[column] for column in METRICS_CONFLICT_KEY) for row in rows}
+    assert len(keys) == len(rows)
+
+
+class _Table:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def upsert(self, rows, on_conflict=""):
+        self.calls.append((rows, on_conflict))
+        return self
+
+    def execute(self):
+        return type("Response", (), {"error": None})()
+
+
+class _Supabase:
+    def __init__(self):
+        self.calls = []
+
+    def table(self, name):
+        return _Table(self.calls)
+
+
+def test_insert_dedupes_keys_within_batch(monkeypatch):
+    supabase = _Supabase()
+    monkeypatch.setattr(history_analytics, "get_supabase", lambda: supabase)
+    monkeypatch.setattr(history_analytics, "HISTORY_ANALYTICS_ENABLED", True)
+
+    # El mismo estado dos veces y otra tarjeta del mismo mes
+    insert_statement_metrics([candidate(), candidate(), candidate(card="XXXX 5678")])
+
+    (rows, on_conflict), = supabase.calls
+    assert on_conflict == "user_id,statement_month,product_key,kind,name"
+    keys = [tuple(row[column] for column in METRICS_CONFLICT_KEY) for row in rows]
+    assert len(keys) == len(set(keys))
+    assert len(rows) == 2 * len(metric_rows(candidate()))
+
+
+def test_history_sums_cards_and_averages_rates():
+    rows = metric_rows(candidate(cupo=1_000_000, cae=30.0)) + metric_rows(
+        candidate(card="XXXX 5678", cupo=3_000_000, cae=40.0)
+    )
+    rows += metric_rows(candidate(fecha="15/10/2024", cupo=1_000_000, cae=32.0))
+    history = StatementHistory(rows)
+
+    assert history.months == [date(2024, 9, 1), date(2024, 10, 1)]
+    assert list(history.product["cupo_total"]) == [4_000_000, 1_000_000]
+    assert list(history.product["cae_rotativo"]) == [35.0, 32.0]
+    assert history.spend_categories == ["supermercado"]
+    assert list(history.spend[:, 0]) == [100_000, 50_000]
+    assert history.utilization() == [50.0, 50.0]
+
+
+def test_history_missing_product_metric_is_nan():
+    rows = metric_rows(candidate()) + metric_rows(
+        {**candidate(fecha="15/10/2024"), "product": {"fecha_estado_cuenta": "15/10/2024"}}
+    )
+    history = StatementHistory(rows)
+    assert history.summary()["uso_cupo_pct"] == [50.0, None]
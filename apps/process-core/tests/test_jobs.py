@@ -0,0 +1,323 @@
+import asyncio
+import json
+
+import pytest
+
+import jobs
+from clients import set_client
+from jobs import (
+    JOB_DONE,
+    JOB_ERROR,
+    JOB_EVENT_KEY,
+    InMemoryJobBackend,
+    JobWorkerPool,
+    LambdaJobDispatcher,
+    SQLiteJobBackend,
+    SupabaseJobBackend,
+    create_job_dispatcher,
+    run_job,
+    stream_job_events,
+)
+
+FILES = [("a.pdf", b"%PDF-a"), ("b.pdf", b"%PDF-b")]
+
+
+async def handler(job, files, progress):
+    for index, _ in enumerate(files):
+        await progress(index, "extrayendo")
+    return {"processed_files": [name for name, _ in files]}
+
+
+def test_memory_backend_evicts_finished_jobs(monkeypatch):
+    async def scenario():
+        backend = InMemoryJobBackend()
+        done = await backend.create_job("p", "u", FILES)
+        running = await backend.create_job("p", "u", FILES)
+        await backend.claim(done["id"])
+        await backend.finish_job(done["id"], result={})
+        await backend.claim(running["id"])
+
+        monkeypatch.setattr(jobs, "JOB_TTL_SECONDS", -1)
+        fresh = await backend.create_job("p", "u", FILES)
+
+        assert await backend.get_job(done["id"]) is None
+        assert await backend.events_since(done["id"], 0) == []
+        assert (await backend.get_job(running["id"]))["status"] == jobs.JOB_RUNNING
+        assert await backend.get_job(fresh["id"]) is not None
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_backend_evicts_finished_jobs(monkeypatch, tmp_path):
+    async def scenario():
+        backend = SQLiteJobBackend(str(tmp_path / "jobs.sqlite3"))
+        done = await backend.create_job("p", "u", FILES)
+        running = await backend.create_job("p", "u", FILES)
+        await backend.claim(done["id"])
+        await backend.finish_job(done["id"], result={})
+        await backend.claim(running["id"])
+
+        monkeypatch.setattr(jobs, "JOB_TTL_SECONDS", -1)
+        fresh = await backend.create_job("p", "u", FILES)
+
+        assert await backend.get_job(done["id"]) is None
+        assert await backend.events_since(done["id"], 0) == []
+        assert (await backend.get_job(running["id"]))["status"] == jobs.JOB_RUNNING
+        assert await backend.get_files(running["id"]) == FILES
+        assert await backend.get_job(fresh["id"]) is not None
+
+    asyncio.run(scenario())
+
+
+async def collect(stream) -> list:
+    return [event async for event in stream]
+
+
+def test_event_stream_ends_when_job_finishes(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL_SECONDS", 0.01)
+
+    async def scenario():
+        backend = InMemoryJobBackend()
+        job = await backend.create_job("p", "u", FILES)
+        await backend.claim(job["id"])
+        await backend.finish_job(job["id"], result={})
+        return await collect(stream_job_events(backend, job["id"]))
+
+    events = asyncio.run(scenario())
+    assert [event.split("\n")[1] for event in events] == ["event: job"] * 3
+
+
+def test_event_stream_stops_when_job_is_missing(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL_SECONDS", 0.01)
+
+    async def scenario():
+        backend = InMemoryJobBackend()
+        job = await backend.create_job("p", "u", FILES)
+        await backend.claim(job["id"])
+        await backend.finish_job(job["id"], result={})
+        # El trabajo se eliminó por TTL antes de que el cliente reanudara
+        monkeypatch.setattr(jobs, "JOB_TTL_SECONDS", -1)
+        await backend.create_job("p", "u", FILES)
+        return await collect(stream_job_events(backend, job["id"], last_seq=1))
+
+    (event,) = asyncio.run(scenario())
+    assert event.startswith("event: error\n")
+    assert json.loads(event.split("data: ")[1])["status"] == "not_found"
+
+
+def test_event_stream_times_out_on_stuck_job(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL_SECONDS", 0.01)
+
+    async def scenario():
+        backend = InMemoryJobBackend()
+        job = await backend.create_job("p", "u", FILES)
+        await backend.claim(job["id"])
+        return await collect(stream_job_events(backend, job["id"], timeout=0.05))
+
+    events = asyncio.run(scenario())
+    assert len(events) == 3
+    assert events[-1].startswith("event: error\n")
+    assert json.loads(events[-1].split("data: ")[1])["status"] == "timeout"
+
+
+def test_local_pool_processes_jobs(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL_SECONDS", 0.01)
+
+    async def scenario():
+        backend = InMemoryJobBackend()
+        pool = JobWorkerPool(backend, handler, workers=1)
+        job = await backend.create_job("p", "u", FILES)
+        await pool.dispatch(job["id"])
+        while (await backend.get_job(job["id"]))["status"] != JOB_DONE:
+            await asyncio.sleep(0.01)
+
+        result = await backend.get_job(job["id"])
+        assert result["result"] == {"processed_files": ["a.pdf", "b.pdf"]}
+        assert [file["stage"] for file in result["files"]] == ["extrayendo", "extrayendo"]
+        for task in pool._tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
+
+
+class FakeLambda:
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def invoke(self, **kwargs):
+        if self.error:
+            raise self.error
+        self.calls.append(kwargs)
+
+
+@pytest.fixture
+def fake_lambda():
+    client = FakeLambda()
+    set_client("lambda", client)
+    yield client
+    set_client("lambda", None)
+
+
+def test_lambda_dispatch_invokes_function_once_per_job(fake_lambda):
+    async def scenario():
+        backend = InMemoryJobBackend()
+        dispatcher = LambdaJobDispatcher(backend, handler, function_name="kairos")
+        job = await backend.create_job("p", "u", FILES)
+        await dispatcher.dispatch(job["id"])
+
+        (call,) = fake_lambda.calls
+        assert call["FunctionName"] == "kairos"
+        assert call["InvocationType"] == "Event"
+        event = json.loads(call["Payload"])
+        assert event == {JOB_EVENT_KEY: job["id"]}
+
+        # Un reintento de la invocación no vuelve a procesar el trabajo
+        await dispatcher.run(event[JOB_EVENT_KEY])
+        first = await backend.get_job(job["id"])
+        await dispatcher.run(event[JOB_EVENT_KEY])
+        assert first["status"] == JOB_DONE
+        assert await backend.get_job(job["id"]) == first
+
+    asyncio.run(scenario())
+
+
+def test_lambda_dispatch_failure_marks_job_error():
+    set_client("lambda", FakeLambda(error=RuntimeError("AccessDenied")))
+
+    async def scenario():
+        backend = InMemoryJobBackend()
+        dispatcher = LambdaJobDispatcher(backend, handler, function_name="kairos")
+        job = await backend.create_job("p", "u", FILES)
+        with pytest.raises(RuntimeError):
+            await dispatcher.dispatch(job["id"])
+        failed = await backend.get_job(job["id"])
+        assert failed["status"] == JOB_ERROR
+        assert "AccessDenied" in failed["error"]
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        set_client("lambda", None)
+
+
+def test_lambda_dispatch_requires_shared_backend():
+    with pytest.raises(ValueError):
+        create_job_dispatcher(InMemoryJobBackend(), handler, name="lambda")
+
+
+class FakeQuery:
+    def __init__(self, tables, name):
+        self.rows = tables.setdefault(name, [])
+        self.action, self.values, self.filters, self.order_by = "select", None, [], None
+
+    def select(self, *columns):
+        return self
+
+    def insert(self, row):
+        self.action, self.values = "insert", row
+        return self
+
+    def update(self, values):
+        self.action, self.values = "update", values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row[column] < value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def order(self, column):
+        self.order_by = column
+        return self
+
+    def execute(self):
+        if self.action == "insert":
+            self.rows.append(json.loads(json.dumps(self.values)))
+            return type("Response", (), {"data": [self.values]})()
+        matched = [row for row in self.rows if all(f(row) for f in self.filters)]
+        if self.action == "update":
+            for row in matched:
+                row.update(json.loads(json.dumps(self.values)))
+        if self.action == "delete":
+            self.rows[:] = [row for row in self.rows if row not in matched]
+        if self.order_by:
+            matched.sort(key=lambda row: row[self.order_by])
+        return type("Response", (), {"data": json.loads(json.dumps(matched))})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, name):
+        return FakeQuery(self.tables, name)
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        body = self.objects[(Bucket, Key)]
+        return {"Body": type("Body", (), {"read": lambda self: body})()}
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.objects.pop((Bucket, item["Key"]))
+
+
+def test_supabase_backend_shares_jobs_through_tables_and_s3():
+    supabase, s3 = FakeSupabase(), FakeS3()
+    set_client("supabase", supabase)
+    set_client("s3", s3)
+
+    async def scenario():
+        job = await SupabaseJobBackend("bucket").create_job("p", "u", FILES)
+        assert len(s3.objects) == 2
+
+        # Otra instancia toma el trabajo y lo procesa
+        worker = SupabaseJobBackend("bucket")
+        assert await worker.claim(job["id"])
+        assert not await worker.claim(job["id"])
+        assert await worker.get_files(job["id"]) == FILES
+        await run_job(worker, handler, job["id"])
+
+        reader = SupabaseJobBackend("bucket")
+        done = await reader.get_job(job["id"])
+        assert done["status"] == JOB_DONE
+        assert done["result"] == {"processed_files": ["a.pdf", "b.pdf"]}
+        events = await reader.events_since(job["id"], 0)
+        assert [event["seq"] for event in events] == list(range(1, 6))
+        assert [event.get("status") for event in events] == [
+            "en_cola",
+            "procesando",
+            None,
+            None,
+            "listo",
+        ]
+        assert s3.objects == {}
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        set_client("supabase", None)
+        set_client("s3", None)
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+import layout_templates
+import utils
+from cache_store import MemoryLRUStore, TieredCache
+from layout_templates import PageLayout, TextRun, learn_layout, template_fields
+
+RUNS = [
+    TextRun(50, 700, "F1", "SR. JUAN PEREZ RUT: 12.345.678-5"),
+    TextRun(50, 650, "F1", "CUPO TOTAL"),
+    TextRun(50, 640, "F1", "$ 1.000.000"),
+    TextRun(50, 600, "F1", "JUAN PEREZ GONZALEZ"),
+    TextRun(250, 600, "F1", "$ 250.000"),
+]
+
+TEXT = "NOMBRE TITULAR: JUAN PEREZ\nCUPO TOTAL $ 1.000.000\n"
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = TieredCache([MemoryLRUStore(16, 60)])
+    monkeypatch.setattr(layout_templates, "_template_store", store)
+    return store
+
+
+def test_learned_slots_keep_only_the_label(store):
+    layout = PageLayout(RUNS, "bci", "fp-test")
+    learned = learn_layout(
+        layout,
+        {
+            "client": {"rut": "12.345.678-5"},
+            "product": {"cupo_total": 1000000, "cupo_utilizado": 250000},
+        },
+    )
+
+    template = store.get("fp-test")
+    anchors = {
+        candidate["slot"]["anchor"]
+        for candidates in template["fields"].values()
+        for candidate in candidates.values()
+    }
+    assert anchors == {"RUT", "CUPO TOTAL"}
+    assert "JUAN" not in json.dumps(template)
+    # El cupo utilizado solo tiene al lado el nombre del titular: no se aprende
+    assert learned == 2
+    assert "cupo_utilizado" not in template["fields"]
+
+
+def test_label_slots_are_read_back(store):
+    layout = PageLayout(RUNS, "bci", "fp-test")
+    for _ in range(layout_templates.LAYOUT_TEMPLATE_MIN_SAMPLES):
+        learn_layout(layout, {"client": {"rut": "12.345.678-5"}, "product": {"cupo_total": 1000000}})
+
+    assert template_fields(layout) == {
+        "client": {"rut": "12.345.678-5"},
+        "product": {"cupo_total": 1000000},
+    }
+
+
+def test_only_llm_fields_are_learned(monkeypatch):
+    learned = []
+    monkeypatch.setattr(utils, "learn_layout", lambda layout, results: learned.append(results))
+
+    fields = (
+        {"name": "JUAN PEREZ", "rut": "12.345.678-5"},
+        {
+            "nombre_titular": "JUAN PEREZ",
+            "cupo_total": 1000000,
+            "cupo_utilizado": 250000,
+            "fecha_pagar_hasta": "05/11/2026",
+            "numero_tarjeta": "No encontrado",
+        },
+        {},
+        {},
+    )
+    known = {"product": {"cupo_utilizado": 250000}}
+    utils._learn_layout(PageLayout([], None, "fp-test"), TEXT, fields, known, "multi_call")
+
+    # Nombre y cupo total vienen de las reglas; el cupo utilizado, de la plantilla
+    assert learned == [
+        {"client": {"rut": "12.345.678-5"}, "product": {"fecha_pagar_hasta": "05/11/2026"}}
+    ]
+
+
+def test_partial_sync_extraction_is_not_learned(monkeypatch):
+    learned = []
+    monkeypatch.setattr(utils, "learn_layout", lambda layout, results: learned.append(results))
+    monkeypatch.setattr(utils, "get_extraction_cache", lambda: None)
+    monkeypatch.setattr(utils, "extract_pdf_text", lambda content: TEXT)
+    monkeypatch.setattr(
+        utils, "match_layout", lambda content: (PageLayout([], None, "fp-test"), {})
+    )
+
+    def fail(text):
+        raise TimeoutError("OpenAI no respondió")
+
+    def rut_only(text):
+        return {"name": "No encontrado", "rut": "12.345.678-5"}
+
+    def empty(text):
+        return {"categoria": []}
+
+    monkeypatch.setattr(
+        utils,
+        "SYNC_EXTRACTORS",
+        (
+            ("client", rut_only, utils.build_client_result),
+            ("product", fail, utils.build_product_result),
+            ("movements", empty, utils.build_movements_result),
+            ("interests", empty, utils.build_interests_result),
+        ),
+    )
+
+    client, product, *_ = utils.extract_bank_document(b"%PDF")
+
+    assert client["rut"] == "12.345.678-5"
+    assert product == utils.build_product_result({})
+    assert learned == []
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+from prompts.llm_gateway import CircuitBreaker, CircuitOpenError, LLMGateway
+
+
+class APIConnectionError(Exception):
+    """Imita `openai.error.APIConnectionError` (reintentable)."""
+
+
+APIConnectionError.__module__ = "openai.error"
+
+
+class InvalidRequestError(Exception):
+    """Imita `openai.error.InvalidRequestError` (no reintentable)."""
+
+
+InvalidRequestError.__module__ = "openai.error"
+
+
+def make_gateway(threshold=1, reset_seconds=0.0, max_retries=0, timeout=10.0) -> LLMGateway:
+    return LLMGateway(
+        6000, 1_000_000, max_retries, CircuitBreaker(threshold, reset_seconds), timeout
+    )
+
+
+def fail_with(error):
+    async def call():
+        raise error
+
+    return call
+
+
+async def ok():
+    return {"ok": True}
+
+
+async def hang():
+    await asyncio.sleep(10)
+
+
+PARAMS = {"messages": [{"role": "user", "content": "hola"}], "max_tokens": 10}
+
+
+def test_breaker_opens_after_threshold_and_recovers():
+    breaker = CircuitBreaker(threshold=2, reset_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+
+    trial = breaker.before_call()
+    assert trial is not None
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.before_call() is None
+
+
+def test_breaker_stays_open_during_reset_window():
+    breaker = CircuitBreaker(threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_failed_trial_reopens_circuit():
+    breaker = CircuitBreaker(threshold=1, reset_seconds=0.0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.opens == 2
+    # Pasado el reset se admite una nueva prueba
+    assert breaker.before_call() is not None
+
+
+def test_release_trial_only_releases_its_own_token():
+    breaker = CircuitBreaker(threshold=1, reset_seconds=0.0)
+    breaker.record_failure()
+    trial = breaker.before_call()
+    breaker.release_trial(object())
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.release_trial(trial)
+    assert breaker.before_call() is not None
+
+
+def test_cancelled_trial_call_does_not_wedge_breaker():
+    gateway = make_gateway()
+
+    async def scenario():
+        with pytest.raises(APIConnectionError):
+            await gateway.acall(PARAMS, fail_with(APIConnectionError()))
+        assert gateway.breaker.state == "half_open"
+
+        # Quien llama cancela la llamada de prueba mientras espera a OpenAI
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(gateway.acall(PARAMS, hang), 0.05)
+
+        # La cancelación no cuenta como falla pero libera la prueba
+        assert gateway.breaker.opens == 1
+        assert gateway.breaker.state == "half_open"
+        return await gateway.acall(PARAMS, ok)
+
+    assert asyncio.run(scenario()) == {"ok": True}
+    assert gateway.breaker.state == "closed"
+
+
+def test_hung_calls_count_toward_opening():
+    gateway = make_gateway(threshold=2, reset_seconds=60, timeout=0.01)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await gateway.acall(PARAMS, hang)
+        with pytest.raises(CircuitOpenError):
+            await gateway.acall(PARAMS, ok)
+
+    asyncio.run(scenario())
+    assert gateway.breaker.state == "open"
+
+
+def test_cancelled_calls_do_not_count_toward_opening():
+    gateway = make_gateway(threshold=1, reset_seconds=60)
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(gateway.acall(PARAMS, hang), 0.01)
+        return await gateway.acall(PARAMS, ok)
+
+    assert asyncio.run(scenario()) == {"ok": True}
+    assert gateway.breaker.state == "closed"
+    assert gateway.breaker.opens == 0
+
+
+def test_non_retryable_error_does_not_open_circuit():
+    gateway = make_gateway(threshold=1)
+
+    async def scenario():
+        with pytest.raises(InvalidRequestError):
+            await gateway.acall(PARAMS, fail_with(InvalidRequestError()))
+
+    asyncio.run(scenario())
+    assert gateway.breaker.state == "closed"
+
+
+def test_sync_call_retries_then_succeeds():
+    gateway = make_gateway(threshold=5, max_retries=2)
+    gateway._backoff = lambda attempt, error: 0.0
+    outcomes = [APIConnectionError(), {"ok": True}]
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert gateway.call(PARAMS, call) == {"ok": True}
+    assert gateway.retries == 1
+    assert gateway.breaker.state == "closed"
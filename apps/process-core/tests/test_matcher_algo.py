@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from cache_store import MemoryLRUStore, TieredCache
+from clients import set_client
+from matcher_algo import calculate_match_score
+from prompts import completion
+from prompts.prompt_cache import PromptCache
+
+
+class Response(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.calls = []
+
+        fake = self
+
+        class ChatCompletion:
+            @staticmethod
+            def create(**kwargs):
+                raise AssertionError("llamada bloqueante dentro del event loop")
+
+            @staticmethod
+            async def acreate(**kwargs):
+                fake.calls.append(kwargs)
+                message = Response(role="assistant", content="87: buen match")
+                return Response(
+                    choices=[Response(index=0, message=message, finish_reason="stop")],
+                    usage={"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13},
+                )
+
+        class util:
+            @staticmethod
+            def convert_to_openai_object(value):
+                if isinstance(value, dict):
+                    return Response({k: util.convert_to_openai_object(v) for k, v in value.items()})
+                if isinstance(value, list):
+                    return [util.convert_to_openai_object(v) for v in value]
+                return value
+
+        self.ChatCompletion = ChatCompletion
+        self.util = util
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    cache = PromptCache(TieredCache([MemoryLRUStore(16, 60)]))
+    monkeypatch.setattr(completion, "get_prompt_cache", lambda: cache)
+    client = FakeOpenAI()
+    set_client("openai", client)
+    yield client
+    set_client("openai", None)
+
+
+def test_match_score_uses_async_completion_and_prompt_cache(fake_openai):
+    async def scenario():
+        first = await calculate_match_score("cv", "cargo")
+        second = await calculate_match_score("cv", "cargo")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first == {"match_score": 87, "explanation": "buen match"}
+    assert second == first
+    (call,) = fake_openai.calls
+    assert {"model", "max_tokens", "messages"} <= set(call)
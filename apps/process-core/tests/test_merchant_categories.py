@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from merchant_categories import (
+    AhoCorasick,
+    MerchantCategorizer,
+    merchant_key,
+    parse_movement_lines,
+    split_movement_lines,
+    sum_by_category,
+)
+from prompts import extract_movements as movements_prompt
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("12/03/2024 COPEC ESTACION 123 $ 25.990", ("COPEC ESTACION 123", 25990)),
+        ("12-03 UBER TRIP 5.990", ("UBER TRIP", 5990)),
+        ("12/03/24 NOTA DE CREDITO -$ 1.000", ("NOTA DE CREDITO", -1000)),
+        ("12/03/24 DEVOLUCION $ -2.500", ("DEVOLUCION", -2500)),
+        ("12/03/24 KIOSCO $ 990", ("KIOSCO", 990)),
+        # El número de cuotas no es el monto
+        ("03/09/24 RIPLEY COMPRA 3 CUOTAS $ 90.000 3", ("RIPLEY COMPRA 3 CUOTAS", 90000)),
+        # Valor cuota y cuota después del monto de la operación
+        ("03/09/24 FALABELLA TV $ 360.000 $ 120.000 01/03", ("FALABELLA TV", 360000)),
+    ],
+)
+def test_parse_movement_line(line, expected):
+    assert parse_movement_lines(line) == [expected]
+
+
+def test_split_returns_unparsed_dated_lines():
+    text = "\n".join(
+        [
+            "MOVIMIENTOS",
+            "12/03/2024 JUMBO $ 45.000",
+            "13/03/2024 AMAZON USD 12,99",
+            "14/03/2024 JUMBO 1234",
+            "15/03/2024 PAGO TARJETA $ 100.000",
+            "15/03/2024 PAGO PAC 100.000,5",
+            "TOTAL $ 45.000",
+        ]
+    )
+    movements, unparsed = split_movement_lines(text)
+    assert movements == [("JUMBO", 45000)]
+    assert unparsed == ["13/03/2024 AMAZON USD 12,99", "14/03/2024 JUMBO 1234"]
+
+
+def test_aho_corasick_prefers_longest_whole_word():
+    automaton = AhoCorasick({"UBER": "movilidad", "UBER EATS": "restaurantes", "ENEL": "servicios"})
+    assert automaton.search("UBER EATS SANTIAGO") == "restaurantes"
+    assert automaton.search("PAGO UBER") == "movilidad"
+    assert automaton.search("GENELAB") is None
+
+
+def test_merchant_key():
+    assert merchant_key("Comercial XYZ 1234 Santiago Centro") == "COMERCIAL XYZ SANTIAGO"
+
+
+def test_categorizer_learns_and_persists(tmp_path):
+    path = str(tmp_path / "comercios.json")
+    categorizer = MerchantCategorizer(path)
+    assert categorizer.categorize("COPEC 123") == "combustible"
+    assert categorizer.categorize("PANADERIA LA ESPIGA 12") is None
+
+    categorizer.learn({"PANADERIA LA ESPIGA 12": "Alimentos "})
+    assert MerchantCategorizer(path).categorize("PANADERIA LA ESPIGA 99") == "alimentos"
+
+
+def test_sum_by_category_ranks_totals():
+    movements = [("A", 100), ("B", 300), ("C", 50)]
+    assert sum_by_category(movements, ["x", "y", "x"]) == {
+        "categoria": [{"nombre": "y", "total": 300}, {"nombre": "x", "total": 150}]
+    }
+
+
+@pytest.fixture
+def local_movements(monkeypatch, tmp_path):
+    categorizer = MerchantCategorizer(str(tmp_path / "comercios.json"))
+    monkeypatch.setattr(movements_prompt, "get_categorizer", lambda: categorizer)
+    monkeypatch.setattr(movements_prompt, "LOCAL_CATEGORIZER_ENABLED", True)
+    monkeypatch.setattr(movements_prompt, "categorize_merchants", lambda unknown: {})
+
+
+def test_unparsed_lines_are_sent_to_llm(monkeypatch, local_movements):
+    sent = []
+
+    def fake_request_json(params, parse, task):
+        sent.append(params["messages"][-1]["content"])
+        return {"categoria": [{"nombre": "Tiendas", "total": 10_000}]}
+
+    monkeypatch.setattr(movements_prompt, "request_json", fake_request_json)
+    text = "12/03/2024 COPEC $ 20.000\n13/03/2024 AMAZON USD 12,99\n14/03/2024 RIPLEY $ 5.000"
+
+    result = movements_prompt.extract_movements(text)
+
+    assert sent == ["13/03/2024 AMAZON USD 12,99"]
+    assert result == {
+        "categoria": [
+            {"nombre": "combustible", "total": 20_000},
+            {"nombre": "tiendas", "total": 15_000},
+        ]
+    }
+
+
+def test_fully_parsed_text_skips_llm(monkeypatch, local_movements):
+    def fail(*args, **kwargs):
+        raise AssertionError("no debería llamar al LLM")
+
+    monkeypatch.setattr(movements_prompt, "request_json", fail)
+    monkeypatch.setattr(movements_prompt, "arequest_json", fail)
+    text = "12/03/2024 COPEC $ 20.000"
+
+    expected = {"categoria": [{"nombre": "combustible", "total": 20_000}]}
+    assert movements_prompt.extract_movements(text) == expected
+    assert asyncio.run(movements_prompt.extract_movements_async(text)) == expected
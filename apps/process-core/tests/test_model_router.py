@@ -0,0 +1,47 @@
+import importlib
+import json
+
+from prompts import model_router
+from prompts.model_router import (
+    DEFAULT_TIERS,
+    MODEL_TIERS,
+    TIER_ORDER,
+    choose_route,
+    escalate,
+    tier_cost,
+)
+
+MESSAGES = [{"role": "user", "content": "Extrae el nombre del titular."}]
+
+
+def test_default_tiers_are_declared_from_cheapest_to_most_expensive():
+    costs = [tier_cost(tier) for tier in DEFAULT_TIERS.values()]
+    assert costs == sorted(costs)
+    for field in ("input_cost_1k", "output_cost_1k"):
+        prices = [tier[field] for tier in DEFAULT_TIERS.values()]
+        assert prices == sorted(prices)
+
+
+def test_escalation_order_follows_cost():
+    costs = [tier_cost(MODEL_TIERS[name]) for name in TIER_ORDER]
+    assert costs == sorted(costs)
+
+
+def test_routes_start_cheap_and_escalate_to_a_pricier_tier():
+    route = choose_route("client", MESSAGES)
+    assert route.tier == TIER_ORDER[0]
+
+    escalated = escalate(route)
+    assert escalated is not None
+    assert tier_cost(MODEL_TIERS[escalated.tier]) > tier_cost(MODEL_TIERS[route.tier])
+    assert escalate(escalated) is None
+
+
+def test_custom_tiers_are_sorted_by_cost(monkeypatch):
+    reversed_tiers = dict(reversed(list(DEFAULT_TIERS.items())))
+    monkeypatch.setenv("MODEL_TIERS", json.dumps(reversed_tiers))
+    try:
+        assert importlib.reload(model_router).TIER_ORDER == list(DEFAULT_TIERS)
+    finally:
+        monkeypatch.delenv("MODEL_TIERS")
+        importlib.reload(model_router)
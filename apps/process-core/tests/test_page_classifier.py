@@ -0,0 +1,88 @@
+from page_classifier import UNKNOWN, classify_pages, decode_literal, stream_text
+
+
+def stream(*lines: str) -> bytes:
+    body = b" T* ".join(
+        b"(" + line.encode("latin-1").replace(b"(", b"\\(").replace(b")", b"\\)") + b") Tj"
+        for line in lines
+    )
+    return b"BT /F1 9 Tf 40 800 Td " + body + b" ET"
+
+
+FIRST_PAGE = stream(
+    "BANCO EJEMPLO",
+    "INFORMACION GENERAL",
+    "CUPO TOTAL $ 1.000.000",
+    "MOVIMIENTOS NACIONALES",
+    "02/09/24 JUMBO $ 45.000",
+)
+DOMESTIC = [f"0{day}/09/24 COMPRA COMERCIO {day} $ {day}5.000" for day in range(1, 5)]
+LEGAL = stream(
+    "CONDICIONES GENERALES",
+    "EL EMISOR NO ASUME RESPONSABILIDAD POR CARGOS NO RECONOCIDOS FUERA DE PLAZO.",
+)
+LEGAL_CONTINUED = stream("EL CONTRATO SE RIGE POR LA LEY 19.496 SOBRE PROTECCION AL CONSUMIDOR.")
+ADS = stream("PROMOCIONES", "HASTA 12 CUOTAS SIN INTERES EN TIENDAS ADHERIDAS DEL CATALOGO")
+
+
+def test_decode_literal_escapes():
+    assert decode_literal(rb"(A\(B\) \351 \\ C\n)") == "A(B) é \\ C\n"
+
+
+def test_stream_text_lines():
+    text, opaque = stream_text(b"BT (HOLA) Tj T* [(MUN) -20 (DO)] TJ <0041> Tj ET")
+    assert text == "HOLA\nMUNDO"
+    assert opaque == 1
+
+
+def test_dropped_pages_are_skipped():
+    plan = classify_pages([FIRST_PAGE, LEGAL, LEGAL_CONTINUED, ADS])
+    assert plan.pages == [0]
+    assert plan.skipped == {1: ["legal"], 2: ["legal"], 3: ["publicidad"]}
+
+
+def test_headed_dropped_section_with_domestic_movements_is_kept():
+    promo_purchases = stream("PROMOCIONES", *DOMESTIC)
+    plan = classify_pages([FIRST_PAGE, promo_purchases])
+    assert plan.classes[1] == ["nacional"]
+    assert plan.pages == [0, 1]
+
+
+def test_inherited_dropped_section_with_domestic_movements_is_kept():
+    plan = classify_pages([FIRST_PAGE, LEGAL, stream(*DOMESTIC)])
+    assert plan.classes[2] == [UNKNOWN]
+    assert plan.pages == [0, 2]
+
+
+def test_international_movements_are_skipped():
+    international = stream(
+        "MOVIMIENTOS INTERNACIONALES", *(f"0{day}/09/24 AMAZON US$ 12,99" for day in range(1, 5))
+    )
+    plan = classify_pages([FIRST_PAGE, international])
+    assert plan.pages == [0]
+
+
+def test_unreadable_pages_are_kept():
+    plan = classify_pages([FIRST_PAGE, None, b"BT <0041> Tj ET"])
+    assert plan.classes[1:] == [[UNKNOWN], [UNKNOWN]]
+    assert plan.pages == [0, 1, 2]
+
+
+def test_page_without_header_uses_keywords():
+    plan = classify_pages([None, ADS.replace(b"(PROMOCIONES) Tj T* ", b"")])
+    assert plan.classes[1] == ["publicidad"]
+    assert plan.pages == [0]
+
+
+def test_mostly_unreadable_page_is_kept():
+    international = stream(
+        "MOVIMIENTOS INTERNACIONALES", *(f"0{day}/09/24 AMAZON US$ 12,99" for day in range(1, 5))
+    )
+    # Movimientos con una fuente CID (strings hexadecimales) y un pie legible
+    cid_body = b" T* ".join(b"<00410042004300440045> Tj" for _ in range(6))
+    footer = b"(PAGINA 3 DE 3 - BANCO EJEMPLO - ESTADO DE CUENTA MENSUAL) Tj"
+    cid_page = b"BT " + cid_body + b" T* " + footer + b" ET"
+
+    plan = classify_pages([FIRST_PAGE, international, cid_page])
+    assert plan.classes[2] == [UNKNOWN]
+    assert plan.keep == [True, False, True]
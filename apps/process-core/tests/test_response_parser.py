@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from prompts.extract_interests import CategoryResponse
+from prompts.response_parser import (
+    ResponseParseError,
+    decode_json,
+    decode_response,
+    model_from_schema,
+    repair_json,
+)
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ('{"a": 1}', {"a": 1}),
+        ('```json\n{"a": 1}\n```', {"a": 1}),
+        ('Aquí está el JSON: {"a": [1, 2,], } gracias', {"a": [1, 2]}),
+        # Truncadas por max_tokens
+        ('{"a": 1, "b": "tex', {"a": 1, "b": "tex"}),
+        ('{"a": [1, 2', {"a": [1, 2]}),
+        ('{"a": 1, "b": tru', {"a": 1, "b": None}),
+        ('{"a": 1, "b":', {"a": 1, "b": None}),
+        ('{"a": 1, "b"', {"a": 1, "b": None}),
+        ('{"a": {"b": [{"c": 1},', {"a": {"b": [{"c": 1}]}}),
+        ('{"a": "con } y \\" adentro"}', {"a": 'con } y " adentro'}),
+        ('[{"a": 1}] texto', [{"a": 1}]),
+    ],
+)
+def test_repair_json(content, expected):
+    assert json.loads(repair_json(content)) == expected
+
+
+def test_repair_json_without_json_returns_text():
+    assert repair_json("  sin datos ") == "sin datos"
+
+
+def test_decode_json_accepts_python_dicts():
+    assert decode_json("{'a': True, 'b': None}") == {"a": True, "b": None}
+
+
+def test_decode_json_raises_on_garbage():
+    with pytest.raises(ResponseParseError):
+        decode_json("no es json")
+
+
+def test_decode_response_coerces_amounts_and_rates():
+    Product = model_from_schema("Product", {"cupo": "integer", "cae": "float", "nombre": "string"})
+    content = '{"cupo": "$ 1.234.567", "cae": "32,5%", "nombre": 42}'
+    assert decode_response(content, Product) == {"cupo": 1234567, "cae": 32.5, "nombre": "42"}
+
+
+@pytest.mark.parametrize(
+    "amount, expected",
+    [
+        ("$ 1.234.567", 1234567),
+        ("-$8.786", -8786),
+        ("$ -5.000", -5000),
+        ("1234567,00", 1234567),
+        ("1.234,56", 1234),
+        # Miles con coma (formato de EE.UU.)
+        ("$558,786", 558786),
+        ("1,234,567", 1234567),
+        ("1,234,567.00", 1234567),
+        ("-$1,000", -1000),
+        ("12.5", 12),
+        ("100", 100),
+    ],
+)
+def test_decode_response_integer_amounts(amount, expected):
+    Amount = model_from_schema("Amount", {"monto": "integer"})
+    assert decode_response(json.dumps({"monto": amount}), Amount) == {"monto": expected}
+
+
+def test_decode_response_drops_unconvertible_values():
+    content = '{"categoria": [{"nombre": "salud", "total": "-$ 8.786"}, {"total": "n/a"}]}'
+    assert decode_response(content, CategoryResponse) == {
+        "categoria": [{"nombre": "salud", "total": -8786}, {"nombre": "otros", "total": 0}]
+    }
+
+
+def test_decode_response_requires_object():
+    with pytest.raises(ResponseParseError):
+        decode_response("[1, 2]", CategoryResponse)
@@ -0,0 +1,131 @@
+import pytest
+
+from statement_rules import (
+    detect_bank,
+    field_sources,
+    normalize_text,
+    parse_client_fields,
+    parse_product_fields,
+    rut_is_valid,
+    validate_product_fields,
+)
+
+STATEMENT = """
+BANCO SANTANDER
+ESTADO DE CUENTA TARJETA DE CRÉDITO
+NOMBRE DEL TITULAR JUAN PÉREZ MUÑOZ RUT 12.345.678-5
+NÚMERO DE TARJETA XXXX XXXX XXXX 1234
+FECHA ESTADO DE CUENTA 15/09/2024
+ÚLTIMO DÍA DE PAGO 05/10/2024
+CUPO TOTAL $ 1.000.000
+CUPO UTILIZADO $ 400.000
+CUPO DISPONIBLE $ 600.000
+TASA INTERÉS VIGENTE ROTATIVO 2,15%
+CAE ROTATIVO 32,5%
+MONTO TOTAL A PAGAR $ 400.000
+MONTO MÍNIMO A PAGAR $ 20.000
+"""
+
+
+def test_normalize_text_keeps_enye_and_newlines():
+    assert normalize_text("Muñoz  Pérez\n\tÁrea") == "MUÑOZ PEREZ\n AREA"
+
+
+@pytest.mark.parametrize(
+    "text, bank",
+    [
+        ("BANCO DE CHILE", "banco_de_chile"),
+        ("TARJETA CMR FALABELLA", "falabella"),
+        ("ESTADO BCI", "bci"),
+        ("BANCIO", None),
+    ],
+)
+def test_detect_bank(text, bank):
+    assert detect_bank(text) == bank
+
+
+def test_parse_product_fields():
+    assert parse_product_fields(STATEMENT) == {
+        "nombre_titular": "JUAN PEREZ MUÑOZ",
+        "numero_tarjeta": "XXXX XXXX XXXX 1234",
+        "fecha_estado_cuenta": "15/09/2024",
+        "cupo_total": 1_000_000,
+        "cupo_utilizado": 400_000,
+        "cupo_disponible": 600_000,
+        "tasas_interes_vigente_rotativo": 2.15,
+        "cae_rotativo": 32.5,
+        # Etiquetas propias de Santander
+        "fecha_pagar_hasta": "05/10/2024",
+        "monto_total_facturado": 400_000,
+        "monto_minimo_pagar": 20_000,
+    }
+
+
+def test_conflicting_values_are_not_resolved():
+    text = "CUPO TOTAL $ 1.000.000\nCUPO TOTAL $ 2.000.000\nCAE ROTATIVO 30%"
+    assert parse_product_fields(text) == {"cae_rotativo": 30.0}
+
+
+def test_validate_drops_inconsistent_fields():
+    fields = {
+        "cupo_total": 1_000_000,
+        "cupo_utilizado": 400_000,
+        "cupo_disponible": 500_000,
+        "cae_rotativo": 150.0,
+        "tasas_interes_vigente_rotativo": 2.0,
+    }
+    assert validate_product_fields(fields) == {"tasas_interes_vigente_rotativo": 2.0}
+
+
+@pytest.mark.parametrize(
+    "rut, valid",
+    [("12.345.678-5", True), ("12345678-5", True), ("12.345.678-6", False), ("10.000.013-K", True)],
+)
+def test_rut_is_valid(rut, valid):
+    assert rut_is_valid(rut) is valid
+
+
+def test_parse_client_fields():
+    assert parse_client_fields(STATEMENT) == {"rut": "12.345.678-5", "name": "JUAN PEREZ MUÑOZ"}
+    assert parse_client_fields("RUT 12.345.678-6") == {}
+
+
+def test_field_sources():
+    result = {"a": 1, "b": 2, "c": "No encontrado", "d": 4}
+    assert field_sources(result, {"a": 1}, template_fields={"b": 2}) == {
+        "a": "reglas",
+        "b": "plantilla",
+        "c": "no_encontrado",
+        "d": "llm",
+    }
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Estimado cliente, le informamos sus movimientos",
+        "Atencion clientes llamar al fono",
+        "Servicio al Cliente Banco Ejemplo",
+        "SRTA MARIA LOPEZ",
+    ],
+)
+def test_generic_name_labels_need_separator(text):
+    assert "name" not in parse_client_fields(text)
+
+
+@pytest.mark.parametrize(
+    "text, name",
+    [
+        ("Cliente: Ana Rojas Soto", "ANA ROJAS SOTO"),
+        ("Sr. Juan Perez", "JUAN PEREZ"),
+        ("Sra. Ana Rojas", "ANA ROJAS"),
+        ("SR(A): PEDRO SOTO", "PEDRO SOTO"),
+    ],
+)
+def test_generic_name_labels(text, name):
+    assert parse_client_fields(text) == {"name": name}
+
+
+def test_service_line_does_not_conflict_with_holder_name():
+    text = "Nombre del titular: Juan Perez Muñoz\nServicio al cliente llame al 600 600 0000"
+    assert parse_client_fields(text) == {"name": "JUAN PEREZ MUÑOZ"}
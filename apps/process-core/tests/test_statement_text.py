@@ -0,0 +1,102 @@
+import pytest
+
+from statement_text import (
+    chunk_text,
+    merge_category_results,
+    merge_field_results,
+    prune_for_extractor,
+    segment_statement,
+)
+
+STATEMENT = "\n".join(
+    [
+        "BANCO EJEMPLO",
+        "INFORMACION GENERAL",
+        "CUPO TOTAL $ 1.000.000",
+        "MOVIMIENTOS NACIONALES",
+        "02/09/24 PAGO TERMINOS Y CONDICIONES SPA $ 9.990",
+        "03/09/24 JUMBO $ 45.000",
+        "04/09/24 PROMOCIONES CINE $ 5.000",
+        "MOVIMIENTOS INTERNACIONALES",
+        "05/09/24 AMAZON USD 12,99",
+        "CONDICIONES GENERALES",
+        "EL EMISOR NO ASUME RESPONSABILIDAD.",
+        "PROMOCIONES",
+        "APROVECHA 20% DE DESCUENTO",
+    ]
+)
+
+
+def test_segment_statement():
+    sections = segment_statement(STATEMENT)
+    assert [name for name, _ in sections] == [
+        "encabezado",
+        "resumen",
+        "nacional",
+        "internacional",
+        "legal",
+        "publicidad",
+    ]
+    nacional = dict(sections)["nacional"]
+    assert "PAGO TERMINOS Y CONDICIONES SPA" in nacional
+    assert "PROMOCIONES CINE" in nacional
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "02/09/24 PAGO TERMINOS Y CONDICIONES SPA $ 9.990",
+        "VER PROMOCIONES EN LA APP",
+        "PROMOCIONES $ 2.990",
+        "MOVIMIENTOS NACIONALES AL 15/09/2024",
+        "INFORMACION GENERAL " + "X" * 80,
+    ],
+)
+def test_line_with_marker_inside_is_not_a_header(line):
+    sections = segment_statement(f"MOVIMIENTOS NACIONALES\n{line}")
+    assert sections == [("nacional", f"MOVIMIENTOS NACIONALES\n{line}")]
+
+
+def test_header_accents_and_case_are_normalized():
+    sections = segment_statement("Movimientos en US$\nCompra\nInformación General")
+    assert [name for name, _ in sections] == ["internacional", "resumen"]
+
+
+def test_prune_keeps_extractor_sections():
+    pruned = prune_for_extractor(STATEMENT, "movements")
+    assert "JUMBO" in pruned
+    assert "CUPO TOTAL" not in pruned
+    assert "AMAZON" not in pruned
+    assert "APROVECHA" not in pruned
+
+
+def test_prune_unknown_layout_drops_only_discarded_sections():
+    text = "BANCO\nCUPO TOTAL $ 1\nPROMOCIONES\nAPROVECHA"
+    assert prune_for_extractor(text, "movements") == "BANCO\nCUPO TOTAL $ 1"
+
+
+def test_chunk_text_splits_on_lines():
+    text = "\n".join(f"LINEA {i:04d} " + "X" * 40 for i in range(50))
+    chunks = chunk_text(text, max_tokens=100)
+    assert len(chunks) > 1
+    assert "\n".join(chunks) == text
+
+
+def test_merge_results():
+    assert merge_field_results(
+        [{"a": "No encontrado", "b": "1"}, {"a": "2", "b": "3"}]
+    ) == {"a": "2", "b": "1"}
+    assert merge_category_results(
+        [
+            {"categoria": [{"nombre": "Salud", "total": 10}]},
+            {"categoria": [{"nombre": "salud ", "total": "5"}, {"nombre": "x", "total": 20}]},
+        ]
+    ) == {"categoria": [{"nombre": "x", "total": 20}, {"nombre": "salud", "total": 15}]}
+
+
+def test_dropped_section_with_domestic_movements_is_national():
+    text = "\n".join(
+        ["PROMOCIONES"] + [f"0{day}/09/24 COMERCIO {day} $ {day}5.000" for day in range(1, 5)]
+    )
+    assert [name for name, _ in segment_statement(text)] == ["nacional"]
+    assert prune_for_extractor(text, "movements") == text
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.params import Header
+
+import upload_dedupe
+from cache_store import MemoryLRUStore, TieredCache
+from upload_dedupe import IdempotencyStore, SingleFlight, request_fingerprint, run_idempotent
+
+
+@pytest.fixture(autouse=True)
+def memory_store(monkeypatch):
+    store = IdempotencyStore(TieredCache([MemoryLRUStore(100, 60)]))
+    monkeypatch.setattr(upload_dedupe, "get_idempotency_store", lambda: store)
+    return store
+
+
+def counting_handler():
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 200, {"n": len(calls)}
+
+    return handler, calls
+
+
+@pytest.mark.parametrize("key", [None, "", "   ", Header(None, alias="Idempotency-Key")])
+def test_missing_or_non_str_key_always_runs(key, memory_store):
+    handler, calls = counting_handler()
+    fingerprint = request_fingerprint([("a.pdf", "h1")], False)
+
+    async def scenario():
+        for _ in range(2):
+            await run_idempotent("u", "p", key, fingerprint, handler)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert len(memory_store.cache.stores[0]) == 0
+
+
+def test_retry_with_same_key_gets_stored_response():
+    handler, calls = counting_handler()
+    fingerprint = request_fingerprint([("a.pdf", "h1")], False)
+
+    async def scenario():
+        concurrent = await asyncio.gather(
+            *(run_idempotent("u", "p", "k", fingerprint, handler) for _ in range(3))
+        )
+        retry = await run_idempotent("u", "p", "k", fingerprint, handler)
+        return concurrent, retry
+
+    concurrent, retry = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert concurrent == [(200, {"n": 1})] * 3
+    assert retry == (200, {"n": 1})
+
+
+def test_failed_request_is_not_stored():
+    attempts = []
+
+    async def handler():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("falla")
+        return 200, {"ok": True}
+
+    fingerprint = request_fingerprint([("a.pdf", "h1")], False)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await run_idempotent("u", "p", "k", fingerprint, handler)
+        return await run_idempotent("u", "p", "k", fingerprint, handler)
+
+    assert asyncio.run(scenario()) == (200, {"ok": True})
+
+
+def test_single_flight_shares_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "hecho"
+
+    async def scenario():
+        return await asyncio.gather(*(flights.run("k", work) for _ in range(4)))
+
+    results = asyncio.run(scenario())
+    assert calls == [1]
+    assert results == [("hecho", False)] + [("hecho", True)] * 3
+    assert len(flights) == 0
+
+
+def test_single_flight_waiter_retries_when_owner_is_cancelled():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return len(calls)
+
+    async def scenario():
+        owner = asyncio.ensure_future(flights.run("k", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.run("k", work))
+        await asyncio.sleep(0.005)
+        owner.cancel()
+        return await waiter
+
+    assert asyncio.run(scenario()) == (2, False)
+
+
+def test_same_key_with_other_content_under_same_name_is_rejected():
+    handler, calls = counting_handler()
+    first = request_fingerprint([("estado.pdf", "sha-a")], False)
+    other = request_fingerprint([("estado.pdf", "sha-b")], False)
+    assert first != other
+
+    async def scenario():
+        await run_idempotent("u", "p", "k", first, handler)
+        with pytest.raises(HTTPException) as error:
+            await run_idempotent("u", "p", "k", other, handler)
+        return error.value.status_code
+
+    assert asyncio.run(scenario()) == 422
+    assert len(calls) == 1
+
+
+def test_fingerprint_depends_on_async_job_and_order():
+    files = [("a.pdf", "h1"), ("b.pdf", "h2")]
+    assert request_fingerprint(files, False) != request_fingerprint(files, True)
+    assert request_fingerprint(files, False) != request_fingerprint(files[::-1], False)
+
+
+def test_concurrent_uploads_of_same_file_insert_one_candidate(monkeypatch):
+    import routers
+    from uploads import SpooledUpload
+
+    extractions, inserted, metrics = [], [], []
+
+    async def fake_process_file(filename, upload, process_id, user_id, progress=None):
+        extractions.append(filename)
+        await asyncio.sleep(0.02)
+        candidate = {"process_id": process_id, "user_id": user_id, "document_hash": upload.digest}
+        return {"filename": filename, "suggestion": "ok"}, candidate
+
+    monkeypatch.setattr(routers, "process_file", fake_process_file)
+    monkeypatch.setattr(routers, "insert_candidates_to_supabase", inserted.extend)
+    monkeypatch.setattr(routers, "insert_statement_metrics", metrics.extend)
+    monkeypatch.setattr(routers, "insert_suggestion_to_supabase", lambda *args: None)
+
+    async def request(filename):
+        upload = SpooledUpload(filename, "/nonexistent", 10, "same-digest")
+        outcome = await routers.process_file_once(filename, upload, "p", "u")
+        return await routers.persist_upload("p", [outcome])
+
+    async def scenario():
+        return await asyncio.gather(request("a.pdf"), request("copia.pdf"))
+
+    first, second = asyncio.run(scenario())
+
+    assert extractions == ["a.pdf"]
+    assert [result["filename"] for result in first + second] == ["a.pdf", "copia.pdf"]
+    assert len(inserted) == 1
+    assert len(metrics) == 1
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+import uploads
+from uploads import spool_bytes
+
+
+@pytest.mark.parametrize(
+    "filename, suffix",
+    [
+        ("estado.pdf", ".pdf"),
+        ("estado.HTM", ".html"),
+        ("cartola.eml", ".eml"),
+        ("sin_extension", ".pdf"),
+    ],
+)
+def test_spool_file_uses_document_kind_extension(monkeypatch, tmp_path, filename, suffix):
+    monkeypatch.setattr(uploads, "UPLOAD_SPOOL_DIR", str(tmp_path))
+
+    with spool_bytes(filename, b"contenido") as upload:
+        assert os.path.splitext(upload.path)[1] == suffix
+        with open(upload.path, "rb") as f:
+            assert f.read() == b"contenido"
+
+    assert not os.path.exists(upload.path)
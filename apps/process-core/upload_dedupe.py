@@ -0,0 +1,243 @@
+# app/upload_dedupe.py
+"""
+Cargas repetidas del mismo estado de cuenta.
+
+Un doble envío del formulario o un reintento mientras la primera carga sigue
+en curso no vuelven a extraer ni a insertar:
+
+- `Idempotency-Key`: la respuesta de `/upload` se guarda por usuario, proceso
+  y llave. Un reintento con la misma llave recibe la respuesta guardada o,
+  si la primera sigue en curso, espera a que termine.
+- Single-flight por archivo: los requests simultáneos con el mismo
+  (user_id, process_id, SHA-256 del archivo) comparten una sola extracción
+  y su resultado, aunque no envíen la llave.
+- En la base (con `utils.CANDIDATES_DEDUPE_ENABLED`), `candidates.document_hash`
+  tiene un índice único y las filas se insertan con upsert sin reemplazar (ver
+  `utils.insert_candidates_to_supabase`), lo que cubre los duplicados que
+  llegan a instancias distintas.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from cache_store import DiskStore, MemoryLRUStore, TieredCache
+from metrics import UPLOAD_DEDUPE
+
+logger = logging.getLogger()
+
+UPLOAD_IDEMPOTENCY_ENABLED = os.getenv("UPLOAD_IDEMPOTENCY_ENABLED", "true") == "true"
+UPLOAD_IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("UPLOAD_IDEMPOTENCY_MAX_ENTRIES", "1024"))
+UPLOAD_IDEMPOTENCY_TTL_SECONDS = float(
+    os.getenv("UPLOAD_IDEMPOTENCY_TTL_SECONDS", str(24 * 3600))
+)
+UPLOAD_IDEMPOTENCY_DIR = os.getenv(
+    "UPLOAD_IDEMPOTENCY_DIR",
+    os.path.join(tempfile.gettempdir(), "kairos-idempotency"),
+)
+UPLOAD_IDEMPOTENCY_MAX_BYTES = int(
+    os.getenv("UPLOAD_IDEMPOTENCY_MAX_BYTES", str(20 * 1024 * 1024))
+)
+
+_idempotency_store: Optional["IdempotencyStore"] = None
+
+
+class SingleFlight:
+    """
+    Agrupa las llamadas simultáneas con la misma llave en una sola ejecución.
+
+    La primera llamada ejecuta la corrutina; las que llegan mientras sigue en
+    curso esperan su resultado (o su error). Si la primera se cancela (p. ej.
+    el cliente cerró la conexión), la ejecución se cancela con ella y las que
+    esperaban la reintentan por su cuenta.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Ejecuta `factory()` o se une a la ejecución en curso con la misma llave.
+
+        Args:
+            key (Hashable): Llave de la ejecución.
+            factory (Callable): Crea la corrutina a ejecutar.
+
+        Returns:
+            Tuple[Any, bool]: (resultado, True si se compartió una ejecución
+            iniciada por otra llamada).
+        """
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = asyncio.ensure_future(factory())
+                self._flights[key] = flight
+                flight.add_done_callback(lambda done: self._finish(key, done))
+                return await flight, False
+
+            try:
+                return await asyncio.shield(flight), True
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+
+    def _finish(self, key: Hashable, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # El error ya lo reciben quienes esperaban la ejecución
+        if not flight.cancelled():
+            flight.exception()
+
+
+# Extracciones en curso por (user_id, process_id, SHA-256 del archivo)
+upload_flights = SingleFlight()
+
+# Requests en curso por llave de idempotencia
+request_flights = SingleFlight()
+
+
+def request_fingerprint(files: List[Tuple[str, str]], async_job: bool) -> str:
+    """
+    Resume los parámetros de un request para detectar una llave reutilizada
+    con otros archivos, aunque tengan el mismo nombre.
+
+    Args:
+        files (List[Tuple[str, str]]): (nombre, SHA-256) de cada archivo, en
+            orden.
+        async_job (bool): Si el request pidió procesamiento en segundo plano.
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+    payload = json.dumps([[list(file) for file in files], async_job], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Respuestas de `/upload` guardadas por llave de idempotencia.
+
+    Args:
+        cache (TieredCache): Niveles de almacenamiento.
+    """
+
+    def __init__(self, cache: TieredCache):
+        self.cache = cache
+
+    @staticmethod
+    def key_for(user_id: str, process_id: str, idempotency_key: str) -> str:
+        # La llave viene del cliente: se usa su hash como nombre de archivo
+        scoped = f"{user_id}:{process_id}:{idempotency_key}"
+        return "idem-" + hashlib.sha256(scoped.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.cache.get(key)
+
+    def set(self, key: str, fingerprint: str, status_code: int, content: dict) -> None:
+        self.cache.set(
+            key, {"fingerprint": fingerprint, "status_code": status_code, "content": content}
+        )
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+def get_idempotency_store() -> Optional[IdempotencyStore]:
+    """
+    Retorna el almacén de respuestas compartido o None si está deshabilitado.
+
+    Si el directorio de disco no es utilizable se usa solo la memoria.
+
+    Returns:
+        Optional[IdempotencyStore]: Almacén compartido.
+    """
+    global _idempotency_store
+    if not UPLOAD_IDEMPOTENCY_ENABLED:
+        return None
+
+    if _idempotency_store is None:
+        stores = [
+            MemoryLRUStore(UPLOAD_IDEMPOTENCY_MAX_ENTRIES, UPLOAD_IDEMPOTENCY_TTL_SECONDS)
+        ]
+        try:
+            stores.append(
+                DiskStore(
+                    UPLOAD_IDEMPOTENCY_DIR,
+                    UPLOAD_IDEMPOTENCY_TTL_SECONDS,
+                    UPLOAD_IDEMPOTENCY_MAX_BYTES,
+                )
+            )
+        except OSError as e:
+            logger.warning(f"Llaves de idempotencia solo en memoria: {str(e)}")
+        _idempotency_store = IdempotencyStore(TieredCache(stores))
+
+    return _idempotency_store
+
+
+async def run_idempotent(
+    user_id: str,
+    process_id: str,
+    idempotency_key: Optional[str],
+    fingerprint: str,
+    handler: Callable[[], Awaitable[Tuple[int, dict]]],
+) -> Tuple[int, dict]:
+    """
+    Ejecuta un request de carga una sola vez por llave de idempotencia.
+
+    Solo se guardan las respuestas exitosas: un request que falló puede
+    reintentarse con la misma llave.
+
+    Args:
+        user_id (str): UUID del usuario.
+        process_id (str): UUID del proceso.
+        idempotency_key (Optional[str]): Header `Idempotency-Key`. Sin llave
+            (o si no es un str) el request se ejecuta siempre.
+        fingerprint (str): Parámetros del request (ver `request_fingerprint`).
+        handler (Callable): Corrutina que procesa el request y retorna
+            (status_code, contenido).
+
+    Returns:
+        Tuple[int, dict]: (status_code, contenido) propio o guardado.
+
+    Raises:
+        HTTPException: 422 si la llave ya se usó con otros archivos (otros
+            nombres o contenido).
+    """
+    store = get_idempotency_store()
+    # Solo un header real: una llamada directa a la ruta puede pasar el
+    # `Header(None)` por defecto, que no es una llave
+    if not isinstance(idempotency_key, str) or not idempotency_key.strip() or store is None:
+        return await handler()
+
+    key = store.key_for(user_id, process_id, idempotency_key)
+    stored = await asyncio.to_thread(store.get, key)
+    if stored is not None:
+        if stored["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="La Idempotency-Key ya se usó con otros archivos.",
+            )
+        UPLOAD_DEDUPE.inc(source="idempotency_key")
+        logger.info(f"Respuesta repetida por Idempotency-Key para el proceso {process_id}")
+        return stored["status_code"], stored["content"]
+
+    async def run_and_store() -> Tuple[int, dict]:
+        status_code, content = await handler()
+        await asyncio.to_thread(store.set, key, fingerprint, status_code, content)
+        return status_code, content
+
+    # Requests simultáneos con la misma llave y los mismos archivos
+    response, shared = await request_flights.run((key, fingerprint), run_and_store)
+    if shared:
+        UPLOAD_DEDUPE.inc(source="in_flight_request")
+    return response
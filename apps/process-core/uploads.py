@@ -0,0 +1,171 @@
+# app/uploads.py
+"""
+Manejo de archivos subidos con memoria acotada.
+
+Cada PDF se copia por trozos a un archivo temporal (calculando su SHA-256 en
+el camino) en vez de leerlo completo con `UploadFile.read()`. El parseo lee
+ese archivo vía `mmap` y la subida a S3 usa la transferencia multiparte de
+boto3 desde el mismo archivo, por lo que el pico de memoria por archivo no
+depende de su tamaño.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+
+from clients import get_s3
+from html_text import document_kind
+from metrics import span
+
+logger = logging.getLogger()
+
+# Tamaño máximo de cada archivo subido
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+
+# Tamaño de los trozos al copiar el archivo subido
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+# Directorio de los archivos temporales (en Lambda debe estar bajo /tmp)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", tempfile.gettempdir())
+
+# Tamaño de cada parte de la subida multiparte a S3
+S3_MULTIPART_CHUNK_BYTES = int(
+    os.getenv("S3_MULTIPART_CHUNK_BYTES", str(8 * 1024 * 1024))
+)
+
+
+class SpooledUpload:
+    """
+    Archivo subido guardado en disco.
+
+    Args:
+        filename (str): Nombre original del archivo.
+        path (str): Ruta del archivo temporal.
+        size (int): Tamaño en bytes.
+        digest (str): SHA-256 hexadecimal del contenido.
+    """
+
+    def __init__(self, filename: str, path: str, size: int, digest: str):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.digest = digest
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def close(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _new_spool_file(filename: str):
+    """Archivo temporal con la extensión del tipo de documento (PDF si no se reconoce)."""
+    suffix = f".{document_kind(filename) or 'pdf'}"
+    return tempfile.NamedTemporaryFile(
+        dir=UPLOAD_SPOOL_DIR, prefix="upload-", suffix=suffix, delete=False
+    )
+
+
+async def spool_upload(
+    file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES
+) -> SpooledUpload:
+    """
+    Copia un archivo subido a un archivo temporal por trozos.
+
+    Args:
+        file (UploadFile): Archivo recibido por FastAPI.
+        max_bytes (int): Tamaño máximo permitido.
+
+    Returns:
+        SpooledUpload: Archivo en disco. El llamador debe cerrarlo.
+
+    Raises:
+        HTTPException: 413 si el archivo excede `max_bytes`.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    spool = _new_spool_file(file.filename)
+    try:
+        with spool:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"El archivo {file.filename} excede {max_bytes} bytes.",
+                    )
+                sha256.update(chunk)
+                await asyncio.to_thread(spool.write, chunk)
+    except BaseException:
+        os.remove(spool.name)
+        raise
+
+    return SpooledUpload(file.filename, spool.name, size, sha256.hexdigest())
+
+
+def spool_bytes(filename: str, content: bytes) -> SpooledUpload:
+    """
+    Guarda en un archivo temporal un contenido que ya está en memoria (p. ej.
+    los archivos de un trabajo asíncrono).
+
+    Args:
+        filename (str): Nombre original del archivo.
+        content (bytes): Contenido del archivo.
+
+    Returns:
+        SpooledUpload: Archivo en disco. El llamador debe cerrarlo.
+    """
+    with _new_spool_file(filename) as spool:
+        spool.write(content)
+    return SpooledUpload(
+        filename, spool.name, len(content), hashlib.sha256(content).hexdigest()
+    )
+
+
+def _transfer_config():
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=S3_MULTIPART_CHUNK_BYTES,
+        multipart_chunksize=S3_MULTIPART_CHUNK_BYTES,
+    )
+
+
+async def upload_spooled_to_s3(
+    upload: SpooledUpload, key: str, bucket_name: Optional[str] = None
+) -> str:
+    """
+    Sube un archivo temporal a S3. Sobre `S3_MULTIPART_CHUNK_BYTES` se usa
+    subida multiparte, leyendo las partes desde disco.
+
+    Args:
+        upload (SpooledUpload): Archivo a subir.
+        key (str): Llave del objeto en S3.
+        bucket_name (str): Bucket. Por defecto `AWS_S3_BUCKET_NAME`.
+
+    Returns:
+        str: URL del objeto en S3.
+    """
+    bucket_name = bucket_name or os.getenv("AWS_S3_BUCKET_NAME")
+    with span("s3_put", size=upload.size):
+        await asyncio.to_thread(
+            get_s3().upload_file, upload.path, bucket_name, key, Config=_transfer_config()
+        )
+    return f"https://{bucket_name}.s3.amazonaws.com/{key}"
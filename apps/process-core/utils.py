@@ -1,32 +1,73 @@
 # app/utils.py
+import asyncio
+import functools
 import io
 import logging
+import mmap
 import os
 import re
+from typing import Awaitable, Callable, Union
 
-import openai
-import PyPDF2
 from dotenv import load_dotenv
 from fastapi import HTTPException
-from supabase import Client, create_client
 
-from matcher_algo import calculate_match_score
-from prompts.extract_client import extract_client
-from prompts.extract_interests import extract_interests
-from prompts.extract_movements import extract_movements
-from prompts.extract_product import extract_product
+from clients import get_supabase
+from extraction_cache import file_hash, get_extraction_cache
+from html_text import eml_text, html_text
+from layout_templates import learn_layout, match_layout
+from metrics import LOG_LEVEL, log_event, span
+from page_classifier import plan_pdf_pages
+from prompts.extract_client import (
+    build_client_result,
+    extract_client,
+    extract_client_async,
+)
+from prompts.extract_interests import (
+    build_interests_result,
+    extract_interests,
+    extract_interests_async,
+)
+from prompts.extract_movements import (
+    build_movements_result,
+    extract_movements,
+    extract_movements_async,
+)
+from prompts.extract_product import (
+    build_product_result,
+    extract_product,
+    extract_product_async,
+)
+from prompts.extract_statement import extract_statement, extract_statement_async
+from statement_rules import (
+    RULES_FAST_PATH_ENABLED,
+    field_sources,
+    parse_client_fields,
+    parse_product_fields,
+)
+from statement_text import MERGERS, merge_statement_results, prepare_extractor_input
 
 # Cargar las variables desde el archivo .env
 load_dotenv()
 
 # Configuración del logger
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
 
 
-# Configuración de OpenAI y Supabase
-openai.api_key = os.getenv("OPENAI_API_KEY")
-supabase: Client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+# Los clientes de OpenAI y Supabase se crean en el primer uso (ver `clients`)
+
+# Tiempo máximo (segundos) para cada llamada de extracción a OpenAI
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "60"))
+
+# Modo de extracción: "multi_call" (un prompt por extractor) o "single_pass"
+# (una sola llamada con el esquema combinado)
+EXTRACTION_MODES = ("multi_call", "single_pass")
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "multi_call")
+
+# Descartar en la base las filas de `candidates` de un archivo ya cargado en
+# el mismo proceso. Activar solo después de crear la columna `document_hash`
+# y su índice único: sin ellos el upsert falla y `/upload` responde 500.
+CANDIDATES_DEDUPE_ENABLED = os.getenv("CANDIDATES_DEDUPE_ENABLED", "false") == "true"
 
 """
 Extrae información estructurada de un archivo PDF de CV.
@@ -39,79 +80,382 @@ dict: Diccionario con la información extraída del CV.
 """
 
 
+def extract_pdf_text(file_content: Union[bytes, str]) -> str:
+    """
+    Extrae el texto plano de las páginas de un PDF que usa algún extractor.
+
+    Las páginas solo internacionales, legales o de publicidad se detectan
+    desde su content stream y no se extraen (ver `page_classifier`). Si se
+    recibe una ruta, el archivo se lee vía `mmap` sin copiarlo a
+    memoria, y es lo que conviene pasar a un pool de procesos.
+
+    Args:
+        file_content (Union[bytes, str]): Contenido del PDF o ruta al archivo.
+
+    Returns:
+        str: Texto concatenado de las páginas relevantes.
+    """
+    import PyPDF2
+
+    if isinstance(file_content, str):
+        with open(file_content, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buffer:
+            text, pages, total = _extract_relevant_pages(PyPDF2.PdfReader(buffer))
+    else:
+        text, pages, total = _extract_relevant_pages(PyPDF2.PdfReader(io.BytesIO(file_content)))
+
+    log_event("pdf_text", chars=len(text), pages=pages, total_pages=total)
+    return text
+
+
+def extract_document_text(file_content: Union[bytes, str], kind: str = "pdf") -> str:
+    """
+    Extrae el texto de un estado de cuenta según su tipo de documento.
+
+    Args:
+        file_content (Union[bytes, str]): Contenido del archivo o ruta.
+        kind (str): "pdf", "html" o "eml" (ver `html_text.document_kind`).
+
+    Returns:
+        str: Texto del documento.
+    """
+    if kind == "html":
+        text = html_text(file_content)
+    elif kind == "eml":
+        text = eml_text(file_content, pdf_text=extract_pdf_text)
+    else:
+        return extract_pdf_text(file_content)
+
+    log_event("document_text", kind=kind, chars=len(text))
+    return text
+
+
+def _extract_relevant_pages(pdf_reader) -> tuple:
+    """Extrae el texto solo de las páginas que usa algún extractor (ver `page_classifier`)."""
+    plan = plan_pdf_pages(pdf_reader)
+    indexes = plan.pages if plan is not None else range(len(pdf_reader.pages))
+    text = "".join(pdf_reader.pages[index].extract_text() for index in indexes)
+    return text, len(indexes), len(pdf_reader.pages)
+
+
+# Extractores síncronos, en el orden de la tupla de resultado, y el
+# resultado vacío que se usa si alguno falla
+SYNC_EXTRACTORS = (
+    ("client", extract_client, build_client_result),
+    ("product", extract_product, build_product_result),
+    ("movements", extract_movements, build_movements_result),
+    ("interests", extract_interests, build_interests_result),
+)
+
+# Parsers de reglas de los campos que aprenden las plantillas de diseño
+RULE_PARSERS = (
+    ("client", parse_client_fields),
+    ("product", parse_product_fields),
+)
+
+
+def _learn_layout(layout, text: str, fields: tuple, known: dict, mode: str) -> int:
+    """
+    Aprende la plantilla del diseño con los campos de cliente y producto que
+    obtuvo el LLM (ver `layout_templates.learn_layout`).
+
+    Se descartan los que resolvieron las reglas (con el mismo texto que vio
+    cada extractor) o la plantilla: aprender de ellos solo repetiría su
+    posición, incluso cuando son un falso positivo.
+
+    Args:
+        layout (Optional[PageLayout]): Diseño de la primera página.
+        text (str): Texto del estado de cuenta.
+        fields (tuple): Resultado completo de la extracción.
+        known (dict): Campos leídos desde la plantilla, por extractor.
+        mode (str): Modo de extracción; "single_pass" no usa reglas.
+
+    Returns:
+        int: Campos registrados.
+    """
+    if layout is None or layout.fingerprint is None:
+        return 0
+
+    results = {}
+    for (name, parse), result in zip(RULE_PARSERS, fields):
+        rule_fields = {}
+        if RULES_FAST_PATH_ENABLED and mode != "single_pass":
+            for chunk in prepare_extractor_input(text, name):
+                rule_fields.update(parse(chunk))
+        sources = field_sources(result, rule_fields, template_fields=known.get(name))
+        results[name] = {
+            field: value for field, value in result.items() if sources[field] == "llm"
+        }
+    return learn_layout(layout, results)
+
+
 def extract_bank_document(file_content: bytes) -> dict:
     try:
+        # Si el mismo PDF ya fue procesado, evitar parseo y llamadas a OpenAI
+        cache = get_extraction_cache()
+        cache_key = cache.key_for(file_content, EXTRACTION_MODE) if cache else None
+        if cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         # Extraer texto del PDF
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text = "".join(page.extract_text() for page in pdf_reader.pages)
-
-        print("\n" + "=" * 50)
-        print("TEXTO EXTRAÍDO DEL PDF:")
-        print("-" * 50)
-        print(text[:1000] + "...")  # Primeros 500 caracteres
-        print("=" * 50 + "\n")
-
-        # Prompt para OpenAI
-        system_prompt = """
-            eres experto analizando finanzas.
-            vas a extraer desde un pdf, un estado de cuenta de la tarjeta de credito.
-
-            necesito que analices todos los movimientos asociados a una transacción.
-            vas a extraer 3 campos. fechas, el nombre de la transaccion (descripcion) y el monto de la transaccion (cargos).
-
-            luego, vas a clasificar las descripciones en categorias como titulo principal y vas a sumar todos los movimientos asociados. 
-
-            por ejemplo, si en el archivo encuentras: shell, copec, petrobras, aramco o similares, tendras que crear la categoria "combustible" y sumar todos los montos de las bencineras. 
-
-            otro ejemplo, si aparece uber, cabify, didi o similares, tendrás que crear la categoria "movilidad" y sumar todas las transacciones asociadas. 
-
-            y así con todas las categorias que encuentres. las más comunes son: supermercados, restaurantes, movilidad, combustible, entretenimiento, salud. considera otras relevantes.
-
-            Responde en formato JSON con las siguientes keys:
-            {
-            "json1": {
-                "id": 1,
-                "nombre": "JSON 1",
-                "datos": {
-                "prop1": "valor1",
-                "prop2": "valor2"
-                }
-            },
-            "json2": {
-                "id": 2,
-                "nombre": "JSON 2",
-                "datos": {
-                "prop1": "valorA",
-                "prop2": "valorB"
-                }
-            },
-            "json3": {
-                "id": 3,
-                "nombre": "JSON 3",
-                "datos": {
-                "prop1": "valorX",
-                "prop2": "valorY"
-                }
-            }
-            }
-            donde json1 es para identificar toda la información de cliente, json información del producto como : fecha_estado_cuenta, pagar_hasta, total_facturado, minimo_pagar, cupo total, cupo utilizado, cupo disponible, tasas interes_vigente rotativo, tasas interes_vigente compra_en_cuotas,tasas interes_vigente  avance_en_cuotas, cae rotativo, cae compra en cuotas. json 3 serán todos los movimientos asociados a cada categoría.
-
-        """
-
-        client = extract_client(text)
-        product = extract_product(text)
-        movements = extract_movements(text)
-        interests = extract_interests(text)
-
-        return client, product, movements, interests
+        with span("pdf_parse"):
+            text = extract_pdf_text(file_content)
+
+        # Campos que la plantilla del diseño ya resuelve (ver `layout_templates`)
+        with span("layout_match"):
+            layout, known = match_layout(file_content)
+
+        # Cada extractor recibe solo sus secciones, en trozos que caben en el modelo
+        failed = []
+        if EXTRACTION_MODE == "single_pass":
+            chunks = prepare_extractor_input(text, "statement")
+            with span("extractor.statement"):
+                fields = merge_statement_results([extract_statement(c) for c in chunks])
+            fields = _apply_known(fields, known)
+        else:
+            results = []
+            for name, extractor, empty_result in SYNC_EXTRACTORS:
+                if name in known:
+                    extractor = functools.partial(extractor, known=known[name])
+                try:
+                    with span(f"extractor.{name}"):
+                        chunks = prepare_extractor_input(text, name)
+                        results.append(MERGERS[name]([extractor(c) for c in chunks]))
+                except Exception as e:
+                    logger.warning(
+                        f"Extractor {name} falló ({type(e).__name__}: {e}), resultado parcial"
+                    )
+                    failed.append(name)
+                    results.append(empty_result({}))
+            if len(failed) == len(SYNC_EXTRACTORS):
+                raise HTTPException(
+                    status_code=500,
+                    detail="Error al procesar el estado de cuenta: fallaron todos los extractores",
+                )
+            fields = tuple(results)
+
+        # Los resultados parciales no se aprenden ni se guardan en caché
+        if not failed:
+            _learn_layout(layout, text, fields, known, EXTRACTION_MODE)
+            if cache:
+                cache.set(cache_key, fields)
+
+        return fields
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en extracción: {type(e).__name__}: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error al procesar el CV: {str(e)}"
+        )
+
+
+def _apply_known(fields: tuple, known: dict) -> tuple:
+    """Reemplaza en un resultado (client, product, ...) los campos leídos desde la plantilla."""
+    client, product, *rest = fields
+    return (
+        {**client, **known.get("client", {})},
+        {**product, **known.get("product", {})},
+        *rest,
+    )
+
+
+# Extractores asíncronos y el resultado vacío que se usa si alguno falla
+ASYNC_EXTRACTORS = (
+    ("client", extract_client_async, build_client_result),
+    ("product", extract_product_async, build_product_result),
+    ("movements", extract_movements_async, build_movements_result),
+    ("interests", extract_interests_async, build_interests_result),
+)
+
+
+async def _run_chunked(
+    stage: str, extractor: Callable, chunks: list, merge: Callable, timeout: float
+):
+    """Ejecuta un extractor sobre cada trozo en paralelo y combina los resultados."""
+    with span(stage, chunks=len(chunks)):
+        results = await asyncio.gather(
+            *(asyncio.wait_for(extractor(chunk), timeout=timeout) for chunk in chunks)
+        )
+    return results[0] if len(results) == 1 else merge(list(results))
+
+
+async def extract_fields_async(
+    text: str,
+    timeout: float = None,
+    mode: str = None,
+    failed: list = None,
+    known: dict = None,
+) -> tuple:
+    """
+    Extrae cliente, producto, movimientos e intereses del texto de un estado
+    de cuenta.
+
+    Cada extractor recibe solo las secciones del estado de cuenta que usa y,
+    si el texto excede el presupuesto de tokens, se procesa en trozos cuyos
+    resultados se combinan (ver `statement_text`).
 
+    En modo "multi_call" los cuatro extractores corren de forma concurrente,
+    cada uno con su propio timeout. Si un extractor falla o excede el tiempo,
+    se usa su resultado vacío ("No encontrado") y el resto se conserva.
+    En modo "single_pass" se hace una sola llamada con el esquema combinado.
+
+    Args:
+        text (str): Texto del estado de cuenta.
+        timeout (float): Segundos máximos por llamada a OpenAI.
+        mode (str): "multi_call" o "single_pass". Por defecto `EXTRACTION_MODE`.
+        failed (list): Si se entrega, se agregan los nombres de los
+            extractores que fallaron (resultado parcial).
+        known (dict): Campos por extractor ("client", "product") ya
+            resueltos por la plantilla del diseño; no se piden al LLM.
+
+    Returns:
+        tuple: (client, product, movements, interests).
+
+    Raises:
+        HTTPException: Si todos los extractores fallan.
+    """
+    timeout = timeout or EXTRACTION_TIMEOUT_SECONDS
+    mode = mode or EXTRACTION_MODE
+    known = known or {}
+
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Modo de extracción no soportado: {mode}")
+
+    if mode == "single_pass":
+        try:
+            fields = await _run_chunked(
+                "extractor.statement",
+                extract_statement_async,
+                prepare_extractor_input(text, "statement"),
+                merge_statement_results,
+                timeout,
+            )
+            return _apply_known(fields, known)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error al procesar el estado de cuenta: timeout de {timeout}s",
+            )
+
+    outcomes = await asyncio.gather(
+        *(
+            _run_chunked(
+                f"extractor.{name}",
+                functools.partial(extractor, known=known[name]) if name in known else extractor,
+                prepare_extractor_input(text, name),
+                MERGERS[name],
+                timeout,
+            )
+            for name, extractor, _ in ASYNC_EXTRACTORS
+        ),
+        return_exceptions=True,
+    )
+
+    results = []
+    failures = []
+    for (name, _, empty_result), outcome in zip(ASYNC_EXTRACTORS, outcomes):
+        if isinstance(outcome, BaseException):
+            if isinstance(outcome, asyncio.TimeoutError):
+                reason = f"timeout de {timeout}s"
+            else:
+                reason = f"{type(outcome).__name__}: {outcome}"
+            logger.warning(f"Extractor {name} falló ({reason}), resultado parcial")
+            failures.append(name)
+            results.append(empty_result({}))
+        else:
+            results.append(outcome)
+
+    if len(failures) == len(ASYNC_EXTRACTORS):
+        raise HTTPException(
+            status_code=500,
+            detail="Error al procesar el estado de cuenta: fallaron todos los extractores",
+        )
+
+    if failed is not None:
+        failed.extend(failures)
+
+    return tuple(results)
+
+
+async def extract_bank_document_async(
+    file_content: Union[bytes, str],
+    timeout: float = None,
+    mode: str = None,
+    pdf_parser: Callable[[Union[bytes, str]], Awaitable[str]] = None,
+    digest: str = None,
+    kind: str = "pdf",
+) -> tuple:
+    """
+    Versión asíncrona de `extract_bank_document`.
+
+    Si el PDF ya fue procesado (mismo SHA-256 y versión de esquema) se
+    devuelve el resultado en caché sin parsear ni llamar a OpenAI. Si no, el
+    parseo corre fuera del event loop y las llamadas a OpenAI se lanzan en
+    paralelo; los campos que resuelve la plantilla del diseño no se piden y
+    los que obtuvo el LLM alimentan el aprendizaje de plantillas. Los
+    resultados parciales no se guardan en caché ni se aprenden.
+
+    Args:
+        file_content (Union[bytes, str]): Contenido del PDF o ruta al archivo
+            (ver `uploads.SpooledUpload`).
+        timeout (float): Segundos máximos por llamada a OpenAI.
+        mode (str): "multi_call" o "single_pass". Por defecto `EXTRACTION_MODE`.
+        pdf_parser (Callable): Corrutina que extrae el texto del documento.
+            Por defecto `extract_document_text` en un thread.
+        digest (str): SHA-256 del PDF si ya se conoce. Si se pasa una ruta
+            sin `digest` se calcula leyendo el archivo.
+        kind (str): Tipo de documento: "pdf", "html" o "eml". Las
+            plantillas de diseño solo se usan con PDFs.
+
+    Returns:
+        tuple: (client, product, movements, interests).
+    """
+    try:
+        mode = mode or EXTRACTION_MODE
+
+        cache = get_extraction_cache()
+        cache_key = None
+        if cache:
+            if digest is None and isinstance(file_content, str):
+                digest = await asyncio.to_thread(file_hash, file_content)
+            cache_key = cache.key_for(file_content, mode, digest=digest)
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                return cached
+
+        with span("pdf_parse"):
+            if pdf_parser is None:
+                text = await asyncio.to_thread(extract_document_text, file_content, kind)
+            else:
+                text = await pdf_parser(file_content)
+
+        # Campos que la plantilla del diseño ya resuelve (ver `layout_templates`)
+        layout, known = None, {}
+        if kind == "pdf":
+            with span("layout_match"):
+                layout, known = await asyncio.to_thread(match_layout, file_content)
+
+        failed = []
+        fields = await extract_fields_async(
+            text, timeout=timeout, mode=mode, failed=failed, known=known
+        )
+
+        if not failed:
+            await asyncio.to_thread(_learn_layout, layout, text, fields, known, mode)
+        if cache and not failed:
+            await asyncio.to_thread(cache.set, cache_key, fields)
+
+        return fields
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print("\n" + "=" * 50)
-        print("ERROR EN EXTRACCIÓN:")
-        print("-" * 50)
-        print(f"Tipo de error: {type(e).__name__}")
-        print(f"Mensaje de error: {str(e)}")
-        print("=" * 50 + "\n")
+        logger.error(f"Error en extracción asíncrona: {type(e).__name__}: {str(e)}")
         raise HTTPException(
             status_code=500, detail=f"Error al procesar el CV: {str(e)}"
         )
@@ -144,21 +488,15 @@ def validate_phone_number(phone: str) -> str:
 def insert_suggestion_to_supabase(process_id: str, suggestion: str) -> None:
     try:
         # La suggestion se guarda en la tabla de procesos
-        print(f"suggestion: {suggestion}")
-        process_data = {
-            "id": process_id,
-            "suggestion": suggestion,
-        }
-
-        # Log para debugging
-        logger.debug(f"Insertando sugerencia con datos: {process_data}")
-
-        response = (
-            supabase.table("processes")
-            .update({"suggestion": suggestion})
-            .eq("id", process_id)
-            .execute()
-        )
+        log_event("supabase_update_suggestion", chars=len(suggestion or ""))
+
+        with span("supabase.update_suggestion"):
+            response = (
+                get_supabase().table("processes")
+                .update({"suggestion": suggestion})
+                .eq("id", process_id)
+                .execute()
+            )
 
         if hasattr(response, "error") and response.error is not None:
             raise HTTPException(
@@ -173,35 +511,78 @@ def insert_suggestion_to_supabase(process_id: str, suggestion: str) -> None:
         )
 
 
-def insert_candidate_to_supabase(
-    process_id: str, user_id: str, client: dict, product: dict, movements: dict, interests: dict
-) -> None:
+def build_candidate_row(
+    process_id: str,
+    user_id: str,
+    client: dict,
+    product: dict,
+    movements: dict,
+    interests: dict,
+    document_hash: str = None,
+) -> dict:
     """
-    Inserta la información del candidato en la base de datos de Supabase.
+    Arma la fila de la tabla `candidates` para un estado de cuenta procesado.
 
     Args:
-        process_id (dict): kairo relacionado.
-        match_result (dict): Resultado del cálculo de coincidencia.
         process_id (str): UUID del proceso.
+        user_id (str): UUID del usuario.
+        client (dict): Datos del cliente.
+        product (dict): Datos del producto.
+        movements (dict): Movimientos por categoría.
+        interests (dict): Intereses, cargos y comisiones.
+        document_hash (str): SHA-256 del archivo, para descartar la fila si
+            el mismo archivo ya se cargó en el proceso.
+
+    Returns:
+        dict: Fila lista para insertar.
+    """
+    row = {
+        "process_id": process_id,
+        "user_id": user_id,
+        "status": "Postulado",
+        "client": client,
+        "product": product,
+        "movements": movements,
+        "interests": interests,
+    }
+    if CANDIDATES_DEDUPE_ENABLED:
+        row["document_hash"] = document_hash
+    return row
+
+
+def insert_candidates_to_supabase(candidates: list) -> None:
+    """
+    Inserta varias filas en `candidates` con un solo request a Supabase.
+
+    Con `CANDIDATES_DEDUPE_ENABLED` las filas se insertan con un upsert que
+    no reemplaza: una fila con el mismo (user_id, process_id, document_hash)
+    que otra ya guardada, o repetida en el mismo lote, se descarta.
+
+    Args:
+        candidates (list): Filas creadas con `build_candidate_row`.
 
     Raises:
         HTTPException: Si hay un error en la inserción de datos.
     """
-    try:
-        candidate_data = {
-            "process_id": process_id,
-            "user_id": user_id,
-            "status": "Postulado",
-            "client": client,
-            "product": product,
-            "movements": movements,
-            "interests": interests,
-        }
+    if not candidates:
+        return
 
-        # Log para debugging
-        logger.debug(f"Insertando candidato con datos: {candidate_data}")
-
-        response = supabase.table("candidates").insert(candidate_data).execute()
+    try:
+        if CANDIDATES_DEDUPE_ENABLED:
+            candidates = _unique_candidates(candidates)
+        log_event("supabase_insert_candidates", rows=len(candidates))
+
+        with span("supabase.insert_candidates"):
+            table = get_supabase().table("candidates")
+            if CANDIDATES_DEDUPE_ENABLED:
+                query = table.upsert(
+                    candidates,
+                    on_conflict="user_id,process_id,document_hash",
+                    ignore_duplicates=True,
+                )
+            else:
+                query = table.insert(candidates)
+            response = query.execute()
 
         if hasattr(response, "error") and response.error is not None:
             raise HTTPException(
@@ -210,7 +591,41 @@ def insert_candidate_to_supabase(
             )
 
     except Exception as e:
-        logger.error(f"Error al insertar candidato: {str(e)}")
+        logger.error(f"Error al insertar candidatos: {str(e)}")
         raise HTTPException(
             status_code=500, detail=f"Error al insertar candidato: {str(e)}"
         )
+
+
+def _unique_candidates(candidates: list) -> list:
+    """Descarta las filas repetidas del mismo archivo dentro de un lote."""
+    seen, unique = set(), []
+    for candidate in candidates:
+        key = (candidate["user_id"], candidate["process_id"], candidate.get("document_hash"))
+        if key[2] is not None and key in seen:
+            continue
+        seen.add(key)
+        unique.append(candidate)
+    return unique
+
+
+def insert_candidate_to_supabase(
+    process_id: str, user_id: str, client: dict, product: dict, movements: dict, interests: dict
+) -> None:
+    """
+    Inserta la información del candidato en la base de datos de Supabase.
+
+    Args:
+        process_id (str): UUID del proceso.
+        user_id (str): UUID del usuario.
+        client (dict): Datos del cliente.
+        product (dict): Datos del producto.
+        movements (dict): Movimientos por categoría.
+        interests (dict): Intereses, cargos y comisiones.
+
+    Raises:
+        HTTPException: Si hay un error en la inserción de datos.
+    """
+    insert_candidates_to_supabase(
+        [build_candidate_row(process_id, user_id, client, product, movements, interests)]
+    )